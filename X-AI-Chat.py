@@ -1,230 +1,106 @@
 import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 import sys
-import subprocess
 import json
 import logging
-from logging.handlers import RotatingFileHandler
 import os
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
-from PyQt5.QtChart import *
-import qdarkstyle
 import datetime
 import getpass
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import speech_recognition as sr
-from gtts import gTTS
-import pygame
+from collections import OrderedDict
 import platform
-import pyaudio
+from lazy_modules import sr, pyaudio, QtChart, IdlePrewarmer
 from settings_dialog import SettingsDialog
 from instructions_dashboard import InstructionsDashboard
 from ai_workstation_hub import AIWorkStationHub
-from ollama_handler import OllamaThread, get_available_models
-from ai_chat_extensions import initialize_extensions
-
-# הגדרת מערכת הלוגים
-def setup_logger():
-    logger = logging.getLogger('AIChat')
-    logger.setLevel(logging.DEBUG)
-
-    # יצירת תיקיית לוגים אם היא לא קיימת
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-
-    # הגדרת handler לקובץ ע רוטציה
-    file_handler = RotatingFileHandler('logs/aichat.log', maxBytes=1024*1024, backupCount=5)
-    file_handler.setLevel(logging.DEBUG)
-
-    # הגדרת handler לקונסול
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-
-    # יצית פורמט ללוגים
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-
-    # הוספת ה-handlers ללוגר
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-
-    return logger
-
-logger = setup_logger()
-
-# הגדרת פלטת צבעים הרמונית
-COLORS = {
-    'background': '#1E1E1E',
-    'surface': '#2D2D2D',
-    'primary': '#3700B3',
-    'secondary': '#03DAC6',
-    'on_background': '#E1E1E1',
-    'on_surface': '#FFFFFF',
-    'on_primary': '#FFFFFF',
-    'on_secondary': '#000000',
-    'error': '#CF6679',
-    'success': '#03DAC6',
-    'warning': '#FFAB00',
-}
-
-class ChatMessage(QFrame):
-    def __init__(self, text, is_user=True, parent=None, model_name=None, tokens=0):
-        super().__init__(parent)
-        self.text = text
-        self.setFrameStyle(QFrame.StyledPanel | QFrame.Raised)
-        self.setLineWidth(0)
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(10, 10, 10, 10)
-        layout.setSpacing(5)
-        
-        header_layout = QHBoxLayout()
-        
-        # שם המשתמש או המודל
-        name_label = QLabel(f"{getpass.getuser()}" if is_user else f"{model_name}")
-        name_label.setStyleSheet(f"""
-            color: {COLORS['on_surface']};
-            font-weight: bold;
-            font-size: 14px;
-        """)
-        header_layout.addWidget(name_label)
-        
-        # תאריך ושעה
-        timestamp = QLabel(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        timestamp.setStyleSheet(f"""
-            color: {COLORS['on_surface']};
-            font-size: 10px;
-        """)
-        header_layout.addWidget(timestamp)
-        
-        header_layout.addStretch(1)
-        
-        # מספר טוקנים
-        tokens_label = QLabel(f"Tokens: {tokens}")
-        tokens_label.setStyleSheet(f"""
-            color: {COLORS['on_surface']};
-            font-size: 10px;
-        """)
-        header_layout.addWidget(tokens_label)
-        
-        layout.addLayout(header_layout)
-        
-        message = QLabel(text)
-        message.setWordWrap(True)
-        message.setStyleSheet(f"""
-            font-size: 13px;
-            color: {COLORS['on_surface']};
-            background-color: {COLORS['surface']};
-            border-radius: 10px;
-            padding: 10px;
-        """)
-        layout.addWidget(message)
-        
-        button_layout = QHBoxLayout()
-        button_layout.setSpacing(5)
-        
-        for icon, tooltip, action in [
-            ("🔖", "Bookmark", self.add_bookmark),
-            ("⏰", "Set Reminder", self.add_reminder),
-            ("🔊", "Speak Message", self.speak_message),
-            ("📋", "Copy", self.copy_text)
-        ]:
-            button = QPushButton(icon)
-            button.setToolTip(tooltip)
-            button.setStyleSheet(f"""
-                QPushButton {{
-                    background-color: {COLORS['surface']};
-                    color: {COLORS['on_surface']};
-                    border: none;
-                    border-radius: 15px;
-                    padding: 5px;
-                    font-size: 12px;
-                }}
-                QPushButton:hover {{
-                    background-color: {COLORS['primary']};
-                    color: {COLORS['on_primary']};
-                }}
-            """)
-            button.clicked.connect(action)
-            button_layout.addWidget(button)
-        
-        button_layout.addStretch(1)
-        layout.addLayout(button_layout)
-        
-        self.setStyleSheet(f"""
-            QFrame {{
-                background-color: {COLORS['surface']};
-                border-radius: 15px;
-                margin: 5px;
-            }}
-        """)
-
-    def get_main_window(self):
-        parent = self.parent()
-        while parent is not None:
-            if isinstance(parent, AIChat):
-                return parent
-            parent = parent.parent()
-        return None
-
-    def add_bookmark(self):
-        main_window = self.get_main_window()
-        if main_window:
-            main_window.add_bookmark(self.text)
-
-    def add_reminder(self):
-        main_window = self.get_main_window()
-        if main_window:
-            main_window.add_reminder(self.text)
-
-    def speak_message(self):
-        main_window = self.get_main_window()
-        if main_window:
-            main_window.speak_message(self.text)
-
-    def copy_text(self):
-        QApplication.clipboard().setText(self.text)
-
-class Conversation:
-    def __init__(self, name):
-        self.name = name
-        self.messages = []
+from request_scheduler import RequestScheduler, ChatRequest, DEFAULT_MAX_CONCURRENT, CHAT
+from conversation_analysis import ConversationAnalyzer
+from conversation_summary import ConversationSummarizer
+from chat_titles import TitleGenerator
+from ai_chat_extensions import initialize_extensions, create_model_usage_chart, create_message_count_chart
+from analytics import DEFAULT_TOP_N
+from context_builder import DEFAULT_TOKEN_BUDGET
+from token_counter import default_counter
+from conversation import Conversation
+from conversation_store import ConversationStore
+from chat_view import ChatMessageModel, ChatMessageDelegate, ChatView, STREAM_MAX_FPS, MAX_LOADED_CONVERSATIONS
+from theme_engine import ThemeEngine, DEFAULT_THEME
+from history_search import HistorySearchThread, SearchResultsPanel, SEARCH_DEBOUNCE_MS
+from model_registry import ModelRegistry, FALLBACK_MODELS
+from text_to_speech import TextToSpeech
+from voice_input import VoiceInput
+from conversation_archive import ExportThread, ImportThread, PROGRESS_STEPS
+from log_config import setup_logging
+
+# הלוגים נכתבים לקובץ מ-thread נפרד (ראו log_config)
+setup_logging()
+logger = logging.getLogger('AIChat.main')
 
 class AIChat(QMainWindow):
-    def __init__(self):
+    def __init__(self, store=None):
         super().__init__()
         self.setWindowTitle("AI Chat v0.9.8 🤖")
         self.setGeometry(100, 100, 1200, 800)
         self.conversations = []
         self.current_conversation = -1
+        self.store = store or ConversationStore()
+        self.chat_models = OrderedDict()
         self.font_size = 12
         self.username = getpass.getuser()
         self.current_model = None
-        logger.info(f"Initializing AI Chat application for user: {self.username}")
+        self.streaming_enabled = True
+        self.stream_max_fps = STREAM_MAX_FPS
+        self.max_concurrent_requests = DEFAULT_MAX_CONCURRENT
+        self.context_token_budget = DEFAULT_TOKEN_BUDGET
+        self.keep_alive = "30m"
+        logger.info("Initializing AI Chat application for user: %s", self.username)
         self.bookmarks = []
         self.reminders = []
         self.preset_instructions = self.load_preset_instructions()
+        self.setup_request_scheduler()
+        self.conversation_analyzer = ConversationAnalyzer(self.store, self.request_scheduler, parent=self)
+        self.summarizer = ConversationSummarizer(self.request_scheduler, parent=self)
+        self.title_generator = TitleGenerator(self.store, self.request_scheduler, parent=self)
+        self.title_generator.suggestions_ready.connect(self.choose_generated_title)
+        self.title_generator.title_generated.connect(self.apply_generated_title)
+        self.title_generator.failed.connect(
+            lambda conversation, error: self.statusBar().showMessage(f"Title generation failed: {error}"))
         self.setup_rtl()
         self.ui_scale = 100
-        self.current_theme = "Default"
+        self.current_theme = DEFAULT_THEME
+        self.theme_engine = ThemeEngine(self.current_theme, self.ui_scale, self)
+        self.model_registry = ModelRegistry(parent=self)
+        self.text_to_speech = TextToSpeech(parent=self)
+        self.archive_thread = None
+        self.voice_input = VoiceInput(parent=self)
+        self.voice_input_base = ""
+        self.voice_input.status_changed.connect(self.statusBar().showMessage)
+        self.voice_input.transcript_changed.connect(self.show_voice_transcript)
+        self.voice_input.error_occurred.connect(self.handle_voice_input_error)
+        self.voice_input.finished.connect(self.handle_voice_input_finished)
+        self.text_to_speech.speaking_changed.connect(self.handle_speaking_changed)
+        self.text_to_speech.error_occurred.connect(
+            lambda error: QMessageBox.warning(self, "Error", f"Failed to generate speech: {error}"))
         self.load_plugins()
         self.setup_ui()
+        self.setup_history_search()
         self.setup_toolbar()
         self.setup_connections()
         self.apply_glass_theme()
         self.setup_menu_bar()
         self.setup_status_bar()
         self.setup_footer()
-        self.refresh_models()
+        self.model_registry.refresh()
         self.setup_clock()
         self.setup_workstation_button()
         self.workstation_hub = None
         logger.info("Application initialized successfully")
         self.extensions = initialize_extensions(self)
         self.toolbar = self.addToolBar("Main Toolbar")
+        # קול, TTS וגרפים נטענים בהפעלה הראשונה; ה-prewarmer מקדים אותם כשהחלון פנוי
+        self.prewarmer = IdlePrewarmer(parent=self)
 
     def setup_rtl(self):
         QGuiApplication.setLayoutDirection(Qt.RightToLeft)
@@ -238,6 +114,7 @@ class AIChat(QMainWindow):
 
         # Sidebar (now on the right side)
         sidebar = QWidget()
+        sidebar.setObjectName("sidebar")
         sidebar.setFixedWidth(250)
         sidebar_layout = QVBoxLayout(sidebar)
         
@@ -247,28 +124,17 @@ class AIChat(QMainWindow):
         app_header_layout.setContentsMargins(20, 10, 20, 10)
         
         self.logo_button = QPushButton("🤖", self)
-        self.logo_button.setStyleSheet(f"""
-            QPushButton {{
-                font-size: 48px;
-                background-color: transparent;
-                border: none;
-                color: {COLORS['on_background']};
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-            }}
-        """)
+        self.logo_button.setObjectName("logoButton")
         self.logo_button.clicked.connect(self.open_settings_dashboard)
         app_header_layout.addWidget(self.logo_button)
         
         app_info_layout = QVBoxLayout()
         app_name_label = QLabel("AI Chat", alignment=Qt.AlignLeft)
-        app_name_label.setStyleSheet(f"font-size: 24px; font-weight: bold; color: {COLORS['on_background']};")
+        app_name_label.setObjectName("appNameLabel")
         app_info_layout.addWidget(app_name_label)
         
         version_label = QLabel("v0.9.8", alignment=Qt.AlignLeft)
-        version_label.setStyleSheet(f"font-size: 12px; color: {COLORS['on_background']};")
+        version_label.setObjectName("versionLabel")
         app_info_layout.addWidget(version_label)
         
         app_header_layout.addLayout(app_info_layout)
@@ -277,43 +143,12 @@ class AIChat(QMainWindow):
         sidebar_layout.addWidget(app_header)
         
         self.conversation_list = QListWidget()
-        self.conversation_list.setStyleSheet(f"""
-            QListWidget {{
-                background-color: {COLORS['surface']};
-                border: none;
-                border-radius: 5px;
-                padding: 5px;
-            }}
-            QListWidget::item {{
-                background-color: {COLORS['background']};
-                color: {COLORS['on_background']};
-                border-radius: 3px;
-                padding: 5px;
-                margin: 2px 0;
-            }}
-            QListWidget::item:selected {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-            }}
-        """)
+        self.conversation_list.setObjectName("conversationList")
         self.conversation_list.currentRowChanged.connect(self.change_conversation)
         sidebar_layout.addWidget(self.conversation_list)
 
         new_chat_button = QPushButton("New Chat 💬")
-        new_chat_button.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-                border: none;
-                padding: 10px;
-                border-radius: 5px;
-                font-weight: bold;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['secondary']};
-                color: {COLORS['on_secondary']};
-            }}
-        """)
+        new_chat_button.setProperty("variant", "primary")
         new_chat_button.clicked.connect(self.new_chat)
         sidebar_layout.addWidget(new_chat_button)
 
@@ -331,24 +166,8 @@ class AIChat(QMainWindow):
 
         export_import_layout.setContentsMargins(0, 0, 0, 0)
         export_import_widget = QWidget()
+        export_import_widget.setObjectName("exportImportBar")
         export_import_widget.setLayout(export_import_layout)
-        export_import_widget.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['surface']};
-                border-radius: 5px;
-            }}
-            QPushButton {{
-                background-color: transparent;
-                border: none;
-                font-size: 16px;
-                padding: 5px;
-                color: {COLORS['on_surface']};
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-            }}
-        """)
         sidebar_layout.addWidget(export_import_widget)
 
         upload_button = QPushButton("Upload File 📎")
@@ -357,9 +176,15 @@ class AIChat(QMainWindow):
 
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Search history...")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.textChanged.connect(self.schedule_history_search)
         self.search_input.returnPressed.connect(self.search_history)
         sidebar_layout.addWidget(self.search_input)
 
+        self.search_results = SearchResultsPanel()
+        self.search_results.message_selected.connect(self.jump_to_message)
+        sidebar_layout.addWidget(self.search_results)
+
         bookmark_button = QPushButton("Bookmarks and Reminders 🔖")
         bookmark_button.clicked.connect(self.show_bookmarks_and_reminders)
         sidebar_layout.addWidget(bookmark_button)
@@ -369,41 +194,21 @@ class AIChat(QMainWindow):
         sidebar_layout.addWidget(stats_button)
 
         # שיפור עיצוב הסרגל הצדדי
-        sidebar.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['background']};
-                border-radius: 10px;
-            }}
-            QPushButton {{
-                background-color: {COLORS['surface']};
-                color: {COLORS['on_surface']};
-                border: none;
-                padding: 10px;
-                margin: 5px;
-                border-radius: 5px;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-            }}
-        """)
 
         # הוספת הסרגל הצדדי לימין של התצוגה הראשית
         main_layout.addWidget(sidebar)
 
         # Chat area
         chat_widget = QWidget()
+        chat_widget.setObjectName("chatArea")
         chat_layout = QVBoxLayout(chat_widget)
 
-        self.chat_stack = QStackedWidget()
-        chat_layout.addWidget(self.chat_stack)
+        self.chat_view = ChatView()
+        self.message_delegate = ChatMessageDelegate(self.theme_engine.colors, self.font_size, self.chat_view)
+        self.message_delegate.action_triggered.connect(self.handle_message_action)
+        self.chat_view.setItemDelegate(self.message_delegate)
+        chat_layout.addWidget(self.chat_view)
 
-        chat_widget.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['background']};
-                border-radius: 10px;
-            }}
-        """)
 
         # הוספת כפתורים מעל תיבת הקלט
         button_layout = QHBoxLayout()
@@ -417,20 +222,7 @@ class AIChat(QMainWindow):
         ]:
             button = QPushButton(icon)
             button.setToolTip(tooltip)
-            button.setStyleSheet(f"""
-                QPushButton {{
-                    background-color: {COLORS['surface']};
-                    color: {COLORS['on_surface']};
-                    border: none;
-                    padding: 5px;
-                    border-radius: 5px;
-                    font-size: 16px;
-                }}
-                QPushButton:hover {{
-                    background-color: {COLORS['primary']};
-                    color: {COLORS['on_primary']};
-                }}
-            """)
+            button.setProperty("variant", "tool")
             button.clicked.connect(action)
             button_layout.addWidget(button)
         
@@ -440,17 +232,8 @@ class AIChat(QMainWindow):
         input_layout = QHBoxLayout()
         
         self.input_field = QTextEdit()
+        self.input_field.setObjectName("inputField")
         self.input_field.setPlaceholderText("הקלד את ההודעה שלך כאן... (Shift+Enter להוספת שורה, Enter לשליחה)")
-        self.input_field.setStyleSheet(f"""
-            QTextEdit {{
-                background-color: {COLORS['surface']};
-                border: 1px solid {COLORS['primary']};
-                border-radius: 5px;
-                padding: 5px;
-                font-size: 14px;
-                color: {COLORS['on_surface']};
-            }}
-        """)
         self.input_field.setFixedHeight(60)
         self.input_field.setMinimumHeight(60)
         self.input_field.setMaximumHeight(200)
@@ -458,76 +241,35 @@ class AIChat(QMainWindow):
         input_layout.addWidget(self.input_field)
 
         send_button = QPushButton("שלח")
-        send_button.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-                border: none;
-                padding: 10px 20px;
-                border-radius: 5px;
-                font-weight: bold;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['secondary']};
-                color: {COLORS['on_secondary']};
-            }}
-        """)
+        send_button.setProperty("variant", "primary")
         send_button.clicked.connect(self.send_message)
         input_layout.addWidget(send_button)
+
+        stop_button = QPushButton("⏹")
+        stop_button.setToolTip("Stop generating (Esc)")
+        stop_button.clicked.connect(self.stop_generation)
+        input_layout.addWidget(stop_button)
         
         chat_layout.addLayout(input_layout)
 
         # הוספת שורת תפריט מעל תיבת הקלט
         input_menu_layout = QHBoxLayout()
         self.preset_combo = QComboBox()
+        self.preset_combo.setProperty("variant", "instruction")
         self.preset_combo.addItems(self.preset_instructions.keys())
         self.preset_combo.currentTextChanged.connect(self.update_preset_instructions)
-        self.preset_combo.setStyleSheet(f"""
-            QComboBox {{
-                background-color: {COLORS['surface']};
-                color: {COLORS['on_surface']};
-                border: 1px solid {COLORS['primary']};
-                border-radius: 3px;
-                padding: 2px 5px;
-            }}
-            QComboBox::drop-down {{
-                subcontrol-origin: padding;
-                subcontrol-position: top right;
-                width: 15px;
-                border-left-width: 1px;
-                border-left-color: {COLORS['primary']};
-                border-left-style: solid;
-            }}
-            QComboBox::down-arrow {{
-                image: url(down_arrow.png);
-            }}
-        """)
         input_menu_layout.addWidget(self.preset_combo)
 
         self.instruction_combo = QComboBox()
+        self.instruction_combo.setProperty("variant", "instruction")
         self.instruction_combo.currentTextChanged.connect(self.insert_instruction)
-        self.instruction_combo.setStyleSheet(f"""
-            QComboBox {{
-                background-color: {COLORS['surface']};
-                color: {COLORS['on_surface']};
-                border: 1px solid {COLORS['primary']};
-                border-radius: 3px;
-                padding: 2px 5px;
-            }}
-            QComboBox::drop-down {{
-                subcontrol-origin: padding;
-                subcontrol-position: top right;
-                width: 15px;
-                border-left-width: 1px;
-                border-left-color: {COLORS['primary']};
-                border-left-style: solid;
-            }}
-            QComboBox::down-arrow {{
-                image: url(down_arrow.png);
-            }}
-        """)
         input_menu_layout.addWidget(self.instruction_combo)
 
+        pin_button = QPushButton("📌")
+        pin_button.setToolTip("Pin instruction to this chat's context")
+        pin_button.clicked.connect(self.pin_current_instruction)
+        input_menu_layout.addWidget(pin_button)
+
         chat_layout.addLayout(input_menu_layout)
 
         # Main splitter
@@ -538,7 +280,7 @@ class AIChat(QMainWindow):
 
         self.statusBar().showMessage("Ready")
 
-        self.new_chat()
+        self.load_conversations()
 
         logger.debug("UI setup completed")
 
@@ -546,78 +288,109 @@ class AIChat(QMainWindow):
         self.conversation_list.setContextMenuPolicy(Qt.CustomContextMenu)
         self.conversation_list.customContextMenuRequested.connect(self.show_context_menu)
 
-    def add_chat_display(self):
-        chat_display = QWidget()
-        chat_display_layout = QVBoxLayout(chat_display)
-        chat_display_layout.setAlignment(Qt.AlignTop)
-        chat_display_layout.setSpacing(10)
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setWidget(chat_display)
-        self.chat_stack.addWidget(scroll_area)
+    def load_conversations(self):
+        # בעלייה נטענת רק רשימת השיחות; ההודעות נקראות כשהשיחה נפתחת
+        for conversation_id, name in self.store.load_conversations():
+            self.add_conversation(Conversation(name, self.context_token_budget, conversation_id, self.store))
+        logger.info("Loaded %s conversations from %s", len(self.conversations), self.store.path)
+        if self.conversations:
+            self.conversation_list.setCurrentRow(len(self.conversations) - 1)
+        else:
+            self.new_chat()
+
+    def add_conversation(self, conversation):
+        self.conversations.append(conversation)
+        item = QListWidgetItem(conversation.name)
+        item.setFlags(item.flags() | Qt.ItemIsEditable)
+        self.conversation_list.addItem(item)
 
     def new_chat(self):
         logger.info("Creating new chat")
         initial_message = "שלום! כיצד אוכל לסייע לך היום? 😊"
-        new_conv = Conversation(f"שיחה חדשה {len(self.conversations) + 1} 💬")
-        self.conversations.append(new_conv)
-        self.add_chat_display()
-        item = QListWidgetItem(new_conv.name)
-        item.setFlags(item.flags() | Qt.ItemIsEditable)
-        self.conversation_list.addItem(item)
+        new_conv = Conversation.create(f"שיחה חדשה {len(self.conversations) + 1} 💬", self.context_token_budget,
+                                       self.store)
+        self.add_conversation(new_conv)
         self.conversation_list.setCurrentRow(len(self.conversations) - 1)
         self.add_message_to_chat(initial_message, False)
-        logger.info(f"New chat created: {new_conv.name}")
+        logger.info("New chat created: %s", new_conv.name)
 
     def generate_chat_title(self, conversation_index, num_suggestions=3):
+        # ההצעות מגיעות ב-suggestions_ready; הממשק לא מחכה למודל
         conversation = self.conversations[conversation_index]
-        
-        prompt = f"Based on this conversation, suggest {num_suggestions} short and descriptive titles (max 5 words each):\n\n"
-        for msg, is_user in conversation.messages[:5]:  # Use up to the first 5 messages
-            prompt += f"{'User' if is_user else 'AI'}: {msg}\n"
-        
-        selected_model = self.model_selector.currentText()
-        titles = self.get_ollama_response(selected_model, prompt).strip().split('\n')
-        
-        # Limit each title to 5 words and ensure we have the correct number of suggestions
-        titles = [' '.join(title.split()[:5]) for title in titles[:num_suggestions]]
-        titles = titles + [f"Suggestion {i+1}" for i in range(len(titles), num_suggestions)]
-        
+        if self.title_generator.suggest(conversation, num_suggestions, self.model_selector.currentText(),
+                                        {"keep_alive": self.keep_alive}):
+            self.statusBar().showMessage("Generating title suggestions...")
+
+    def choose_generated_title(self, conversation, titles):
+        if conversation not in self.conversations:
+            return
+        self.statusBar().showMessage("Ready")
         chosen_title = self.choose_title_dialog(titles)
-        
         if chosen_title:
-            conversation.name = chosen_title
-            self.conversation_list.item(conversation_index).setText(chosen_title)
+            self.set_conversation_title(conversation, chosen_title)
+
+    def apply_generated_title(self, conversation, title):
+        if conversation in self.conversations:
+            logger.info("Chat titled automatically: %s", title)
+            self.set_conversation_title(conversation, title)
+
+    def set_conversation_title(self, conversation, title):
+        conversation.rename(title)
+        self.conversation_list.item(self.conversations.index(conversation)).setText(title)
 
     def change_conversation(self, index):
         if 0 <= index < len(self.conversations):
             self.current_conversation = index
-            self.chat_stack.setCurrentIndex(index)
-
-    def get_ollama_models(self):
-        try:
-            result = subprocess.run(['ollama', 'list'], capture_output=True, text=True)
-            models = result.stdout.strip().split('\n')[1:]  # Skip the header
-            return [model.split()[0] for model in models]
-        except Exception as e:
-            self.statusBar().showMessage(f"Error fetching Ollama models: {e}")
-            return ["Default Model"]
-
-    def refresh_models(self):
+            self.chat_view.setModel(self.chat_model(self.conversations[index], create=True))
+            self.chat_view.scrollToBottom()
+
+    def chat_model(self, conversation, create=False):
+        # מודל נוצר רק לשיחה שנפתחה; שיחות אחרות נשארות בלי הודעות בזיכרון
+        model = self.chat_models.get(id(conversation))
+        if model is None and create:
+            model = ChatMessageModel(conversation, self.stream_max_fps, self)
+            model.text_updated.connect(lambda: self.scroll_to_bottom(conversation))
+            self.chat_models[id(conversation)] = model
+        if model is not None and create:
+            self.chat_models.move_to_end(id(conversation))
+            self.evict_chat_models()
+        return model
+
+    def evict_chat_models(self):
+        # רק השיחות האחרונות שנפתחו נשארות טעונות; שיחה עם בקשה פעילה נשארת עד שתסתיים
+        for key in list(self.chat_models)[:-MAX_LOADED_CONVERSATIONS]:
+            model = self.chat_models[key]
+            conversation = model.conversation
+            if model.streams or self.request_scheduler.is_conversation_busy(conversation, None):
+                continue
+            if conversation.unload():
+                del self.chat_models[key]
+                model.deleteLater()
+
+    def update_model_selector(self, models):
+        models = models or FALLBACK_MODELS
+        if [self.model_selector.itemText(i) for i in range(self.model_selector.count())] == models:
+            return
         current_model = self.model_selector.currentText()
+        self.model_selector.blockSignals(True)
         self.model_selector.clear()
-        models = self.get_ollama_models()
         self.model_selector.addItems(models)
         if current_model in models:
             self.model_selector.setCurrentText(current_model)
-        else:
+        self.model_selector.blockSignals(False)
+        if self.model_selector.currentText() != self.current_model:
             self.update_current_model(self.model_selector.currentText())
         self.statusBar().showMessage("Models refreshed")
 
+    def refresh_models(self):
+        # רענון יזום עוקף את ה-cache; הרשימה מגיעה ב-models_changed
+        if self.model_registry.refresh(force=True):
+            self.statusBar().showMessage("Refreshing models...")
+
     def send_message(self):
         user_message = self.input_field.toPlainText().strip()
         if user_message:
-            logger.info(f"Sending user message: {user_message[:50]}...")
+            logger.info("Sending user message: %s...", user_message[:50])
             self.add_message_to_chat(user_message, True)
             self.input_field.clear()
             self.input_field.setFixedHeight(60)  # Reset input field height after sending
@@ -625,73 +398,181 @@ class AIChat(QMainWindow):
             self.statusBar().showMessage("Processing...")
             self.progress_bar.setVisible(True)
             
-            logger.debug(f"Starting Ollama thread with model: {self.current_model}")
-            self.ollama_thread = OllamaThread(self.current_model, f"{self.username}: {user_message}")
-            self.ollama_thread.response_received.connect(self.handle_ollama_response)
-            self.ollama_thread.error_occurred.connect(self.handle_ollama_error)
-            self.ollama_thread.finished.connect(self.ollama_request_finished)
-            self.ollama_thread.start()
-
-    def handle_ollama_response(self, response):
-        logger.info(f"AI response received: {response[:50]}...")
-        tokens = self.calculate_tokens(response)
-        self.add_message_to_chat(response, False, tokens)
-
-    def calculate_tokens(self, text):
-        # This is a simple token calculation. Replace with a more accurate method if needed.
-        return len(text.split())
-
-    def handle_ollama_error(self, error_message):
-        logger.error(f"Ollama error: {error_message}")
-        self.add_message_to_chat(error_message, False)
-
-    def ollama_request_finished(self):
-        logger.debug("Ollama request finished")
-        self.statusBar().showMessage("Ready")
-        self.progress_bar.setVisible(False)
+            conversation = self.conversations[self.current_conversation]
+            # הודעה חדשה מחליפה בקשות שעוד ממתינות בתור של אותה שיחה
+            dropped = self.request_scheduler.drop_queued(conversation)
+            if dropped:
+                logger.info("Dropped %s queued request(s) superseded by the new message", len(dropped))
+            model = self.current_model
+            request = ChatRequest(conversation, model, stream=self.streaming_enabled,
+                                  prepare=lambda: self.prepare_request(conversation, model))
+            self.request_scheduler.submit(request)
+
+    def prepare_request(self, conversation, model):
+        # נבנה ממש לפני שליחה, כדי לכלול תשובות קודמות באותה שיחה
+        prompt, options = conversation.build_request(self.username, model)
+        options["keep_alive"] = self.keep_alive
+        logger.debug("Starting Ollama request with model: %s (reusing context: %s, prompt tokens: ~%s)", model,
+                     'context' in options, self.calculate_tokens(prompt, model))
+        return prompt, options
+
+    def setup_request_scheduler(self):
+        self.request_scheduler = RequestScheduler(self.max_concurrent_requests, parent=self)
+        self.request_scheduler.request_started.connect(self.handle_request_started)
+        self.request_scheduler.token_received.connect(self.handle_ollama_token)
+        self.request_scheduler.first_token_received.connect(self.handle_first_token)
+        self.request_scheduler.response_received.connect(self.handle_ollama_response)
+        self.request_scheduler.error_occurred.connect(self.handle_ollama_error)
+        self.request_scheduler.request_finished.connect(self.ollama_request_finished)
+        self.request_scheduler.request_cancelled.connect(self.handle_request_cancelled)
+
+    def change_max_concurrent_requests(self, max_concurrent):
+        self.max_concurrent_requests = max_concurrent
+        self.request_scheduler.set_max_concurrent(max_concurrent)
+
+    def handle_request_started(self, request):
+        if request.kind != CHAT:
+            return
+        model = self.chat_model(request.conversation)
+        if request.stream and model is not None:
+            request.streaming_message = model.begin_stream(request.model)
+            self.scroll_to_bottom(request.conversation)
+
+    def handle_ollama_token(self, request, chunk):
+        if request.streaming_message is not None:
+            request.streaming_message.append_text(chunk)
+
+    def handle_first_token(self, request, seconds):
+        logger.info("Time to first token: %.3fs", seconds)
+        self.statusBar().showMessage(f"Receiving... (first token after {seconds:.2f}s)")
+
+    def handle_ollama_response(self, request, response):
+        # בקשות רקע (למשל ניתוח שיחות) מטופלות אצל מי ששלח אותן
+        if request.kind != CHAT:
+            return
+        logger.info("AI response received: %s...", response[:50])
+        conversation = request.conversation
+        if conversation not in self.conversations:
+            logger.debug("Dropping response for deleted chat '%s'", conversation.name)
+            return
+        # Ollama מחזיר את מספר הטוקנים האמיתי של התשובה; הערכה רק כשהוא חסר
+        tokens = default_counter.observe(request.model, response, request.metadata.get("eval_count"))
+        logger.debug("Response tokens: %s (prompt evaluated: %s)", tokens, request.metadata.get('prompt_eval_count'))
+        self.add_response_message(request, response, tokens)
+        if request.metadata.get("context"):
+            conversation.set_kv_context(request.metadata["context"], request.model)
+        else:
+            conversation.invalidate_context()
 
-    def add_message_to_chat(self, message, is_user, tokens=None):
-        if self.current_conversation >= 0:
-            chat_display = self.chat_stack.widget(self.current_conversation).widget()
-            if tokens is None:
-                tokens = self.calculate_tokens(message)
-            message_widget = ChatMessage(message, is_user, model_name=self.current_model, tokens=tokens)
-            message_widget.setStyleSheet(f"""
-                ChatMessage {{
-                    background-color: {COLORS['surface']};
-                    border-radius: 10px;
-                    margin: 5px;
-                    padding: 10px;
-                }}
-            """)
-            
-            chat_display.layout().addWidget(message_widget)
-            
-            # Scroll to bottom
-            QTimer.singleShot(0, lambda: self.scroll_to_bottom(self.current_conversation))
+    def add_response_message(self, request, text, tokens):
+        if request.streaming_message is not None:
+            request.streaming_message.finish_text(text, tokens)
+        else:
+            self.add_message_to_chat(text, False, tokens, conversation=request.conversation, model=request.model)
 
-            # Add the message to the conversation history
-            self.conversations[self.current_conversation].messages.append((message, is_user, self.current_model, tokens))
+    def calculate_tokens(self, text, model=None):
+        return default_counter.count(text, model or self.current_model)
 
-    def scroll_to_bottom(self, conversation_index):
-        scroll_area = self.chat_stack.widget(conversation_index)
-        scroll_bar = scroll_area.verticalScrollBar()
-        scroll_bar.setValue(scroll_bar.maximum())
+    def handle_ollama_error(self, request, error_message):
+        logger.error("Ollama error: %s", error_message)
+        if request.kind != CHAT or request.conversation not in self.conversations:
+            return
+        request.conversation.invalidate_context()
+        if request.streaming_message is not None:
+            partial = request.streaming_message.text + "".join(request.streaming_message.pending_chunks)
+            text = f"{partial}\n\n{error_message}" if partial else error_message
+        else:
+            text = error_message
+        self.add_response_message(request, text, self.calculate_tokens(text, request.model))
 
-    def get_ollama_response(self, model, prompt):
-        try:
-            result = subprocess.run(['ollama', 'run', model, prompt], capture_output=True, text=True, timeout=30)
-            if result.returncode != 0:
-                raise Exception(f"Ollama returned non-zero exit status {result.returncode}")
-            return result.stdout.strip()
-        except subprocess.TimeoutExpired:
-            return "Error: Ollama response time exceeded the limit."
-        except Exception as e:
-            return f"Error getting response from Ollama: {str(e)}"
+    def stop_generation(self):
+        if self.text_to_speech.is_speaking():
+            self.text_to_speech.stop()
+        if self.current_conversation < 0:
+            return
+        conversation = self.conversations[self.current_conversation]
+        if self.request_scheduler.cancel_conversation(conversation):
+            logger.info("Stopping generation in '%s'", conversation.name)
+            self.statusBar().showMessage("Stopping...")
+
+    def handle_request_cancelled(self, request, partial):
+        logger.info("Generation stopped after %s characters", len(partial))
+        if request.kind != CHAT:
+            return
+        self.statusBar().showMessage("Generation stopped")
+        if request.conversation not in self.conversations:
+            return
+        # ה-context של המודל לא כולל את התשובה החלקית
+        request.conversation.invalidate_context()
+        partial = partial.strip()
+        if partial:
+            self.add_response_message(request, partial, self.calculate_tokens(partial, request.model))
+        elif request.streaming_message is not None:
+            request.streaming_message.discard()
+
+    def ollama_request_finished(self, request):
+        logger.debug("Ollama request finished")
+        request.streaming_message = None
+        if request.metrics_record is not None and request.conversation in self.conversations:
+            self.store.record_request(request.conversation.id, request.metrics_record)
+        if request.kind == CHAT and request.conversation in self.conversations:
+            self.update_summary(request.conversation, request.model)
+            # שיחה חדשה מקבלת כותרת אחרי ההחלפה הראשונה (פעם אחת, ברקע)
+            self.title_generator.auto_title(request.conversation, request.model, {"keep_alive": self.keep_alive})
+        if not self.request_scheduler.is_busy(CHAT):
+            self.statusBar().showMessage("Ready")
+            self.progress_bar.setVisible(False)
+
+    def update_summary(self, conversation, model):
+        # כשההיסטוריה חורגת מתקציב ה-context, ההודעות שיצאו מהחלון מסוכמות ברקע ונשלחות כסיכום
+        if self.summarizer.needs_update(conversation):
+            self.summarizer.update(conversation, model, {"keep_alive": self.keep_alive})
+
+    def add_message_to_chat(self, message, is_user, tokens=None, conversation=None, model=None):
+        if conversation is None:
+            if self.current_conversation < 0:
+                return
+            conversation = self.conversations[self.current_conversation]
+        model = model or self.current_model
+        if tokens is None:
+            tokens = self.calculate_tokens(message, model)
+        chat_model = self.chat_model(conversation)
+        if chat_model is not None:
+            chat_model.add_message(message, is_user, model, tokens)
+        else:
+            conversation.add_message(message, is_user, model, tokens)
+        QTimer.singleShot(0, lambda: self.scroll_to_bottom(conversation))
+
+    def scroll_to_bottom(self, conversation):
+        chat_model = self.chat_model(conversation)
+        if chat_model is not None and self.chat_view.model() is chat_model:
+            self.chat_view.scrollToBottom()
+
+    def handle_message_action(self, action, text):
+        if action == "bookmark":
+            self.add_bookmark(text)
+        elif action == "reminder":
+            self.add_reminder(text)
+        elif action == "speak":
+            self.speak_message(text)
+        elif action == "copy":
+            QApplication.clipboard().setText(text)
 
     def closeEvent(self, event):
         logger.info("Application closing")
         self.refresh_timer.stop()
+        self.prewarmer.stop()
+        self.text_to_speech.shutdown()
+        self.voice_input.shutdown()
+        if self.archive_thread is not None:
+            self.archive_thread.cancel()
+            self.archive_thread.wait(5000)
+        self.model_registry.wait()
+        self.conversation_analyzer.shutdown()
+        self.request_scheduler.cancel_all(wait_ms=2000)
+        self.request_scheduler.metrics.close()
+        self.search_thread.stop()
+        self.store.close()
         super().closeEvent(event)
 
     def rename_conversation(self, item):
@@ -700,8 +581,8 @@ class AIChat(QMainWindow):
             new_name, ok = QInputDialog.getText(self, "Rename Chat 🏷️", "Enter new chat name:", text=current_name)
             if ok and new_name:
                 item.setText(new_name)
-                self.conversations[self.conversation_list.row(item)].name = new_name
-                logger.info(f"Chat renamed from '{current_name}' to '{new_name}'")
+                self.conversations[self.conversation_list.row(item)].rename(new_name)
+                logger.info("Chat renamed from '%s' to '%s'", current_name, new_name)
 
     def choose_title_dialog(self, titles):
         dialog = QDialog(self)
@@ -739,99 +620,86 @@ class AIChat(QMainWindow):
         return None
 
     def apply_glass_theme(self):
-        self.setStyleSheet(f"""
-            QMainWindow {{
-                background-color: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                                                  stop:0 {COLORS['background']}, stop:1 {COLORS['surface']});
-            }}
-            QWidget {{
-                color: {COLORS['on_background']};
-                font-family: Arial, sans-serif;
-            }}
-            QPushButton {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-                font-weight: bold;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['secondary']};
-                color: {COLORS['on_secondary']};
-            }}
-            QLineEdit, QTextEdit {{
-                background-color: {COLORS['surface']};
-                border: 1px solid {COLORS['primary']};
-                border-radius: 4px;
-                padding: 4px;
-                color: {COLORS['on_surface']};
-            }}
-            QLabel {{
-                color: {COLORS['on_surface']};
-            }}
-            QMenuBar {{
-                background-color: {COLORS['background']};
-                color: {COLORS['on_background']};
-            }}
-            QMenuBar::item:selected {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-            }}
-            QMenu {{
-                background-color: {COLORS['surface']};
-                color: {COLORS['on_surface']};
-                border: 1px solid {COLORS['primary']};
-            }}
-            QMenu::item:selected {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-            }}
-        """)
+        self.theme_engine.theme_changed.connect(self.update_message_colors)
+        self.theme_engine.apply()
+
+    def update_message_colors(self, theme):
+        # הבועות מצוירות ע"י ה-delegate, אז מספיק לצבוע מחדש את השורות הגלויות
+        self.message_delegate.colors = self.theme_engine.colors
+        self.chat_view.viewport().update()
 
     def change_font_size(self, size):
         self.font_size = size
-        for i in range(self.chat_stack.count()):
-            chat_display = self.chat_stack.widget(i).widget()
-            for j in range(chat_display.layout().count()):
-                item = chat_display.layout().itemAt(j).widget()
-                if isinstance(item, ChatMessage):
-                    item.setStyleSheet(f"font-size: {size}px;")
+        self.message_delegate.set_font_size(size)
+        self.chat_view.refresh_layout()
 
     def export_conversations(self):
         logger.info("Exporting conversations")
-        file_name, _ = QFileDialog.getSaveFileName(self, "Save Conversations", "", "JSON File (*.json)")
+        file_name, selected_filter = QFileDialog.getSaveFileName(
+            self, "Save Conversations", "", "JSON Lines (*.jsonl);;JSON File (*.json)")
         if file_name:
-            try:
-                with open(file_name, 'w', encoding='utf-8') as f:
-                    json.dump([{'name': c.name, 'messages': c.messages} for c in self.conversations], f, ensure_ascii=False, indent=2)
-                logger.info(f"Conversations exported successfully to {file_name}")
-                QMessageBox.information(self, "Export Successful", "Conversations exported successfully.")
-            except Exception as e:
-                logger.error(f"Error exporting conversations: {str(e)}")
-                QMessageBox.critical(self, "Export Error", f"An error occurred while exporting conversations: {str(e)}")
+            if not os.path.splitext(file_name)[1]:
+                file_name += ".json" if selected_filter.startswith("JSON File") else ".jsonl"
+            self.run_archive_thread(ExportThread(self.store, self.conversations, file_name), "Exporting conversations...")
 
     def import_conversations(self):
         logger.info("Importing conversations")
-        file_name, _ = QFileDialog.getOpenFileName(self, "Load Conversations", "", "JSON File (*.json)")
+        file_name, _ = QFileDialog.getOpenFileName(
+            self, "Load Conversations", "", "Conversation archives (*.jsonl *.json);;All Files (*)")
         if file_name:
-            try:
-                with open(file_name, 'r', encoding='utf-8') as f:
-                    imported_conversations = json.load(f)
-                for conv in imported_conversations:
-                    new_conv = Conversation(conv['name'])
-                    new_conv.messages = conv['messages']
-                    self.conversations.append(new_conv)
-                    self.add_chat_display()
-                    item = QListWidgetItem(new_conv.name)
-                    item.setFlags(item.flags() | Qt.ItemIsEditable)
-                    self.conversation_list.addItem(item)
+            thread = ImportThread(self.store, file_name)
+            # השיחות נוספות לרשימה בלבד; ההודעות נטענות רק כשהשיחה נפתחת
+            thread.conversation_imported.connect(
+                lambda conversation_id, name: self.add_conversation(
+                    Conversation(name, self.context_token_budget, conversation_id, self.store)))
+            self.run_archive_thread(thread, "Importing conversations...")
+
+    def run_archive_thread(self, thread, label):
+        if self.archive_thread is not None:
+            self.statusBar().showMessage("An export or import is already running")
+            return
+        self.archive_thread = thread
+        progress = QProgressDialog(label, "Cancel", 0, PROGRESS_STEPS, self)
+        progress.setWindowTitle("Conversations")
+        progress.setMinimumDuration(300)
+        progress.setAutoClose(False)
+        progress.canceled.connect(thread.cancel)
+        thread.progress.connect(progress.setValue)
+        thread.completed.connect(
+            lambda conversations, messages, errors: self.handle_archive_completed(thread, conversations, messages, errors))
+        thread.failed.connect(lambda error: self.handle_archive_failed(thread, error))
+        thread.finished.connect(lambda: self.handle_archive_finished(thread, progress))
+        thread.start()
+
+    def handle_archive_completed(self, thread, conversations, messages, errors):
+        if errors:
+            QMessageBox.warning(self, "Export Finished With Errors",
+                                f"Exported {conversations} conversations ({messages} messages).\n"
+                                f"{len(errors)} conversation(s) could not be exported:\n" + "\n".join(errors[:5]))
+        elif isinstance(thread, ImportThread):
+            if conversations:
                 self.conversation_list.setCurrentRow(len(self.conversations) - 1)
-                logger.info(f"Conversations imported successfully from {file_name}")
-                QMessageBox.information(self, "Import Successful", "Conversations imported successfully.")
-            except Exception as e:
-                logger.error(f"Error importing conversations: {str(e)}")
-                QMessageBox.critical(self, "Import Error", f"An error occurred while importing conversations: {str(e)}")
+                self.title_generator.title_untitled(self.conversations, self.model_selector.currentText(),
+                                                    {"keep_alive": self.keep_alive})
+            QMessageBox.information(self, "Import Successful",
+                                    f"Imported {conversations} conversations ({messages} messages).")
+        else:
+            QMessageBox.information(self, "Export Successful",
+                                    f"Exported {conversations} conversations ({messages} messages).")
+
+    def handle_archive_failed(self, thread, error):
+        if isinstance(thread, ImportThread):
+            QMessageBox.critical(self, "Import Error", f"An error occurred while importing conversations: {error}")
+        else:
+            QMessageBox.critical(self, "Export Error", f"An error occurred while exporting conversations: {error}")
+
+    def handle_archive_finished(self, thread, progress):
+        progress.close()
+        progress.deleteLater()
+        if thread.cancelled:
+            self.statusBar().showMessage("Import cancelled" if isinstance(thread, ImportThread) else "Export cancelled")
+        self.archive_thread = None
+        thread.deleteLater()
 
     def show_context_menu(self, position):
         item = self.conversation_list.itemAt(position)
@@ -883,19 +751,20 @@ class AIChat(QMainWindow):
 
     def setup_footer(self):
         footer = QWidget()
+        footer.setObjectName("footer")
         footer_layout = QHBoxLayout(footer)
         footer_layout.setContentsMargins(10, 5, 10, 5)
 
         # שעון ותאריך
         self.clock_label = QLabel("", alignment=Qt.AlignLeft)
-        self.clock_label.setStyleSheet(f"font-size: 14px; color: {COLORS['on_background']};")
+        self.clock_label.setObjectName("clockLabel")
         footer_layout.addWidget(self.clock_label)
 
         footer_layout.addStretch(1)
 
         # לוגו במרכז
         logo_label = QLabel("🤖", alignment=Qt.AlignCenter)
-        logo_label.setStyleSheet("font-size: 24px;")
+        logo_label.setObjectName("footerLogo")
         footer_layout.addWidget(logo_label)
 
         footer_layout.addStretch(1)
@@ -906,26 +775,17 @@ class AIChat(QMainWindow):
         model_layout.addWidget(model_label)
         
         self.model_selector = QComboBox()
-        self.model_selector.addItems(get_available_models())
+        # החיבור לפני המילוי: כשה-snapshot עדכני models_changed לא נשלח, וזו הבחירה היחידה של מודל
         self.model_selector.currentTextChanged.connect(self.update_current_model)
+        self.model_selector.addItems(self.model_registry.models or FALLBACK_MODELS)
         model_layout.addWidget(self.model_selector)
+        self.model_registry.models_changed.connect(self.update_model_selector)
+        self.model_registry.refresh_failed.connect(
+            lambda error: self.statusBar().showMessage(f"Error fetching Ollama models: {error}"))
 
         refresh_button = QPushButton("🔄")
+        refresh_button.setObjectName("refreshModelsButton")
         refresh_button.setToolTip("Refresh Models")
-        refresh_button.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-                border: none;
-                padding: 5px;
-                border-radius: 3px;
-                font-size: 16px;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['secondary']};
-                color: {COLORS['on_secondary']};
-            }}
-        """)
         refresh_button.clicked.connect(self.refresh_models)
         model_layout.addWidget(refresh_button)
 
@@ -934,20 +794,17 @@ class AIChat(QMainWindow):
         self.statusBar().addPermanentWidget(footer)
 
         self.refresh_timer = QTimer(self)
-        self.refresh_timer.timeout.connect(self.refresh_models)
-        self.refresh_timer.start(300000)  # רענון כל 5 דקות
+        self.refresh_timer.timeout.connect(self.model_registry.refresh)
+        self.refresh_timer.start(60000)  # בדיקה כל דקה; פונה ל-Ollama רק כשה-cache פג
 
-        footer.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['surface']};
-                color: {COLORS['on_surface']};
-                border-top: 1px solid {COLORS['primary']};
-            }}
-        """)
 
     def update_current_model(self, model_name):
+        if model_name != self.current_model:
+            # ה-context של מודל אחד חסר משמעות עבור מודל אחר
+            for conv in self.conversations:
+                conv.invalidate_context()
         self.current_model = model_name
-        logger.info(f"Current model updated to: {self.current_model}")
+        logger.info("Current model updated to: %s", self.current_model)
 
     def setup_clock(self):
         self.update_clock()
@@ -970,23 +827,40 @@ class AIChat(QMainWindow):
             self.add_message_to_chat(f"File uploaded: {file_name}", True)
             # כאן תוכל להוסיף לוגיקה לשליחת הובץ ל-AI או לטיפול בו
 
+    def setup_history_search(self):
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.search_history)
+        self.search_thread = HistorySearchThread(self.store, parent=self)
+        self.search_thread.results_ready.connect(self.search_results.add_results)
+        self.search_thread.search_finished.connect(self.search_results.finish)
+        self.search_thread.start()
+
+    def schedule_history_search(self, text):
+        if not text.strip():
+            self.search_timer.stop()
+            self.search_thread.cancel()
+            self.search_results.clear_results()
+            return
+        self.search_timer.start()
+
     def search_history(self):
+        self.search_timer.stop()
         search_term = self.search_input.text()
-        results = []
-        for conv in self.conversations:
-            for msg, is_user, model, tokens in conv.messages:
-                if search_term.lower() in msg.lower():
-                    results.append((conv.name, msg))
-        
-        # הצג את תוצאות החיפוש בחלון נפרד
-        dialog = QDialog(self)
-        dialog.setWindowTitle("Search Results")
-        layout = QVBoxLayout(dialog)
-        result_list = QListWidget()
-        for conv_name, msg in results:
-            result_list.addItem(f"{conv_name}: {msg[:50]}...")
-        layout.addWidget(result_list)
-        dialog.exec_()
+        if not search_term.strip():
+            return
+        generation = self.search_thread.submit(search_term)
+        self.search_results.begin(generation, {conv.id: conv.name for conv in self.conversations})
+
+    def jump_to_message(self, conversation_id, position):
+        for index, conversation in enumerate(self.conversations):
+            if conversation.id == conversation_id:
+                self.conversation_list.setCurrentRow(index)
+                if position < len(conversation.messages):
+                    self.chat_view.scroll_to_row(position)
+                return
+        self.statusBar().showMessage("The conversation for this result no longer exists")
 
     def show_bookmarks_and_reminders(self):
         dialog = QDialog(self)
@@ -1021,33 +895,14 @@ class AIChat(QMainWindow):
         dialog = QDialog(self)
         dialog.setWindowTitle("Statistics")
         layout = QVBoxLayout(dialog)
-        
-        # יצירת גרף עוגה לשימוש במודלים
-        pie_chart = QChart()
-        series = QPieSeries()
-        model_usage = {}
-        for conv in self.conversations:
-            for _, _, model, _ in conv.messages:
-                model_usage[model] = model_usage.get(model, 0) + 1
-        for model, count in model_usage.items():
-            series.append(model, count)
-        pie_chart.addSeries(series)
-        pie_chart.setTitle("Model Usage")
-        chart_view = QChartView(pie_chart)
-        layout.addWidget(chart_view)
-        
-        # יצירת גרף עמודות למספר ההודעות בכל שיחה
-        bar_chart = QChart()
-        bar_series = QBarSeries()
-        for conv in self.conversations:
-            bar_set = QBarSet(conv.name)
-            bar_set.append(len(conv.messages))
-            bar_series.append(bar_set)
-        bar_chart.addSeries(bar_series)
-        bar_chart.setTitle("Number of Messages in Each Chat")
-        bar_chart_view = QChartView(bar_chart)
-        layout.addWidget(bar_chart_view)
-        
+
+        # הגרפים נבנים מהסכומים המצטברים במסד; אף שיחה לא נטענת לזיכרון.
+        # בלי flush: מה שעוד בתור של ה-writer ייכנס בפתיחה הבאה, וה-GUI לא מחכה לו
+        stats = self.store.load_stats()
+        names = {conv.id: conv.name for conv in self.conversations}
+        layout.addWidget(create_model_usage_chart(stats, DEFAULT_TOP_N, "Model Usage"))
+        layout.addWidget(create_message_count_chart(stats, names, DEFAULT_TOP_N, "Number of Messages in Each Chat"))
+
         dialog.exec_()
 
     def add_bookmark(self, message):
@@ -1062,13 +917,16 @@ class AIChat(QMainWindow):
                 reminder_time = QDateTime.fromString(time, "yyyy-MM-dd HH:mm")
                 self.reminders.append({"text": message, "time": reminder_time})
                 QMessageBox.information(self, "Reminder Added", f"Reminder set for {time}")
-                logger.info(f"Reminder added for {time}")
+                logger.info("Reminder added for %s", time)
             except:
                 QMessageBox.warning(self, "Error", "Invalid time format")
                 logger.warning("Failed to add reminder due to invalid time format")
 
     def eventFilter(self, source, event):
         if source is self.input_field and event.type() == QEvent.KeyPress:
+            if event.key() == Qt.Key_Escape:
+                self.stop_generation()
+                return True
             if event.key() == Qt.Key_Return:
                 if event.modifiers() & Qt.ShiftModifier:
                     # Shift+Enter: הוספת שורה חדשה והגדלת התיבה
@@ -1118,9 +976,24 @@ class AIChat(QMainWindow):
                 self.input_field.append('\n')
             self.input_field.append(instruction)
 
+    def pin_current_instruction(self):
+        instruction = self.instruction_combo.currentText()
+        if instruction and self.current_conversation >= 0:
+            self.conversations[self.current_conversation].pin_instruction(instruction)
+            self.statusBar().showMessage("Instruction pinned to chat context")
+            logger.info("Instruction pinned: %s", instruction[:50])
+
+    def change_context_budget(self, token_budget):
+        self.context_token_budget = token_budget
+        for conv in self.conversations:
+            if conv.is_loaded:
+                conv.context_window.set_token_budget(token_budget, conv.messages)
+            else:
+                conv.context_window.token_budget = token_budget
+
     def detect_system_and_setup_microphone(self):
         system = platform.system()
-        logger.info(f"Detected operating system: {system}")
+        logger.info("Detected operating system: %s", system)
 
         if system == "Windows":
             return self.setup_windows_microphone()
@@ -1129,7 +1002,7 @@ class AIChat(QMainWindow):
         elif system == "Linux":
             return self.setup_linux_microphone()
         else:
-            logger.warning(f"Unsupported operating system: {system}")
+            logger.warning("Unsupported operating system: %s", system)
             return None
 
     def setup_windows_microphone(self):
@@ -1137,7 +1010,7 @@ class AIChat(QMainWindow):
         for i in range(p.get_device_count()):
             dev = p.get_device_info_by_index(i)
             if dev['maxInputChannels'] > 0:
-                logger.info(f"Found input device: {dev['name']}")
+                logger.info("Found input device: %s", dev['name'])
                 return dev['index']
         logger.warning("No suitable microphone found on Windows")
         return None
@@ -1152,13 +1025,13 @@ class AIChat(QMainWindow):
             for i in range(0, num_devices):
                 if (p.get_device_info_by_host_api_device_index(0, i).get('maxInputChannels')) > 0:
                     device_name = p.get_device_info_by_host_api_device_index(0, i).get('name')
-                    logger.info(f"Found input device: {device_name}")
+                    logger.info("Found input device: %s", device_name)
                     return i
             
             # ניסיון שני: שימוש ב-speech_recognition לקבלת רשימת מכשירים
             mic_list = sr.Microphone.list_microphone_names()
             if mic_list:
-                logger.info(f"Available microphones: {mic_list}")
+                logger.info("Available microphones: %s", mic_list)
                 return mic_list.index(mic_list[0])  # בחירת המיקרופון הראשון ברשימה
             
             # ניסיון שלישי: שימוש במיקרופון ברירת המחדל
@@ -1166,7 +1039,7 @@ class AIChat(QMainWindow):
             return None
         
         except Exception as e:
-            logger.error(f"Error setting up macOS microphone: {str(e)}")
+            logger.error("Error setting up macOS microphone: %s", str(e))
             return None
 
     def setup_linux_microphone(self):
@@ -1175,35 +1048,27 @@ class AIChat(QMainWindow):
         return None
 
     def start_voice_input(self):
-        r = sr.Recognizer()
-        try:
-            with sr.Microphone() as source:
-                self.statusBar().showMessage("Adjusting for ambient noise...")
-                r.adjust_for_ambient_noise(source, duration=1)
-                self.statusBar().showMessage("Listening... Speak now.")
-                audio = r.listen(source, timeout=10, phrase_time_limit=10)
-                self.statusBar().showMessage("Processing speech...")
-
-            text = r.recognize_google(audio, language='en-US')
-            self.input_field.append(text)
+        # לחיצה נוספת בזמן האזנה מסיימת את ההקלטה
+        if self.voice_input.is_listening():
+            self.voice_input.stop()
+            self.statusBar().showMessage("Stopping voice input...")
+            return
+        self.voice_input_base = self.input_field.toPlainText()
+        self.voice_input.start()
+
+    def show_voice_transcript(self, transcript):
+        separator = " " if self.voice_input_base and not self.voice_input_base.endswith(("\n", " ")) else ""
+        self.input_field.setPlainText(f"{self.voice_input_base}{separator}{transcript}")
+        self.input_field.moveCursor(QTextCursor.End)
+
+    def handle_voice_input_error(self, error):
+        self.statusBar().showMessage(error)
+        QMessageBox.warning(self, "Error", f"{error}. Please try again.")
+        logger.warning("Voice input failed: %s", error)
+
+    def handle_voice_input_finished(self, transcript):
+        if transcript:
             self.statusBar().showMessage("Speech recognized")
-            logger.info(f"Speech recognized: {text}")
-        except sr.WaitTimeoutError:
-            self.statusBar().showMessage("No speech detected")
-            QMessageBox.warning(self, "Error", "No speech detected. Please try again.")
-            logger.warning("No speech detected during voice input")
-        except sr.UnknownValueError:
-            self.statusBar().showMessage("Could not understand audio")
-            QMessageBox.warning(self, "Error", "Could not understand audio. Please try again.")
-            logger.warning("Speech recognition failed: Could not understand audio")
-        except sr.RequestError as e:
-            self.statusBar().showMessage(f"Could not request results; {e}")
-            QMessageBox.warning(self, "Error", f"Failed to process speech: {str(e)}")
-            logger.error(f"Speech recognition request failed: {str(e)}")
-        except Exception as e:
-            self.statusBar().showMessage(f"An error occurred: {e}")
-            QMessageBox.warning(self, "Error", f"An unexpected error occurred: {str(e)}")
-            logger.error(f"Unexpected error during speech recognition: {str(e)}")
 
     def setup_menu_bar(self):
         menu_bar = self.menuBar()
@@ -1248,38 +1113,14 @@ class AIChat(QMainWindow):
         about_action.triggered.connect(self.show_about_dialog)
         help_menu.addAction(about_action)
 
-        menu_bar.setStyleSheet(f"""
-            QMenuBar {{
-                background-color: {COLORS['background']};
-                color: {COLORS['on_background']};
-            }}
-            QMenuBar::item:selected {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-            }}
-            QMenu {{
-                background-color: {COLORS['surface']};
-                color: {COLORS['on_surface']};
-                border: 1px solid {COLORS['primary']};
-            }}
-            QMenu::item:selected {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-            }}
-        """)
 
     def change_ui_scale(self, scale):
         self.ui_scale = scale
-        self.setStyleSheet(f"font-size: {int(9 * scale / 100)}pt;")
-        # Adjust other UI elements as needed
+        self.theme_engine.apply(scale=scale)
 
     def change_theme(self, theme):
-        self.current_theme = theme
-        if theme == "Dark":
-            self.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
-        elif theme == "Light":
-            self.setStyleSheet("")
-        # Add more theme options as needed
+        self.theme_engine.apply(theme=theme)
+        self.current_theme = self.theme_engine.theme
 
     def load_plugins(self):
         self.plugins = []
@@ -1294,7 +1135,7 @@ class AIChat(QMainWindow):
                     plugin = __import__(f"plugins.{plugin_name}", fromlist=["Plugin"])
                     self.plugins.append(plugin.Plugin(self))
                 except ImportError as e:
-                    logger.error(f"Failed to load plugin {plugin_name}: {str(e)}")
+                    logger.error("Failed to load plugin %s: %s", plugin_name, str(e))
 
     def open_settings_dashboard(self):
         settings_dialog = SettingsDialog(self)
@@ -1305,18 +1146,11 @@ class AIChat(QMainWindow):
         dashboard.exec_()
 
     def speak_message(self, message):
-        try:
-            tts = gTTS(text=message, lang='en')
-            tts.save("temp_speech.mp3")
-            pygame.mixer.init()
-            pygame.mixer.music.load("temp_speech.mp3")
-            pygame.mixer.music.play()
-            while pygame.mixer.music.get_busy():
-                pygame.time.Clock().tick(10)
-            os.remove("temp_speech.mp3")
-        except Exception as e:
-            logger.error(f"Error in text-to-speech: {str(e)}")
-            QMessageBox.warning(self, "Error", f"Failed to generate speech: {str(e)}")
+        # הסינתזה רצה ב-thread נפרד וההשמעה בתור, כך שהממשק לא נתקע
+        self.text_to_speech.speak(message)
+
+    def handle_speaking_changed(self, speaking):
+        self.statusBar().showMessage("Speaking... (Esc to stop)" if speaking else "Done speaking", 3000)
 
     def setup_toolbar(self):
         self.toolbar = self.addToolBar("Main Toolbar")
@@ -1325,21 +1159,8 @@ class AIChat(QMainWindow):
 
     def setup_workstation_button(self):
         workstation_button = QPushButton("🏢", self)
+        workstation_button.setObjectName("workstationButton")
         workstation_button.setToolTip("Open AI WorkStation Hub")
-        workstation_button.setStyleSheet(f"""
-            QPushButton {{
-                font-size: 24px;
-                background-color: transparent;
-                border: none;
-                padding: 5px;
-                color: {COLORS['on_background']};
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['on_primary']};
-                border-radius: 15px;
-            }}
-        """)
         workstation_button.clicked.connect(self.toggle_workstation_hub)
         
         self.toolbar.addWidget(workstation_button)
@@ -1367,9 +1188,14 @@ class AIChat(QMainWindow):
 
     def delete_conversation(self, index):
         if 0 <= index < len(self.conversations):
-            del self.conversations[index]
+            conversation = self.conversations.pop(index)
+            # בקשות שבתור או בריצה היו כותבות תשובה ומדדים לשיחה שנמחקה
+            self.request_scheduler.cancel_conversation(conversation, kind=None)
+            self.summarizer.cancel(conversation)
+            self.title_generator.forget(conversation)
+            conversation.delete()
+            self.chat_models.pop(id(conversation), None)
             self.conversation_list.takeItem(index)
-            self.chat_stack.removeWidget(self.chat_stack.widget(index))
             if len(self.conversations) == 0:
                 self.new_chat()
             elif index == self.current_conversation:
@@ -1379,4 +1205,5 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = AIChat()
     window.show()
+    window.prewarmer.start()
     sys.exit(app.exec_())
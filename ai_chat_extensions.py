@@ -5,23 +5,15 @@ import logging
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
-from PyQt5.QtChart import *
-import qdarkstyle
 import datetime
 import getpass
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import speech_recognition as sr
-from gtts import gTTS
-import pygame
 import platform
-import pyaudio
-import psutil
-from PyQt5.QtPrintSupport import QPrinter, QPrintDialog
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-import tempfile
+from lazy_modules import psutil, QtChart
+from chat_export import ChatExportThread, EXPORT_FORMATS, export_file_names
+from request_metrics import PERCENTILES
+from analytics import TIME_RANGES, DEFAULT_TOP_N, UNKNOWN_LABEL, range_start, top_n, group_days, model_totals
 
-logger = logging.getLogger('AIChat')
+logger = logging.getLogger('AIChat.ai_chat_extensions')
 
 class AIChatExtensions:
     def __init__(self, main_window):
@@ -32,6 +24,7 @@ class AIChatExtensions:
         self.setup_advanced_ui()
         self.setup_advanced_features()
         self.setup_plugins()
+        self.batch_processor = BatchProcessor(self.main_window)
 
     def setup_advanced_ui(self):
         self.main_window.setWindowTitle("AI Chat v1.0.0 🚀")
@@ -40,22 +33,6 @@ class AIChatExtensions:
         self.setup_advanced_menu_bar()
 
     def setup_advanced_toolbar(self):
-        self.main_window.toolbar.setStyleSheet("""
-            QToolBar {
-                background-color: #2C3E50;
-                border: none;
-                spacing: 10px;
-            }
-            QToolButton {
-                background-color: #34495E;
-                color: white;
-                border-radius: 5px;
-                padding: 5px;
-            }
-            QToolButton:hover {
-                background-color: #4E6D8C;
-            }
-        """)
         
         # הוספת כפתורים מתקדמים לסרגל הכלים
         actions = [
@@ -170,8 +147,7 @@ class AIChatExtensions:
 
     def batch_process_chats(self):
         # עיבוד אצווה של שיחות
-        processor = BatchProcessor(self.main_window)
-        processor.process_chats()
+        self.batch_processor.process_chats()
 
     def get_cpu_usage(self):
         return psutil.cpu_percent()
@@ -180,17 +156,12 @@ class AIChatExtensions:
         return psutil.virtual_memory().percent
 
     def perform_advanced_search(self, search_params):
-        results = []
-        keyword = search_params['keyword'].lower()
-        search_date = QDate.fromString(search_params['date'], "yyyy-MM-dd")
-        
-        for conv in self.main_window.conversations:
-            for msg, is_user, model, tokens in conv.messages:  # עדכון ל-4 ערכים
-                msg_date = QDateTime.fromString(msg[4], "yyyy-MM-dd HH:mm:ss").date()  # שימוש ב-msg[4] לתאריך
-                if keyword in msg.lower() and msg_date >= search_date:
-                    results.append((conv.name, msg, msg[4]))  # שימוש ב-msg[4] לתאריך
-        
-        return results
+        names = {conv.id: conv.name for conv in self.main_window.conversations}
+        hits = self.main_window.store.search(search_params['keyword'], since=search_params['date'],
+                                             model=search_params['model'], is_user=search_params['is_user'],
+                                             limit=200)
+        return [(names.get(conversation_id, ""), text, timestamp)
+                for conversation_id, _, text, _, _, timestamp in hits]
 
     def show_search_results(self, results):
         dialog = QDialog(self.main_window)
@@ -226,6 +197,18 @@ class AdvancedSearchDialog(QDialog):
         self.date_range = QDateEdit()
         self.date_range.setCalendarPopup(True)
         layout.addWidget(self.date_range)
+
+        self.model_combo = QComboBox()
+        self.model_combo.addItem("כל המודלים", None)
+        model_selector = self.parent().model_selector
+        for i in range(model_selector.count()):
+            self.model_combo.addItem(model_selector.itemText(i), model_selector.itemText(i))
+        layout.addWidget(self.model_combo)
+
+        self.role_combo = QComboBox()
+        for label, is_user in (("כל ההודעות", None), ("הודעות משתמש", True), ("תשובות AI", False)):
+            self.role_combo.addItem(label, is_user)
+        layout.addWidget(self.role_combo)
         
         self.search_button = QPushButton("חפש")
         self.search_button.clicked.connect(self.accept)
@@ -234,7 +217,9 @@ class AdvancedSearchDialog(QDialog):
     def get_search_params(self):
         return {
             "keyword": self.keyword_input.text(),
-            "date": self.date_range.date().toString("yyyy-MM-dd")
+            "date": self.date_range.date().toString("yyyy-MM-dd"),
+            "model": self.model_combo.currentData(),
+            "is_user": self.role_combo.currentData()
         }
 
 class PluginManager:
@@ -254,7 +239,7 @@ class PluginManager:
                     plugin = __import__(f"plugins.{plugin_name}", fromlist=["Plugin"])
                     self.plugins.append(plugin.Plugin(self.main_window))
                 except ImportError as e:
-                    logger.error(f"Failed to load plugin {plugin_name}: {str(e)}")
+                    logger.error("Failed to load plugin %s: %s", plugin_name, str(e))
 
     def show_manager_dialog(self):
         # הצגת חלון ניהול התוספים
@@ -266,43 +251,48 @@ class VoiceCommandRecognizer:
         self.main_window = main_window
 
     def start_listening(self):
-        r = sr.Recognizer()
-        try:
-            with sr.Microphone() as source:
-                self.main_window.statusBar().showMessage("Adjusting for ambient noise...")
-                r.adjust_for_ambient_noise(source, duration=1)
-                self.main_window.statusBar().showMessage("Listening... Speak now.")
-                audio = r.listen(source, timeout=10, phrase_time_limit=10)
-                self.main_window.statusBar().showMessage("Processing speech...")
-
-            text = r.recognize_google(audio, language='en-US')
-            self.main_window.input_field.append(text)
-            self.main_window.statusBar().showMessage("Speech recognized")
-            logger.info(f"Speech recognized: {text}")
-        except sr.WaitTimeoutError:
-            self.main_window.statusBar().showMessage("No speech detected")
-            QMessageBox.warning(self.main_window, "Error", "No speech detected. Please try again.")
-            logger.warning("No speech detected during voice input")
-        except sr.UnknownValueError:
-            self.main_window.statusBar().showMessage("Could not understand audio")
-            QMessageBox.warning(self.main_window, "Error", "Could not understand audio. Please try again.")
-            logger.warning("Speech recognition failed: Could not understand audio")
-        except sr.RequestError as e:
-            self.main_window.statusBar().showMessage(f"Could not request results; {e}")
-            QMessageBox.warning(self.main_window, "Error", f"Failed to process speech: {str(e)}")
-            logger.error(f"Speech recognition request failed: {str(e)}")
-        except Exception as e:
-            self.main_window.statusBar().showMessage(f"An error occurred: {e}")
-            QMessageBox.warning(self.main_window, "Error", f"An unexpected error occurred: {str(e)}")
-            logger.error(f"Unexpected error during speech recognition: {str(e)}")
+        # ההקלטה והזיהוי רצים ב-thread של שירות הקלט הקולי של החלון הראשי
+        self.main_window.start_voice_input()
 
 class AutoSummarizer:
     def __init__(self, main_window):
         self.main_window = main_window
+        self.requested = None
+        self.main_window.summarizer.summary_updated.connect(self.handle_summary_updated)
+        self.main_window.summarizer.failed.connect(self.handle_summary_failed)
 
     def summarize_current_chat(self):
-        # סיכום השיחה הנוכחית
-        pass
+        # סיכום השיחה הנוכחית; רק ההודעות שנוספו מאז הסיכום הקודם נשלחות למודל
+        if self.main_window.current_conversation < 0:
+            return
+        conversation = self.main_window.conversations[self.main_window.current_conversation]
+        summarizer = self.main_window.summarizer
+        if summarizer.update(conversation, self.main_window.current_model,
+                             {"keep_alive": self.main_window.keep_alive}, end=len(conversation.messages)) \
+                or summarizer.is_updating(conversation):
+            self.requested = conversation
+            self.main_window.statusBar().showMessage(f"מסכם את '{conversation.name}'...")
+        else:
+            self.show_summary(conversation)
+
+    def handle_summary_updated(self, conversation):
+        if conversation is self.requested and not self.main_window.summarizer.is_updating(conversation):
+            self.requested = None
+            self.main_window.statusBar().showMessage("הסיכום מוכן")
+            self.show_summary(conversation)
+
+    def handle_summary_failed(self, conversation, error):
+        if conversation is self.requested:
+            self.requested = None
+            QMessageBox.warning(self.main_window, "שגיאה", f"לא ניתן לסכם את השיחה: {error}")
+
+    def show_summary(self, conversation):
+        if not conversation.summary:
+            QMessageBox.information(self.main_window, "סיכום שיחה", "אין עדיין מה לסכם בשיחה הזו")
+            return
+        QMessageBox.information(self.main_window, f"סיכום: {conversation.name}",
+                                f"{conversation.summary}\n\n(הסיכום כולל {conversation.summary_position} "
+                                f"מתוך {len(conversation.messages)} הודעות)")
 
 class AdvancedSearcher:
     def __init__(self, main_window):
@@ -317,67 +307,234 @@ class PDFExporter:
         self.main_window = main_window
 
     def export_current_chat(self):
-        if not self.main_window.conversations:
+        if not self.main_window.conversations or self.main_window.current_conversation < 0:
             QMessageBox.warning(self.main_window, "שגיאה", "אין שיחה להמרה ל-PDF")
             return
-        
+
         current_conv = self.main_window.conversations[self.main_window.current_conversation]
-        
-        html_content = f"<h1>{current_conv.name}</h1>"
-        for msg, is_user, model, tokens, timestamp in current_conv.messages:
-            sender = "משתמש" if is_user else model
-            html_content += f"<p><strong>{sender} ({timestamp}):</strong> {msg}</p>"
-        
-        # יצירת קובץ HTML זמני
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False) as temp_file:
-            temp_file.write(html_content)
-            temp_file_path = temp_file.name
-        
-        # יצירת מסמך PDF
-        printer = QPrinter(QPrinter.HighResolution)
-        printer.setOutputFormat(QPrinter.PdfFormat)
-        printer.setOutputFileName(f"{current_conv.name}.pdf")
-        
-        web_view = QWebEngineView()
-        web_view.load(QUrl.fromLocalFile(temp_file_path))
-        
-        def handle_print():
-            web_view.page().print(printer, lambda success: None)
-            os.unlink(temp_file_path)  # מחיקת הקובץ הזמני
-        
-        web_view.loadFinished.connect(handle_print)
+        default_path = export_file_names([current_conv.name], "", ".pdf")[0]
+        file_name, selected_filter = QFileDialog.getSaveFileName(
+            self.main_window, "ייצוא שיחה", default_path, "PDF (*.pdf);;HTML (*.html)")
+        if not file_name:
+            return
+        if os.path.splitext(file_name)[1].lower() not in EXPORT_FORMATS:
+            file_name += ".html" if selected_filter.startswith("HTML") else ".pdf"
+        self.main_window.run_archive_thread(ChatExportThread(self.main_window.store, [(current_conv, file_name)]),
+                                            f"מייצא את '{current_conv.name}'...")
+
+ANALYSIS_SENTIMENT_COLUMN = 2
 
 class BatchProcessor:
     def __init__(self, main_window):
         self.main_window = main_window
+        self.results_requested = False
+        self.sort_column = None
+        analyzer = self.main_window.conversation_analyzer
+        analyzer.progress.connect(self.show_analysis_progress)
+        analyzer.failed.connect(self.show_analysis_error)
+        analyzer.finished.connect(self.show_analysis_results)
 
     def process_chats(self):
-        options = ["ייצוא לPDF", "ניתוח רגשות", "זיהוי נושאים"]
+        options = ["ייצוא לPDF", "ייצוא ל-HTML", "ניתוח רגשות", "זיהוי נושאים", "ניתוח עם המודל הנוכחי"]
         choice, ok = QInputDialog.getItem(self.main_window, "עיבוד אצווה", 
                                           "בחר פעולה לביצוע על כל השיחות:", options, 0, False)
         if ok and choice:
             if choice == "ייצוא לPDF":
-                self.export_all_to_pdf()
+                self.export_all(".pdf")
+            elif choice == "ייצוא ל-HTML":
+                self.export_all(".html")
             elif choice == "ניתוח רגשות":
                 self.analyze_sentiments()
             elif choice == "זיהוי נושאים":
                 self.identify_topics()
+            elif choice == "ניתוח עם המודל הנוכחי":
+                self.run_analysis(llm_model=self.main_window.current_model)
 
-    def export_all_to_pdf(self):
-        exporter = PDFExporter(self.main_window)
-        for conv in self.main_window.conversations:
-            # כאן נצטרך להתאים את הלוגיקה של הייצוא לPDF כך שתעבוד על שיחה ספציפית
-            pass
+    def export_all(self, extension):
+        conversations = self.main_window.conversations
+        if not conversations:
+            return
+        directory = QFileDialog.getExistingDirectory(self.main_window, "בחר תיקייה לייצוא")
+        if not directory:
+            return
+        # כל שיחה לקובץ משלה; הרינדור רץ במקביל ב-threads עם מגבלה על מספרם
+        paths = export_file_names([conv.name for conv in conversations], directory, extension)
+        self.main_window.run_archive_thread(ChatExportThread(self.main_window.store, list(zip(conversations, paths))),
+                                            f"מייצא {len(conversations)} שיחות ל-{EXPORT_FORMATS[extension]}...")
 
     def analyze_sentiments(self):
-        # כאן יש להוסיף קוד לניתוח רגשות של כל השיחות
-        pass
+        self.run_analysis(ANALYSIS_SENTIMENT_COLUMN)
 
     def identify_topics(self):
-        # כאן יש להוסיף קוד לזיהוי נושאים בכל השיחות
-        pass
+        self.run_analysis()
+
+    def run_analysis(self, sort_column=None, llm_model=None):
+        # רק שיחות שהשתנו מאז הריצה הקודמת נקראות מחדש; השאר מגיעות מה-cache
+        analyzer = self.main_window.conversation_analyzer
+        options = {"keep_alive": self.main_window.keep_alive}
+        if not analyzer.analyze(self.main_window.conversations, llm_model, options):
+            QMessageBox.information(self.main_window, "עיבוד אצווה", "ניתוח שיחות כבר רץ ברקע")
+            return
+        self.results_requested = True
+        self.sort_column = sort_column
+        self.main_window.statusBar().showMessage("מנתח שיחות...")
+
+    def show_analysis_progress(self, done, total):
+        self.main_window.statusBar().showMessage(f"מנתח שיחות... {done}/{total}")
+
+    def show_analysis_error(self, error):
+        self.results_requested = False
+        QMessageBox.critical(self.main_window, "שגיאה", f"הניתוח נכשל: {error}")
+
+    def show_analysis_results(self):
+        self.main_window.statusBar().showMessage("הניתוח הסתיים")
+        if not self.results_requested:
+            return
+        self.results_requested = False
+        dialog = QDialog(self.main_window)
+        dialog.setWindowTitle("ניתוח שיחות")
+        dialog.resize(800, 500)
+        layout = QVBoxLayout(dialog)
+        table = create_analysis_table(self.main_window)
+        if self.sort_column is not None:
+            table.sortItems(self.sort_column, Qt.DescendingOrder)
+        layout.addWidget(table)
+        close_button = QPushButton("סגור")
+        close_button.clicked.connect(dialog.accept)
+        layout.addWidget(close_button)
+        dialog.exec_()
+
+def create_analysis_table(main_window):
+    # התוצאות נקראות מה-cache של הניתוח; שום שיחה לא נטענת לזיכרון
+    results = main_window.conversation_analyzer.results
+    table = QTableWidget(0, 6)
+    table.setHorizontalHeaderLabels(["שיחה", "הודעות", "רגש", "", "נושאים", "ניתוח המודל"])
+    table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    for conv in main_window.conversations:
+        record = results.get(conv.id)
+        if record is None:
+            continue
+        row = table.rowCount()
+        table.insertRow(row)
+        # ערכים מספריים נשמרים כמספרים כדי שהמיון לפי עמודה יהיה מספרי
+        messages = QTableWidgetItem()
+        messages.setData(Qt.DisplayRole, record["messages"])
+        sentiment = QTableWidgetItem()
+        sentiment.setData(Qt.DisplayRole, record["sentiment"])
+        llm = record.get("llm")
+        llm_text = f"{llm['label']}: {', '.join(llm['topics'])}" if llm else ""
+        if llm and llm["revision"] != record["revision"]:
+            llm_text += " (ישן)"
+        for column, item in enumerate([QTableWidgetItem(conv.name), messages, sentiment,
+                                       QTableWidgetItem(record["label"]),
+                                       QTableWidgetItem(", ".join(record.get("topics", []))),
+                                       QTableWidgetItem(llm_text)]):
+            table.setItem(row, column, item)
+    table.resizeColumnsToContents()
+    table.horizontalHeader().setStretchLastSection(True)
+    return table
+
+def format_percentiles(values, unit=""):
+    if values is None:
+        return "-"
+    return " / ".join(f"{values[p]:.2f}{unit}" for p in PERCENTILES)
+
+
+def create_metrics_table(summary):
+    table = QTableWidget(0, 7)
+    table.setHorizontalHeaderLabels(["מודל", "בקשות", "שגיאות", "זמן כולל", "טוקן ראשון",
+                                     "טוקנים לשנייה", "המתנה בתור"])
+    table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    for model, entry in sorted(summary.items(), key=lambda item: -item[1]["requests"]):
+        row = table.rowCount()
+        table.insertRow(row)
+        requests = QTableWidgetItem()
+        requests.setData(Qt.DisplayRole, entry["requests"])
+        errors = QTableWidgetItem()
+        errors.setData(Qt.DisplayRole, entry["errors"])
+        for column, item in enumerate([QTableWidgetItem(model or "-"), requests, errors,
+                                       QTableWidgetItem(format_percentiles(entry["latency"], "s")),
+                                       QTableWidgetItem(format_percentiles(entry["ttft"], "s")),
+                                       QTableWidgetItem(format_percentiles(entry["tokens_per_second"])),
+                                       QTableWidgetItem(format_percentiles(entry["queue_wait"], "s"))]):
+            table.setItem(row, column, item)
+    table.resizeColumnsToContents()
+    table.horizontalHeader().setStretchLastSection(True)
+    return table
+
+def create_model_usage_chart(stats, top, title="שימוש במודלים"):
+    series = QtChart.QPieSeries()
+    usage = [(model or UNKNOWN_LABEL, entry["messages"]) for model, entry in stats["models"].items() if entry["messages"]]
+    for model, count in top_n(usage, top):
+        series.append(model, count)
+
+    chart = QtChart.QChart()
+    chart.addSeries(series)
+    chart.setTitle(title)
+
+    chart_view = QtChart.QChartView(chart)
+    chart_view.setRenderHint(QPainter.Antialiasing)
+    return chart_view
+
+
+def create_bar_chart(items, title, label="מספר הודעות"):
+    # סדרה אחת עם קטגוריות - לא QBarSet לכל שיחה
+    bar_set = QtChart.QBarSet(label)
+    categories = []
+    for name, value in items:
+        bar_set.append(value)
+        categories.append(name if len(name) <= 24 else name[:23] + "…")
+
+    series = QtChart.QBarSeries()
+    series.append(bar_set)
+
+    chart = QtChart.QChart()
+    chart.addSeries(series)
+    chart.setTitle(title)
+    chart.legend().setVisible(False)
+
+    axis_x = QtChart.QBarCategoryAxis()
+    axis_x.append(categories)
+    chart.addAxis(axis_x, Qt.AlignBottom)
+    series.attachAxis(axis_x)
+
+    axis_y = QtChart.QValueAxis()
+    axis_y.setLabelFormat("%d")
+    chart.addAxis(axis_y, Qt.AlignLeft)
+    series.attachAxis(axis_y)
+
+    chart_view = QtChart.QChartView(chart)
+    chart_view.setRenderHint(QPainter.Antialiasing)
+    return chart_view
+
+
+def create_message_count_chart(stats, names, top, title="מספר הודעות בכל שיחה"):
+    counts = [(names.get(conversation_id, str(conversation_id)), messages)
+              for conversation_id, (messages, _) in stats["conversations"].items()]
+    return create_bar_chart(top_n(counts, top), title)
+
+
+def create_model_totals_table(stats):
+    table = QTableWidget(0, 7)
+    table.setHorizontalHeaderLabels(["מודל", "הודעות", "טוקנים", "בקשות", "שגיאות", "זמן ממוצע (s)",
+                                     "טוקנים לשנייה"])
+    table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    for row in model_totals(stats):
+        index = table.rowCount()
+        table.insertRow(index)
+        for column, value in enumerate(row):
+            item = QTableWidgetItem()
+            if isinstance(value, float):
+                value = round(value, 2)
+            item.setData(Qt.DisplayRole, "-" if value is None else value)
+            table.setItem(index, column, item)
+    table.resizeColumnsToContents()
+    table.horizontalHeader().setStretchLastSection(True)
+    return table
 
 class AnalyticsDashboard(QDialog):
+    """Charts and tables over the store's aggregates; nothing here reads the messages themselves."""
+
     def __init__(self, main_window):
         super().__init__(main_window)
         self.main_window = main_window
@@ -386,64 +543,59 @@ class AnalyticsDashboard(QDialog):
 
     def setup_ui(self):
         layout = QVBoxLayout(self)
-        
-        # גרף עוגה לשימוש במודלים
-        pie_chart = self.create_model_usage_chart()
-        layout.addWidget(pie_chart)
-        
-        # גרף עמודות למספר ההודעות בכל שיחה
-        bar_chart = self.create_message_count_chart()
-        layout.addWidget(bar_chart)
-        
+
+        # טווח זמן ומספר הפריטים שמוצגים בנפרד; השאר מקובצים ל"אחר"
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("טווח זמן:"))
+        self.range_combo = QComboBox()
+        for label, days in TIME_RANGES:
+            self.range_combo.addItem(label, days)
+        self.range_combo.setCurrentIndex(len(TIME_RANGES) - 1)
+        self.range_combo.currentIndexChanged.connect(self.refresh)
+        controls.addWidget(self.range_combo)
+        controls.addWidget(QLabel("הצג את:"))
+        self.top_spin = QSpinBox()
+        self.top_spin.setRange(1, 50)
+        self.top_spin.setValue(DEFAULT_TOP_N)
+        self.top_spin.valueChanged.connect(self.refresh)
+        controls.addWidget(self.top_spin)
+        controls.addStretch()
+        layout.addLayout(controls)
+
+        self.charts_layout = QGridLayout()
+        layout.addLayout(self.charts_layout)
+        self.refresh()
+
+        # רגשות ונושאים מהניתוח האחרון (עיבוד אצווה)
+        layout.addWidget(QLabel("ניתוח רגשות ונושאים"))
+        if self.main_window.conversation_analyzer.results:
+            layout.addWidget(create_analysis_table(self.main_window))
+        else:
+            layout.addWidget(QLabel("עדיין לא הורץ ניתוח - הפעל \"ניתוח רגשות\" מעיבוד אצווה"))
+
+        # זמני תגובה ותפוקה של הבקשות האחרונות, לפי מודל
+        layout.addWidget(QLabel("ביצועי בקשות לפי מודל (p50 / p95 / p99)"))
+        summary = self.main_window.request_scheduler.metrics.summary()
+        if summary:
+            layout.addWidget(create_metrics_table(summary))
+        else:
+            layout.addWidget(QLabel("עדיין לא נשלחו בקשות למודל"))
+
         close_button = QPushButton("סגור")
         close_button.clicked.connect(self.accept)
         layout.addWidget(close_button)
 
-    def create_model_usage_chart(self):
-        series = QPieSeries()
-        model_usage = {}
-        for conv in self.main_window.conversations:
-            for _, _, model, _ in conv.messages:  # עדכון ל-4 ערכים
-                model_usage[model] = model_usage.get(model, 0) + 1
-        
-        for model, count in model_usage.items():
-            series.append(model, count)
-        
-        chart = QChart()
-        chart.addSeries(series)
-        chart.setTitle("שימוש במודלים")
-        
-        chart_view = QChartView(chart)
-        chart_view.setRenderHint(QPainter.Antialiasing)
-        return chart_view
-
-    def create_message_count_chart(self):
-        set0 = QBarSet("מספר הודעות")
-        categories = []
-        
-        for conv in self.main_window.conversations:
-            set0.append(len(conv.messages))
-            categories.append(conv.name)
-        
-        series = QBarSeries()
-        series.append(set0)
-        
-        chart = QChart()
-        chart.addSeries(series)
-        chart.setTitle("מספר הודעות בכל שיחה")
-        
-        axis_x = QBarCategoryAxis()
-        axis_x.append(categories)
-        chart.addAxis(axis_x, Qt.AlignBottom)
-        series.attachAxis(axis_x)
-        
-        axis_y = QValueAxis()
-        chart.addAxis(axis_y, Qt.AlignLeft)
-        series.attachAxis(axis_y)
-        
-        chart_view = QChartView(chart)
-        chart_view.setRenderHint(QPainter.Antialiasing)
-        return chart_view
+    def refresh(self):
+        while self.charts_layout.count():
+            self.charts_layout.takeAt(0).widget().deleteLater()
+        # הסכומים שכבר נשמרו; לא מחכים ל-writer ב-thread של ה-GUI
+        stats = self.main_window.store.load_stats(range_start(self.range_combo.currentData()))
+        names = {conv.id: conv.name for conv in self.main_window.conversations}
+        top = self.top_spin.value()
+        self.charts_layout.addWidget(create_model_usage_chart(stats, top), 0, 0)
+        self.charts_layout.addWidget(create_message_count_chart(stats, names, top), 0, 1)
+        self.charts_layout.addWidget(create_bar_chart(group_days(stats["days"]), "הודעות לפי תאריך"), 1, 0)
+        self.charts_layout.addWidget(create_model_totals_table(stats), 1, 1)
 
 class AdvancedSettingsDialog(QDialog):
     def __init__(self, main_window):
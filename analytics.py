@@ -0,0 +1,55 @@
+"""Figures for the analytics dashboard, computed from the store's aggregates.
+
+ConversationStore keeps running totals of messages and tokens per
+conversation, day and model, and of request latency per model. It updates
+them with every write (see `load_stats`), so the dashboard never reads the
+messages themselves. The helpers here pick the time range and fold the long
+tail of models and conversations into one "other" bucket, so a chart stays
+readable with hundreds of chats.
+"""
+import datetime
+
+# (תווית, מספר ימים אחורה); None - כל התקופה
+TIME_RANGES = [("7 ימים", 7), ("30 יום", 30), ("90 יום", 90), ("שנה", 365), ("הכל", None)]
+DEFAULT_TOP_N = 10
+OTHER_LABEL = "אחר"
+UNKNOWN_LABEL = "-"
+# מעבר לזה הימים מקובצים לחודשים, כדי שהגרף היומי לא יהפוך לפס צפוף
+MAX_DAY_BARS = 90
+
+
+def range_start(days, today=None):
+    """The first "YYYY-MM-DD" day of a range of `days` days ending today; None for all time."""
+    if days is None:
+        return None
+    today = today or datetime.date.today()
+    return (today - datetime.timedelta(days=days - 1)).isoformat()
+
+
+def top_n(items, n, other_label=OTHER_LABEL):
+    """The `n` largest (label, value) pairs, plus one pair with the sum of the rest."""
+    items = sorted(items, key=lambda item: item[1], reverse=True)
+    rest = sum(value for _, value in items[n:])
+    return items[:n] + [(other_label, rest)] if rest else items[:n]
+
+
+def group_days(days, max_bars=MAX_DAY_BARS):
+    """(period, messages) pairs: one per day, or one per month when there are more than `max_bars` days."""
+    if len(days) <= max_bars:
+        return [(day or UNKNOWN_LABEL, messages) for day, messages, _ in days]
+    months = {}
+    for day, messages, _ in days:
+        month = day[:7] or UNKNOWN_LABEL
+        months[month] = months.get(month, 0) + messages
+    return list(months.items())
+
+
+def model_totals(stats):
+    """One row per model: (model, messages, tokens, requests, errors, mean latency, tokens per second)."""
+    rows = []
+    for model, entry in stats["models"].items():
+        latency = entry["latency"] / entry["completed"] if entry.get("completed") else None
+        speed = entry["eval_tokens"] / entry["eval_seconds"] if entry.get("eval_seconds") else None
+        rows.append((model or UNKNOWN_LABEL, entry["messages"], entry["tokens"], entry.get("requests", 0),
+                     entry.get("errors", 0), latency, speed))
+    return sorted(rows, key=lambda row: row[1], reverse=True)
@@ -0,0 +1,188 @@
+"""Headless benchmark suite for the AIChat window, with JSON output for tracking over time.
+
+Runs under Qt's offscreen platform against ollama_stub_server, so it needs no
+display and no Ollama daemon. For every history size (1k/10k/100k messages by
+default) it builds a database with two conversations that hold the messages and
+measures:
+
+  * window construction on that database,
+  * time from opening a conversation to its first paint (all messages rendered lazily),
+  * resident memory added per opened message,
+  * latency of switching between two already opened conversations,
+  * full-text search latency over the whole history.
+
+Cold start (a fresh interpreter until the first paint) is measured once, in
+subprocesses, with startup_benchmark.py.
+
+    python benchmarks/app_benchmark.py --sizes 1000 10000 100000 --output results.json
+"""
+import os
+import sys
+import gc
+import time
+import json
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, ROOT)
+
+import importlib.util
+import psutil
+from PyQt5.QtCore import QObject, QEvent, QEventLoop, QT_VERSION_STR
+from PyQt5.QtWidgets import QApplication
+
+from conversation_store import ConversationStore
+from ollama_stub_server import start_stub_server
+from search_benchmark import fill, QUERIES
+
+SWITCHES = 20
+PAINT_TIMEOUT = 60
+
+
+def load_app_module():
+    spec = importlib.util.spec_from_file_location("xaichat", os.path.join(ROOT, "X-AI-Chat.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class PaintWatcher(QObject):
+    """Records when the watched widget is painted."""
+
+    def __init__(self, widget):
+        super().__init__(widget)
+        self.painted = False
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.painted = True
+        return False
+
+    def wait(self, app):
+        self.painted = False
+        deadline = time.perf_counter() + PAINT_TIMEOUT
+        while not self.painted and time.perf_counter() < deadline:
+            app.processEvents(QEventLoop.AllEvents, 5)
+        return self.painted
+
+
+def settle(app, seconds=0.2):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        app.processEvents(QEventLoop.AllEvents, 20)
+
+
+def rss():
+    gc.collect()
+    return psutil.Process().memory_info().rss
+
+
+def open_conversation(app, window, watcher, row):
+    started = time.perf_counter()
+    window.conversation_list.setCurrentRow(row)
+    watcher.wait(app)
+    return (time.perf_counter() - started) * 1000
+
+
+def measure_cold_start(runs):
+    timings = []
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(runs):
+            result = subprocess.run(
+                [sys.executable, os.path.join(BENCHMARKS_DIR, "startup_benchmark.py"),
+                 "--child", os.path.join(directory, f"cold{i}.db")],
+                cwd=directory, capture_output=True, text=True, timeout=120)
+            if result.returncode != 0:
+                sys.exit(f"Cold start run failed:\n{result.stderr[-2000:]}")
+            timings.append(json.loads(result.stdout.strip().splitlines()[-1])["first_paint_ms"])
+    return {"runs": runs, "first_paint_ms": round(statistics.median(timings), 1)}
+
+
+def measure_size(app, app_module, size, repeat, seed):
+    with tempfile.TemporaryDirectory() as directory:
+        store = ConversationStore(os.path.join(directory, "bench.db"))
+        fill(store, size, 2, seed)
+        # השיחה האחרונה נפתחת בעלייה - שיחה ריקה, כדי שהמדידות יתחילו מחלון נקי
+        store.create_conversation("start", "2024-01-01 00:00:00")
+        store.flush(timeout=600)
+
+        started = time.perf_counter()
+        window = app_module.AIChat(store)
+        window.show()
+        construct_ms = (time.perf_counter() - started) * 1000
+        watcher = PaintWatcher(window.chat_view.viewport())
+        settle(app)
+
+        per_conversation = size // 2
+        before = rss()
+        render_ms = open_conversation(app, window, watcher, 0)
+        settle(app)
+        memory_per_message = (rss() - before) / per_conversation
+        open_conversation(app, window, watcher, 1)
+        settle(app)
+
+        switches = [open_conversation(app, window, watcher, i % 2) for i in range(SWITCHES)]
+
+        search = {}
+        for label, query, filters in QUERIES:
+            timings = []
+            for _ in range(repeat):
+                query_started = time.perf_counter()
+                store.search(query, limit=50, **filters)
+                timings.append((time.perf_counter() - query_started) * 1000)
+            search[label] = round(statistics.median(timings), 3)
+
+        window.close()
+        window.deleteLater()
+        settle(app)
+    return {
+        "messages": size,
+        "messages_per_conversation": per_conversation,
+        "construct_ms": round(construct_ms, 1),
+        "render_first_paint_ms": round(render_ms, 1),
+        "memory_per_message_bytes": round(memory_per_message),
+        "switch_ms": {"median": round(statistics.median(switches), 2), "max": round(max(switches), 2)},
+        "search_median_ms": search,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--cold-runs", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=10, help="runs per search query")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    os.environ["OLLAMA_HOST"] = server.url
+    app = QApplication(sys.argv[:1])
+    app_module = load_app_module()
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "platform": platform.platform(),
+        "cold_start": measure_cold_start(args.cold_runs),
+        "sizes": [measure_size(app, app_module, size, args.repeat, args.seed) for size in args.sizes],
+    }
+    server.shutdown()
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Measures time-to-first-token with and without reusing the Ollama `context` array.
+
+Runs entirely offline against ollama_stub_server, which charges a fixed delay per
+evaluated prompt token, so the numbers show how much prefix re-evaluation costs.
+
+    python benchmarks/kv_context_benchmark.py --turns 12 --prompt-eval-delay 0.0005
+"""
+import os
+import sys
+import time
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation import Conversation
+from ollama_handler import OllamaHTTPBackend
+from ollama_stub_server import start_stub_server
+
+MODEL = "stub-model:latest"
+
+
+def run_conversation(backend, turns, message_words, reuse_context):
+    conversation = Conversation("benchmark", token_budget=1_000_000)
+    user_message = " ".join(["word"] * message_words)
+    ttfts = []
+    for _ in range(turns):
+        conversation.add_message(user_message, True, MODEL, message_words)
+        prompt, options = conversation.build_request("user", MODEL)
+        if not reuse_context:
+            options.pop("context", None)
+            _, prompt = conversation.context_window.build_prompt("user")
+        started = time.perf_counter()
+        ttft = None
+        parts = []
+        final = {}
+        for chunk in backend.generate_stream(MODEL, prompt, **options):
+            if ttft is None and chunk.get("response"):
+                ttft = time.perf_counter() - started
+            parts.append(chunk.get("response", ""))
+            final = chunk
+        ttfts.append(ttft)
+        response = "".join(parts)
+        conversation.add_message(response, False, MODEL, len(response.split()))
+        if reuse_context:
+            conversation.set_kv_context(final.get("context"), MODEL)
+    return ttfts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--message-words", type=int, default=150)
+    parser.add_argument("--prompt-eval-delay", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    server = start_stub_server(prompt_eval_delay=args.prompt_eval_delay)
+    backend = OllamaHTTPBackend(server.url)
+    results = {}
+    for label, reuse in (("full_history", False), ("kv_context_reuse", True)):
+        ttfts = run_conversation(backend, args.turns, args.message_words, reuse)
+        results[label] = {"ttft_per_turn": [round(t, 4) for t in ttfts],
+                          "mean_ttft": round(sum(ttfts) / len(ttfts), 4),
+                          "last_ttft": round(ttfts[-1], 4)}
+    results["speedup_last_turn"] = round(results["full_history"]["last_ttft"] /
+                                         results["kv_context_reuse"]["last_ttft"], 2)
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Measures full-text search latency over a large synthetic conversation history.
+
+Fills a temporary ConversationStore with mixed Hebrew/English messages and times
+a set of queries (single words, prefixes, multi-word and filtered searches). The
+vocabulary is small, so most query words match a large share of all messages,
+which is the worst case for ranking.
+
+    python benchmarks/search_benchmark.py --messages 100000
+"""
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_store import ConversationStore
+
+WORDS = ("שלום עולם והבית בספר לימוד מחשב תכנות שפה מודל שאלה תשובה עזרה הסבר דוגמה קוד "
+         "python model context token search index query answer question example error "
+         "function class database stream window memory cache thread").split()
+MODELS = ["llama3:8b", "mistral:7b", "qwen2:7b"]
+QUERIES = [
+    ("word", "תכנות", {}),
+    ("prefix", "מחש", {}),
+    ("hebrew_prefix_stripped", "בית", {}),
+    ("english", "database", {}),
+    ("multi_word", "python שאלה", {}),
+    ("model_filter", "cache", {"model": "mistral:7b"}),
+    ("role_filter", "עזרה", {"is_user": True}),
+    ("date_filter", "thread", {"since": "2024-06-01"}),
+    ("rare", "zzyzx", {}),
+]
+
+
+def fill(store, messages, conversations, seed):
+    rng = random.Random(seed)
+    per_conversation = messages // conversations
+    for c in range(conversations):
+        conversation_id = store.create_conversation(f"conversation {c}", "2024-01-01 00:00:00")
+        for position in range(per_conversation):
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+            day = 1 + (c * per_conversation + position) % 28
+            month = 1 + (c * 7 + position) % 12
+            store.append_message(conversation_id, position,
+                                 (text, position % 2 == 0, rng.choice(MODELS), len(text.split()),
+                                  f"2024-{month:02d}-{day:02d} 12:00:00"))
+    store.flush(timeout=600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ConversationStore(os.path.join(directory, "bench.db"))
+        started = time.perf_counter()
+        fill(store, args.messages, args.conversations, args.seed)
+        results = {"messages": args.messages, "full_text": store.full_text,
+                   "fill_seconds": round(time.perf_counter() - started, 2), "queries": {}}
+        for label, query, filters in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                hits = store.search(query, limit=50, **filters)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results["queries"][label] = {"query": query, "hits": len(hits),
+                                         "median_ms": round(timings[len(timings) // 2], 3),
+                                         "max_ms": round(timings[-1], 3)}
+        store.close()
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
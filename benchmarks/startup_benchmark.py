@@ -0,0 +1,119 @@
+"""Measures cold-start time of the chat window: time-to-first-paint and an import-time breakdown.
+
+Each run starts a fresh interpreter with `-X importtime` that imports
+X-AI-Chat.py, builds the main window on an empty temporary database and exits
+on the window's first paint event. The report gives the median of every phase
+over all runs and the slowest top-level packages by self import time, and
+lists any lazily loaded subsystem that was imported before the first paint.
+
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_child(db_path):
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import importlib.util
+    from PyQt5.QtCore import QObject, QEvent, QTimer
+    from PyQt5.QtWidgets import QApplication
+
+    spec = importlib.util.spec_from_file_location("xaichat", os.path.join(ROOT, "X-AI-Chat.py"))
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    imported = time.perf_counter()
+
+    from conversation_store import ConversationStore
+    import lazy_modules
+
+    app = QApplication(sys.argv[:1])
+    window = app_module.AIChat(ConversationStore(db_path))
+    constructed = time.perf_counter()
+    timings = {}
+
+    class FirstPaint(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and "first_paint" not in timings:
+                timings["first_paint"] = time.perf_counter()
+                QTimer.singleShot(0, window.close)
+                QTimer.singleShot(0, app.quit)
+            return False
+
+    first_paint = FirstPaint()
+    window.installEventFilter(first_paint)
+    window.show()
+    app.exec_()
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "construct_ms": (constructed - imported) * 1000,
+        "first_paint_ms": (timings.get("first_paint", time.perf_counter()) - started) * 1000,
+        "lazy_loaded_before_paint": sorted(lazy_modules.import_times()),
+    }))
+
+
+def parse_import_times(stderr):
+    """Sums `-X importtime` self times (microseconds) by top-level package."""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--child", metavar="DB", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child)
+        return
+
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    runs = []
+    packages = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(args.runs):
+            started = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, "-X", "importtime", os.path.abspath(__file__),
+                 "--child", os.path.join(directory, f"startup{i}.db")],
+                cwd=directory, env=env, capture_output=True, text=True, timeout=120)
+            wall_ms = (time.perf_counter() - started) * 1000
+            if result.returncode != 0:
+                sys.exit(f"Startup run failed:\n{result.stderr[-2000:]}")
+            run = json.loads(result.stdout.strip().splitlines()[-1])
+            run["process_ms"] = wall_ms
+            runs.append(run)
+            for package, self_us in parse_import_times(result.stderr).items():
+                packages.setdefault(package, []).append(self_us)
+
+    def median(key):
+        return round(statistics.median(run[key] for run in runs), 1)
+
+    slowest = sorted(((package, statistics.median(times)) for package, times in packages.items()),
+                     key=lambda item: item[1], reverse=True)[:args.top]
+    print(json.dumps({
+        "runs": args.runs,
+        "median_ms": {key: median(key) for key in ("import_ms", "construct_ms", "first_paint_ms", "process_ms")},
+        "import_self_ms_by_package": {package: round(us / 1000, 1) for package, us in slowest},
+        "lazy_loaded_before_paint": runs[-1]["lazy_loaded_before_paint"],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
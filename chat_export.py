@@ -0,0 +1,209 @@
+"""Renders conversations to PDF (QTextDocument + QPdfWriter) or to static HTML.
+
+Both formats are generated message by message from the store's cursor: HTML
+is written to the file as it is produced and PDF documents are built by
+inserting each message at the end of a QTextDocument, so no full HTML string
+of the conversation is kept. `ChatExportThread` exports many conversations
+in parallel on a bounded QThreadPool; Qt allows QTextDocument and QPainter on
+a QPdfWriter outside the GUI thread, as long as the thread is a QThread
+(QTextDocument.print_ lays out the pages with timers).
+"""
+import os
+import re
+import html
+import queue
+import logging
+from PyQt5.QtCore import QMarginsF, QRunnable, QThreadPool
+from PyQt5.QtGui import QTextDocument, QTextCursor, QPdfWriter, QPageSize, QPageLayout, QFont
+from conversation_archive import ArchiveThread
+from search_index import HEBREW_RE
+
+logger = logging.getLogger('AIChat.chat_export')
+
+EXPORT_FORMATS = {".pdf": "PDF", ".html": "HTML"}
+MAX_EXPORT_WORKERS = 4
+PDF_RESOLUTION = 150
+UNSAFE_FILE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+HTML_HEAD = """<!DOCTYPE html>
+<html lang="he">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+  body {{ font-family: Arial, sans-serif; max-width: 800px; margin: 2em auto; color: #1E1E1E; }}
+  .message {{ border-radius: 6px; padding: 8px 12px; margin: 8px 0; white-space: pre-wrap; }}
+  .user {{ background: #E8E0F8; }}
+  .assistant {{ background: #F0F0F0; }}
+  .meta {{ color: #666666; font-size: small; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+"""
+HTML_FOOT = "</body>\n</html>\n"
+
+
+def text_direction(text):
+    return "rtl" if HEBREW_RE.search(text) else "ltr"
+
+
+def message_html(message):
+    text, is_user, model, tokens, timestamp = message
+    sender = "משתמש" if is_user else (model or "AI")
+    # QTextDocument לא מכיר white-space: pre-wrap, לכן שורות חדשות הופכות ל-<br>
+    body = html.escape(text).replace("\n", "<br>")
+    return (f'<div class="message {"user" if is_user else "assistant"}" dir="{text_direction(text)}" '
+            f'style="background-color: {"#E8E0F8" if is_user else "#F0F0F0"};">'
+            f'<p class="meta" style="color: #666666;">{html.escape(sender)} · {html.escape(timestamp or "")} · {tokens} tokens</p>'
+            f'<p>{body}</p></div>\n')
+
+
+def write_html(path, name, messages, cancelled=lambda: False):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HTML_HEAD.format(title=html.escape(name)))
+        for message in messages:
+            if cancelled():
+                return count
+            f.write(message_html(message))
+            count += 1
+        f.write(HTML_FOOT)
+    return count
+
+
+def write_pdf(path, name, messages, cancelled=lambda: False):
+    document = QTextDocument()
+    document.setDefaultFont(QFont("Arial", 10))
+    cursor = QTextCursor(document)
+    cursor.insertHtml(f"<h1>{html.escape(name)}</h1>")
+    count = 0
+    for message in messages:
+        if cancelled():
+            return count
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertBlock()
+        cursor.insertHtml(message_html(message))
+        count += 1
+    writer = QPdfWriter(path)
+    writer.setResolution(PDF_RESOLUTION)
+    writer.setPageLayout(QPageLayout(QPageSize(QPageSize.A4), QPageLayout.Portrait, QMarginsF(15, 15, 15, 15)))
+    writer.setTitle(name)
+    document.print_(writer)
+    return count
+
+
+def write_conversation(path, name, messages, cancelled=lambda: False):
+    """Writes one conversation to `path` (.pdf or .html) and returns the number of messages written."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {extension or path}")
+    temp_path = f"{path}.tmp"
+    try:
+        writer = write_pdf if extension == ".pdf" else write_html
+        count = writer(temp_path, name, messages, cancelled)
+        if not cancelled():
+            os.replace(temp_path, path)
+        return count
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def export_file_names(names, directory, extension):
+    """One safe, unique file path per conversation name."""
+    used = set()
+    paths = []
+    for name in names:
+        base = UNSAFE_FILE_CHARS.sub("_", name).strip(" .") or "chat"
+        candidate = base
+        number = 2
+        while candidate.lower() in used:
+            candidate = f"{base} ({number})"
+            number += 1
+        used.add(candidate.lower())
+        paths.append(os.path.join(directory, candidate + extension))
+    return paths
+
+
+class ExportJob(QRunnable):
+    def __init__(self, thread, job, results):
+        super().__init__()
+        self.thread = thread
+        self.job = job
+        self.results = results
+
+    def run(self):
+        try:
+            self.results.put((self.job, self.thread.export_one(*self.job), None))
+        except Exception as e:
+            self.results.put((self.job, 0, e))
+
+
+class ChatExportThread(ArchiveThread):
+    """Exports conversations to PDF/HTML files with up to `max_workers` rendered at once.
+
+    `jobs` are (conversation, path) pairs. A conversation that fails is
+    logged and skipped; the others are still exported, and the failures are
+    listed in the `completed` signal.
+    """
+
+    def __init__(self, store, jobs, max_workers=MAX_EXPORT_WORKERS, parent=None):
+        super().__init__(store, os.path.dirname(jobs[0][1]) if jobs else "", parent)
+        self.jobs = [(c.id, c.name, None if c.store is not None else list(c.messages), path) for c, path in jobs]
+        self.max_workers = max(1, min(max_workers, os.cpu_count() or 1, len(self.jobs) or 1))
+        self.errors = []
+
+    def export_one(self, conversation_id, name, messages, path):
+        if self.cancelled:
+            return 0
+        if messages is not None:
+            return write_conversation(path, name, messages, lambda: self.cancelled)
+        # לכל worker חיבור קריאה משלו; ההודעות נקראות מהסמן תוך כדי כתיבה
+        conn = self.store.connect_reader()
+        try:
+            return write_conversation(path, name, self.store.iter_messages(conversation_id, conn),
+                                      lambda: self.cancelled)
+        finally:
+            conn.close()
+
+    def run(self):
+        exported = messages = done = 0
+        pool = QThreadPool()
+        pool.setMaxThreadCount(self.max_workers)
+        results = queue.Queue()
+        try:
+            if self.store is not None:
+                self.store.flush(timeout=30)
+            jobs = iter(self.jobs)
+            pending = 0
+            while True:
+                # לכל היותר משימה אחת ממתינה לכל worker שעובד, כך ש-500 שיחות לא נטענות בבת אחת
+                while not self.cancelled and pending < self.max_workers * 2:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    pool.start(ExportJob(self, job, results))
+                    pending += 1
+                if not pending:
+                    break
+                (_, name, _, path), count, error = results.get()
+                pending -= 1
+                done += 1
+                if error is None:
+                    messages += count
+                    exported += 1
+                else:
+                    logger.error("Error exporting '%s' to %s: %s", name, path, error)
+                    self.errors.append(f"{name}: {error}")
+                self.report(done, len(self.jobs))
+        except Exception as e:
+            logger.error("Error exporting conversations: %s", e)
+            self.failed.emit(str(e))
+            return
+        finally:
+            pool.waitForDone()
+        if self.cancelled:
+            return
+        logger.info("Exported %s conversations (%s messages) to %s", exported, messages, self.path)
+        self.completed.emit(exported, messages, self.errors)
@@ -0,0 +1,219 @@
+"""Chat titles generated by the model in the background.
+
+Title requests go through the request scheduler with a small `num_predict`,
+so they never block the window. Automatic titles run at low priority: a new
+chat is titled after its first exchange, and after an import every untitled
+conversation is titled TITLE_BATCH_SIZE at a time, one request per batch.
+Generated titles are cached in the store, so a conversation is never titled
+twice and the suggestions menu reuses earlier suggestions.
+"""
+import re
+import logging
+from itertools import islice
+from collections import deque
+from PyQt5.QtCore import QObject, pyqtSignal
+from request_scheduler import ChatRequest, PRIORITY_LOW, PRIORITY_NORMAL
+from conversation_archive import DEFAULT_IMPORT_NAME
+
+logger = logging.getLogger('AIChat.chat_titles')
+
+TITLE = "title"
+TITLE_MAX_WORDS = 5
+TITLE_BATCH_SIZE = 10
+TITLE_EXCERPT_MESSAGES = 5
+TITLE_EXCERPT_CHARS = 300
+# תשובה קצרה מספיקה לכותרת; מגביל את זמן היצירה של המודל
+TITLE_TOKENS_PER_TITLE = 16
+DEFAULT_TITLE_RE = re.compile(r"^שיחה חדשה \d+ 💬$")
+LIST_MARKER_RE = re.compile(r"^\s*(?:\[?\d+\]?[.):-]?|[-*•])\s+")
+BATCH_LINE_RE = re.compile(r"^\s*\[?(\d+)\]?\s*[:.)-]\s*(.+)$")
+
+SUGGEST_PROMPT = ("Based on this conversation, suggest {count} short and descriptive titles (max 5 words each), "
+                  "one per line:\n\n{excerpt}")
+BATCH_PROMPT = ("Suggest a short and descriptive title (max 5 words) for each numbered conversation below. "
+                "Reply with one line per conversation, in the form <number>: <title>.\n\n{excerpts}")
+
+
+def is_untitled(name):
+    return name == DEFAULT_IMPORT_NAME or DEFAULT_TITLE_RE.match(name) is not None
+
+
+def clean_title(line):
+    title = LIST_MARKER_RE.sub("", line).strip().strip('"\'“”').strip()
+    return " ".join(title.split()[:TITLE_MAX_WORDS])
+
+
+def parse_titles(response, count):
+    titles = [clean_title(line) for line in response.splitlines()]
+    return [title for title in titles if title][:count]
+
+
+def parse_batch_titles(response, size):
+    """Returns {index: title} from "<number>: <title>" lines; numbers are 1-based in the prompt."""
+    titles = {}
+    for line in response.splitlines():
+        match = BATCH_LINE_RE.match(line)
+        if match and 1 <= int(match.group(1)) <= size:
+            title = clean_title(match.group(2))
+            if title:
+                titles.setdefault(int(match.group(1)) - 1, title)
+    return titles
+
+
+def conversation_excerpt(conversation):
+    # שיחה שלא נפתחה לא נטענת - קוראים מהמסד רק את ההודעות הראשונות
+    if conversation.is_loaded:
+        messages = conversation.messages[:TITLE_EXCERPT_MESSAGES]
+    else:
+        messages = islice(conversation.store.iter_messages(conversation.id), TITLE_EXCERPT_MESSAGES)
+    return "\n".join(f"{'User' if message[1] else 'AI'}: {message[0][:TITLE_EXCERPT_CHARS]}" for message in messages)
+
+
+class TitleGenerator(QObject):
+    """Suggests and applies chat titles without waiting on the model in the UI thread.
+
+    `suggestions_ready` answers an explicit request for suggestions;
+    `title_generated` carries an automatic title for a chat that still has a
+    default name.
+    """
+
+    suggestions_ready = pyqtSignal(object, list)
+    title_generated = pyqtSignal(object, str)
+    failed = pyqtSignal(object, str)
+
+    def __init__(self, store, scheduler, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.scheduler = scheduler
+        self._titles = None
+        self.batches = deque()
+        self.queued = set()
+        self.batch_request = None
+        self.batch = []
+        self.batch_options = None
+        self.suggestion_requests = {}
+        scheduler.response_received.connect(self.handle_response)
+        scheduler.error_occurred.connect(self.handle_error)
+        scheduler.request_finished.connect(self.handle_finished)
+        scheduler.request_dropped.connect(self.handle_finished)
+
+    @property
+    def titles(self):
+        if self._titles is None:
+            self._titles = self.store.load_titles()
+        return self._titles
+
+    def needs_title(self, conversation):
+        return (conversation.id is not None and is_untitled(conversation.name)
+                and conversation.id not in self.titles and id(conversation) not in self.queued)
+
+    def auto_title(self, conversation, model, options=None):
+        """Titles a chat that still has a default name, once; called after each exchange."""
+        if self.needs_title(conversation):
+            self.enqueue([conversation], model, options)
+
+    def title_untitled(self, conversations, model, options=None):
+        """Queues every untitled conversation, TITLE_BATCH_SIZE per request; returns how many were queued."""
+        pending = [conversation for conversation in conversations if self.needs_title(conversation)]
+        for start in range(0, len(pending), TITLE_BATCH_SIZE):
+            self.enqueue(pending[start:start + TITLE_BATCH_SIZE], model, options)
+        if pending:
+            logger.info("Generating titles for %s untitled conversation(s)", len(pending))
+        return len(pending)
+
+    def forget(self, conversation):
+        self.queued.discard(id(conversation))
+
+    def enqueue(self, batch, model, options):
+        self.queued.update(id(conversation) for conversation in batch)
+        self.batches.append((batch, model, dict(options or {})))
+        self.submit_next()
+
+    def submit_next(self):
+        if self.batch_request is not None:
+            return
+        while self.batches:
+            batch, model, options = self.batches.popleft()
+            # שיחות שנמחקו או שקיבלו שם בינתיים יוצאות מהאצווה
+            batch = [c for c in batch if id(c) in self.queued and is_untitled(c.name)]
+            if not batch:
+                continue
+            self.batch_request = ChatRequest(batch[0], model, prepare=lambda: self.prepare_batch(batch, options),
+                                             kind=TITLE, priority=PRIORITY_LOW)
+            self.batch = batch
+            self.batch_options = (model, options)
+            self.scheduler.submit(self.batch_request)
+            return
+
+    def prepare_batch(self, batch, options):
+        if len(batch) == 1:
+            prompt = SUGGEST_PROMPT.format(count=1, excerpt=conversation_excerpt(batch[0]))
+        else:
+            prompt = BATCH_PROMPT.format(excerpts="\n\n".join(
+                f"[{i + 1}]\n{conversation_excerpt(conversation)}" for i, conversation in enumerate(batch)))
+        return prompt, dict(options, options={"num_predict": TITLE_TOKENS_PER_TITLE * len(batch)})
+
+    def suggest(self, conversation, count, model, options=None):
+        """Asks for `count` title suggestions; cached suggestions are returned without a model call."""
+        cached = self.titles.get(conversation.id, [])
+        if len(cached) >= count:
+            self.suggestions_ready.emit(conversation, cached[:count])
+            return False
+        options = dict(options or {}, options={"num_predict": TITLE_TOKENS_PER_TITLE * count})
+        prompt = SUGGEST_PROMPT.format(count=count, excerpt=conversation_excerpt(conversation))
+        request = ChatRequest(conversation, model, prompt, options, kind=TITLE, priority=PRIORITY_NORMAL)
+        self.suggestion_requests[request] = count
+        self.scheduler.submit(request)
+        return True
+
+    def cache_titles(self, conversation, titles):
+        if conversation.id is None:
+            return
+        merged = titles + [title for title in self.titles.get(conversation.id, []) if title not in titles]
+        self.titles[conversation.id] = merged
+        self.store.save_titles(conversation.id, merged)
+
+    def handle_response(self, request, response):
+        if request is self.batch_request:
+            batch = self.batch
+            if len(batch) == 1:
+                found = dict(enumerate(parse_titles(response, 1)))
+            else:
+                found = parse_batch_titles(response, len(batch))
+            for index, title in found.items():
+                conversation = batch[index]
+                self.cache_titles(conversation, [title])
+                if is_untitled(conversation.name) and id(conversation) in self.queued:
+                    self.title_generated.emit(conversation, title)
+            if len(found) < len(batch):
+                logger.debug("The model titled %s of %s conversations in the batch", len(found), len(batch))
+        elif request in self.suggestion_requests:
+            count = self.suggestion_requests[request]
+            titles = parse_titles(response, count)
+            self.cache_titles(request.conversation, titles)
+            titles += [f"Suggestion {i + 1}" for i in range(len(titles), count)]
+            self.suggestions_ready.emit(request.conversation, titles)
+
+    def handle_error(self, request, error):
+        if request is self.batch_request:
+            logger.warning("Title generation failed: %s", error)
+        elif request in self.suggestion_requests:
+            self.failed.emit(request.conversation, error)
+
+    def handle_finished(self, request):
+        if request is self.batch_request:
+            batch = self.batch
+            # הבקשה רשומה על השיחה הראשונה באצווה; מחיקה שלה מבטלת את הבקשה, אבל לא את שאר השיחות
+            record = request.metrics_record
+            cancelled = record is None or record["status"] == "cancelled"
+            survivors = [c for c in batch[1:] if id(c) in self.queued] if id(batch[0]) not in self.queued else []
+            if cancelled and survivors:
+                self.batches.appendleft((survivors, *self.batch_options))
+            else:
+                for conversation in batch:
+                    self.queued.discard(id(conversation))
+            self.batch_request = None
+            self.batch = []
+            self.submit_next()
+        else:
+            self.suggestion_requests.pop(request, None)
@@ -0,0 +1,405 @@
+import getpass
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QTimer, QEvent, pyqtSignal
+from PyQt5.QtGui import QFont, QFontMetrics, QColor, QCursor, QPen
+from PyQt5.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView, QToolTip
+from conversation import timestamp_now
+
+# קצב רענון מקסימלי להודעה שמוזרמת טוקן אחר טוקן
+STREAM_MAX_FPS = 30
+# שיחות שההודעות שלהן נשארות בזיכרון (כולל הנוכחית); ישנות יותר נטענות שוב כשחוזרים אליהן
+MAX_LOADED_CONVERSATIONS = 5
+
+MESSAGE_ACTIONS = [
+    ("bookmark", "🔖", "Bookmark"),
+    ("reminder", "⏰", "Set Reminder"),
+    ("speak", "🔊", "Speak Message"),
+    ("copy", "📋", "Copy"),
+]
+
+
+class StreamingMessage:
+    """A response that is still being generated, shown after the stored messages."""
+
+    def __init__(self, owner, model_name):
+        self.owner = owner
+        self.model_name = model_name
+        self.text = ""
+        self.pending_chunks = []
+        self.timestamp = timestamp_now()
+
+    def append_text(self, chunk):
+        self.pending_chunks.append(chunk)
+        self.owner.schedule_flush()
+
+    def finish_text(self, text, tokens):
+        self.owner.finish_stream(self, text, tokens)
+
+    def discard(self):
+        self.owner.discard_stream(self)
+
+    def as_message(self):
+        return (self.text, False, self.model_name, 0, self.timestamp)
+
+
+class ChatMessageModel(QAbstractListModel):
+    """List model over a conversation's messages.
+
+    Rows are read straight from `conversation.messages`; nothing is copied per
+    message. Responses that are still streaming are kept as extra rows at the
+    end, and their updates are coalesced to at most `max_fps` repaints a second.
+    """
+
+    text_updated = pyqtSignal()
+
+    IsUserRole = Qt.UserRole + 1
+    ModelRole = Qt.UserRole + 2
+    TokensRole = Qt.UserRole + 3
+    TimestampRole = Qt.UserRole + 4
+    StreamingRole = Qt.UserRole + 5
+
+    def __init__(self, conversation, max_fps=STREAM_MAX_FPS, parent=None):
+        super().__init__(parent)
+        self.conversation = conversation
+        self.streams = []
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.timeout.connect(self.flush_pending_text)
+        self.set_max_fps(max_fps)
+
+    def set_max_fps(self, max_fps):
+        self.flush_timer.setInterval(int(1000 / max(1, max_fps)))
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.conversation.messages) + len(self.streams)
+
+    def message(self, row):
+        messages = self.conversation.messages
+        if row < len(messages):
+            return messages[row]
+        return self.streams[row - len(messages)].as_message()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.rowCount():
+            return None
+        text, is_user, model, tokens, timestamp = self.message(index.row())
+        if role == Qt.DisplayRole:
+            return text
+        if role == self.IsUserRole:
+            return is_user
+        if role == self.ModelRole:
+            return model
+        if role == self.TokensRole:
+            return tokens
+        if role == self.TimestampRole:
+            return timestamp
+        if role == self.StreamingRole:
+            return index.row() >= len(self.conversation.messages)
+        return None
+
+    def add_message(self, message, is_user, model, tokens, timestamp=None):
+        row = len(self.conversation.messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.conversation.add_message(message, is_user, model, tokens, timestamp)
+        self.endInsertRows()
+
+    def begin_stream(self, model_name):
+        row = self.rowCount()
+        self.beginInsertRows(QModelIndex(), row, row)
+        stream = StreamingMessage(self, model_name)
+        self.streams.append(stream)
+        self.endInsertRows()
+        return stream
+
+    def stream_row(self, stream):
+        return len(self.conversation.messages) + self.streams.index(stream)
+
+    def schedule_flush(self):
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush_pending_text(self):
+        changed = False
+        for stream in self.streams:
+            if stream.pending_chunks:
+                stream.text += "".join(stream.pending_chunks)
+                stream.pending_chunks = []
+                index = self.index(self.stream_row(stream))
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+                changed = True
+        if changed:
+            self.text_updated.emit()
+
+    def finish_stream(self, stream, text, tokens):
+        if stream not in self.streams:
+            return
+        row = self.stream_row(stream)
+        if row == len(self.conversation.messages):
+            # השורה כבר במקום הנכון - רק הופכים אותה מהודעה זורמת להודעה שמורה
+            self.streams.remove(stream)
+            self.conversation.add_message(text, False, stream.model_name, tokens)
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+        else:
+            self.discard_stream(stream)
+            self.add_message(text, False, stream.model_name, tokens)
+        if not self.streams:
+            self.flush_timer.stop()
+        self.text_updated.emit()
+
+    def discard_stream(self, stream):
+        if stream not in self.streams:
+            return
+        row = self.stream_row(stream)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.streams.remove(stream)
+        self.endRemoveRows()
+
+
+class ChatMessageDelegate(QStyledItemDelegate):
+    """Paints chat bubbles; the action buttons are drawn only on the hovered row."""
+
+    action_triggered = pyqtSignal(str, str)
+
+    MARGIN = 5
+    PADDING = 10
+    SPACING = 5
+    BUTTON_SIZE = 26
+    CACHE_SIZE = 4096
+
+    def __init__(self, colors, font_size=12, parent=None):
+        super().__init__(parent)
+        self.colors = colors
+        self.username = getpass.getuser()
+        self.height_cache = OrderedDict()
+        # שורה -> המפתח האחרון שלה במטמון, להודעות שעדיין מוזרמות
+        self.stream_keys = {}
+        self.set_font_size(font_size)
+
+    def set_font_size(self, font_size):
+        self.font_size = font_size
+        self.body_font = QFont()
+        self.body_font.setPixelSize(font_size + 1)
+        self.name_font = QFont()
+        self.name_font.setPixelSize(font_size + 2)
+        self.name_font.setBold(True)
+        self.small_font = QFont()
+        self.small_font.setPixelSize(max(8, font_size - 2))
+        self.height_cache.clear()
+        self.stream_keys.clear()
+
+    def header_height(self):
+        return max(QFontMetrics(self.name_font).height(), QFontMetrics(self.small_font).height())
+
+    def body_height(self, text, width):
+        key = (text, width)
+        height = self.height_cache.get(key)
+        if height is None:
+            rect = QFontMetrics(self.body_font).boundingRect(QRect(0, 0, width, 1 << 20),
+                                                             Qt.TextWordWrap, text or " ")
+            height = rect.height()
+            self.height_cache[key] = height
+            if len(self.height_cache) > self.CACHE_SIZE:
+                self.height_cache.popitem(last=False)
+        else:
+            self.height_cache.move_to_end(key)
+        return height
+
+    def content_width(self, option):
+        width = option.rect.width()
+        view = option.widget
+        if view is not None and hasattr(view, "viewport"):
+            width = view.viewport().width()
+        return max(50, width - 2 * (self.MARGIN + self.PADDING))
+
+    def forget_stream_height(self, row, key):
+        # כל עדכון של הודעה מוזרמת מחליף את הגובה הקודם שלה במקום להוסיף עוד רשומה למטמון
+        previous = self.stream_keys.get(row)
+        if previous != key:
+            if previous is not None:
+                self.height_cache.pop(previous, None)
+            self.stream_keys[row] = key
+
+    def sizeHint(self, option, index):
+        width = self.content_width(option)
+        text = index.data(Qt.DisplayRole)
+        if index.data(ChatMessageModel.StreamingRole):
+            self.forget_stream_height(index.row(), (text, width))
+        else:
+            self.stream_keys.pop(index.row(), None)
+        height = (2 * (self.MARGIN + self.PADDING) + self.header_height() + self.SPACING
+                  + self.body_height(text, width) + self.SPACING + self.BUTTON_SIZE)
+        return QSize(width, height)
+
+    def layout(self, option):
+        """Returns (bubble, header, body, buttons) rects in logical (left-to-right) coordinates."""
+        bubble = option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        content = bubble.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+        header = QRect(content.left(), content.top(), content.width(), self.header_height())
+        buttons_top = content.bottom() - self.BUTTON_SIZE + 1
+        body = QRect(content.left(), header.bottom() + 1 + self.SPACING, content.width(),
+                     buttons_top - self.SPACING - header.bottom() - 1 - self.SPACING)
+        buttons = QRect(content.left(), buttons_top, content.width(), self.BUTTON_SIZE)
+        return bubble, header, body, buttons
+
+    def action_rects(self, option):
+        _, _, _, buttons = self.layout(option)
+        rects = []
+        for i, action in enumerate(MESSAGE_ACTIONS):
+            rect = QRect(buttons.left() + i * (self.BUTTON_SIZE + self.SPACING), buttons.top(),
+                         self.BUTTON_SIZE, self.BUTTON_SIZE)
+            rects.append((action, QStyle.visualRect(option.direction, option.rect, rect)))
+        return rects
+
+    def paint(self, painter, option, index):
+        colors = self.colors
+        is_user = index.data(ChatMessageModel.IsUserRole)
+        model = index.data(ChatMessageModel.ModelRole)
+        tokens = index.data(ChatMessageModel.TokensRole)
+        streaming = index.data(ChatMessageModel.StreamingRole)
+        bubble, header, body, _ = self.layout(option)
+        direction = option.direction
+        # Qt.AlignLeft/AlignRight מתהפכים לבד כשהכיוון הוא מימין לשמאל
+        start, end = Qt.AlignLeft, Qt.AlignRight
+
+        painter.save()
+        painter.setRenderHint(painter.Antialiasing)
+        if getattr(option.widget, "highlighted_row", None) == index.row():
+            painter.setPen(QPen(QColor(colors['secondary']), 2))
+        else:
+            painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(colors['surface']))
+        painter.drawRoundedRect(bubble, 15, 15)
+
+        painter.setPen(QColor(colors['on_surface']))
+        name = self.username if is_user else (model or "AI")
+        painter.setFont(self.name_font)
+        name_width = QFontMetrics(self.name_font).horizontalAdvance(name)
+        painter.drawText(header, start | Qt.AlignVCenter, name)
+
+        painter.setFont(self.small_font)
+        stamp_rect = header.adjusted(name_width + 2 * self.SPACING, 0, 0, 0)
+        painter.drawText(QStyle.visualRect(direction, option.rect, stamp_rect), start | Qt.AlignVCenter,
+                         index.data(ChatMessageModel.TimestampRole) or "")
+        painter.drawText(header, end | Qt.AlignVCenter, "..." if streaming else f"Tokens: {tokens}")
+
+        painter.setFont(self.body_font)
+        painter.drawText(body, start | Qt.AlignTop | Qt.TextWordWrap, index.data(Qt.DisplayRole))
+
+        if option.state & QStyle.State_MouseOver and not streaming:
+            cursor = option.widget.viewport().mapFromGlobal(QCursor.pos()) if option.widget else None
+            for (_, icon, _), rect in self.action_rects(option):
+                hovered = cursor is not None and rect.contains(cursor)
+                painter.setPen(Qt.NoPen)
+                painter.setBrush(QColor(colors['primary'] if hovered else colors['background']))
+                painter.drawRoundedRect(rect, self.BUTTON_SIZE / 2, self.BUTTON_SIZE / 2)
+                painter.setPen(QColor(colors['on_primary'] if hovered else colors['on_surface']))
+                painter.drawText(rect, Qt.AlignCenter, icon)
+        painter.restore()
+
+    def action_at(self, option, index, pos):
+        if index.data(ChatMessageModel.StreamingRole):
+            return None
+        for action, rect in self.action_rects(option):
+            if rect.contains(pos):
+                return action
+        return None
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            action = self.action_at(option, index, event.pos())
+            if action is not None:
+                self.action_triggered.emit(action[0], index.data(Qt.DisplayRole))
+                return True
+        return super().editorEvent(event, model, option, index)
+
+    def helpEvent(self, event, view, option, index):
+        action = self.action_at(option, index, event.pos())
+        if action is not None:
+            QToolTip.showText(event.globalPos(), action[2], view)
+            return True
+        return super().helpEvent(event, view, option, index)
+
+
+class ChatView(QListView):
+    """Single view shared by all conversations; only visible rows are painted."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setResizeMode(QListView.Adjust)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(200)
+        self.setMouseTracking(True)
+        self.viewport().setAttribute(Qt.WA_Hover)
+        # הפריסה נבנית במנות, אז הגלילה לסוף נשמרת עד שהטווח מפסיק לגדול
+        self.follow_bottom = True
+        self.highlighted_row = None
+        # הגובה האחרון של שורות שהתעדכנו, כדי לזהות עדכון שלא משנה את הפריסה
+        self.row_heights = {}
+        self.highlight_timer = QTimer(self)
+        self.highlight_timer.setSingleShot(True)
+        self.highlight_timer.timeout.connect(self.clear_highlight)
+        self.verticalScrollBar().rangeChanged.connect(self.keep_at_bottom)
+        self.verticalScrollBar().valueChanged.connect(self.update_follow_bottom)
+
+    def dataChanged(self, top_left, bottom_right, roles=()):
+        super().dataChanged(top_left, bottom_right, roles)
+        # רוב העדכונים בזמן הזרמה לא משנים את גובה השורה - אז מספיק לצייר אותה מחדש.
+        # QListView לא יודע לפרוס שורה בודדת, לכן פריסה מלאה רק כשהטקסט עבר לשורה חדשה
+        changed = False
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            height = self.sizeHintForIndex(top_left.sibling(row, 0)).height()
+            if self.row_heights.get(row) != height:
+                self.row_heights[row] = height
+                changed = True
+        if changed:
+            self.scheduleDelayedItemsLayout()
+
+    def setModel(self, model):
+        self.row_heights.clear()
+        super().setModel(model)
+
+    def mouseMoveEvent(self, event):
+        super().mouseMoveEvent(event)
+        # הדגשת הכפתור שמתחת לעכבר
+        self.viewport().update(self.visualRect(self.indexAt(event.pos())))
+
+    def scrollToBottom(self):
+        self.follow_bottom = True
+        super().scrollToBottom()
+
+    def scroll_to_row(self, row, highlight_ms=2500):
+        """Scrolls a message into view and outlines it for a moment (used when jumping from search)."""
+        self.follow_bottom = False
+        self.highlighted_row = row
+        self.highlight_timer.start(highlight_ms)
+        self.scrollTo(self.model().index(row, 0), QAbstractItemView.PositionAtCenter)
+        self.viewport().update()
+
+    def clear_highlight(self):
+        self.highlighted_row = None
+        self.viewport().update()
+
+    def keep_at_bottom(self, minimum, maximum):
+        if self.follow_bottom:
+            self.verticalScrollBar().setValue(maximum)
+        elif self.highlighted_row is not None and self.model() is not None:
+            # הפריסה במנות משנה את מיקום השורה - ממשיכים להחזיק אותה במרכז
+            self.scrollTo(self.model().index(self.highlighted_row, 0), QAbstractItemView.PositionAtCenter)
+
+    def update_follow_bottom(self, value):
+        self.follow_bottom = self.highlighted_row is None and self.is_at_bottom()
+
+    def refresh_layout(self):
+        self.row_heights.clear()
+        self.scheduleDelayedItemsLayout()
+
+    def is_at_bottom(self):
+        scroll_bar = self.verticalScrollBar()
+        return scroll_bar.value() >= scroll_bar.maximum() - 5
@@ -0,0 +1,95 @@
+from collections import deque
+from token_counter import count_tokens
+
+DEFAULT_TOKEN_BUDGET = 2048
+SUMMARY_HEADER = "Summary of the earlier part of this conversation:"
+
+
+def estimate_tokens(text):
+    return count_tokens(text)
+
+
+class ContextWindow:
+    """Sliding window over a conversation's turns, kept under a token budget.
+
+    Turns are appended as they happen and the running total is updated in place,
+    so building the prompt for turn N never re-walks or re-counts the history.
+    Pinned instructions and the summary of evicted turns (if any) are sent in
+    the system prompt and count against the same budget.
+    """
+
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.turns = deque()
+        self.total_tokens = 0
+        self.pinned = []
+        self.pinned_tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        # מונה פינויים - מאפשר לזהות שה-context של המודל כבר לא תואם לחלון
+        self.evictions = 0
+
+    def append(self, role, text, tokens=None):
+        # הודעות מיובאות נשמרות לפעמים עם 0 טוקנים
+        if not tokens:
+            tokens = estimate_tokens(text)
+        self.turns.append((role, text, tokens))
+        self.total_tokens += tokens
+        self.trim()
+
+    def trim(self):
+        # ההודעה האחרונה נשארת תמיד, גם אם היא לבדה חורגת מהתקציב
+        while len(self.turns) > 1 and self.total_tokens + self.pinned_tokens + self.summary_tokens > self.token_budget:
+            _, _, tokens = self.turns.popleft()
+            self.total_tokens -= tokens
+            self.evictions += 1
+
+    def rebuild(self, messages):
+        self.turns.clear()
+        self.total_tokens = 0
+        self.evictions += 1
+        # מספיק לעבור מהסוף להתחלה עד שהתקציב מתמלא
+        budget = self.token_budget - self.pinned_tokens - self.summary_tokens
+        for message in reversed(messages):
+            text, is_user, tokens = message[0], message[1], message[3]
+            if not tokens:
+                tokens = estimate_tokens(text)
+            if self.turns and self.total_tokens + tokens > budget:
+                break
+            self.turns.appendleft(("user" if is_user else "assistant", text, tokens))
+            self.total_tokens += tokens
+
+    def set_token_budget(self, token_budget, messages):
+        self.token_budget = token_budget
+        self.rebuild(messages)
+
+    def pin(self, instruction):
+        if instruction in (text for text, _ in self.pinned):
+            return
+        tokens = estimate_tokens(instruction)
+        self.pinned.append((instruction, tokens))
+        self.pinned_tokens += tokens
+        self.trim()
+
+    def set_summary(self, summary):
+        if summary == self.summary:
+            return
+        self.summary = summary
+        self.summary_tokens = estimate_tokens(summary) if summary else 0
+        # הסיכום הוא חלק מה-system prompt, כך שה-context של המודל כבר לא תואם
+        self.evictions += 1
+        self.trim()
+
+    def system_prompt(self):
+        parts = [text for text, _ in self.pinned]
+        if self.summary:
+            parts.append(f"{SUMMARY_HEADER}\n{self.summary}")
+        return "\n\n".join(parts)
+
+    def build_prompt(self, username, last_turns=None):
+        turns = list(self.turns)
+        if last_turns is not None:
+            turns = turns[len(turns) - last_turns:]
+        lines = [f"{username if role == 'user' else 'Assistant'}: {text}" for role, text, _ in turns]
+        lines.append("Assistant:")
+        return self.system_prompt(), "\n".join(lines)
@@ -0,0 +1,136 @@
+import datetime
+from context_builder import ContextWindow, DEFAULT_TOKEN_BUDGET
+
+
+def timestamp_now():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Conversation:
+    """A chat and its history.
+
+    Messages are (text, is_user, model, tokens, timestamp) tuples. When the
+    conversation comes from a ConversationStore its messages are only read
+    from disk the first time `messages` is accessed, and every change is
+    written back through the store.
+
+    `summary` is a rolling summary of the first `summary_position` messages.
+    Once the history no longer fits the context window it is sent in place
+    of the evicted turns.
+    """
+
+    def __init__(self, name, token_budget=DEFAULT_TOKEN_BUDGET, conversation_id=None, store=None):
+        self.name = name
+        self.id = conversation_id
+        self.store = store
+        self._messages = None if store is not None and conversation_id is not None else []
+        self.context_window = ContextWindow(token_budget)
+        self.summary = ""
+        self.summary_position = 0
+        # ה-context שהחזיר Ollama בתור האחרון (מצב ה-KV של המודל)
+        self.kv_context = None
+        self.kv_context_model = None
+        self.kv_context_position = 0
+        self.kv_context_evictions = 0
+
+    @classmethod
+    def create(cls, name, token_budget=DEFAULT_TOKEN_BUDGET, store=None):
+        conversation = cls(name, token_budget)
+        if store is not None:
+            conversation.store = store
+            conversation.id = store.create_conversation(name, timestamp_now())
+        return conversation
+
+    @property
+    def messages(self):
+        if self._messages is None:
+            self._messages = self.store.load_messages(self.id)
+            self.summary, self.summary_position = self.store.load_summary(self.id)
+            self.context_window.rebuild(self._messages)
+            self.update_context_summary()
+        return self._messages
+
+    @property
+    def is_loaded(self):
+        return self._messages is not None
+
+    def unload(self):
+        """Drops the loaded messages; they are read from the store again on the next access.
+
+        Returns False (and keeps them) while the store still has uncommitted
+        writes, since reading back then could miss the latest messages.
+        """
+        if self.store is None or self.id is None or self._messages is None or self.store.has_pending_writes():
+            return False
+        self._messages = None
+        self.context_window.rebuild([])
+        self.invalidate_context()
+        return True
+
+    def rename(self, name):
+        self.name = name
+        if self.store is not None:
+            self.store.rename_conversation(self.id, name)
+
+    def add_message(self, message, is_user, model, tokens, timestamp=None):
+        record = (message, is_user, model, tokens, timestamp or timestamp_now())
+        self.messages.append(record)
+        self.context_window.append("user" if is_user else "assistant", message, tokens)
+        self.update_context_summary()
+        if self.store is not None:
+            self.store.append_message(self.id, len(self._messages) - 1, record)
+
+    def delete(self):
+        if self.store is not None:
+            self.store.delete_conversation(self.id)
+
+    def set_summary(self, summary, position):
+        self.summary = summary
+        self.summary_position = position
+        if self.store is not None:
+            self.store.save_summary(self.id, summary, position)
+        self.update_context_summary()
+
+    def evicted_count(self):
+        """Number of leading messages that no longer fit the context window."""
+        return len(self.messages) - len(self.context_window.turns)
+
+    def update_context_summary(self):
+        # הסיכום נשלח רק כשחלק מההיסטוריה כבר לא נכנס לחלון
+        self.context_window.set_summary(self.summary if self.evicted_count() > 0 else "")
+
+    def pin_instruction(self, instruction):
+        self.context_window.pin(instruction)
+        self.invalidate_context()
+
+    def set_kv_context(self, context, model):
+        # נקרא אחרי שתשובת המודל נוספה להיסטוריה
+        self.kv_context = context
+        self.kv_context_model = model
+        self.kv_context_position = len(self.messages)
+        self.kv_context_evictions = self.context_window.evictions
+
+    def invalidate_context(self):
+        self.kv_context = None
+        self.kv_context_model = None
+
+    def build_request(self, username, model):
+        """Returns (prompt, options) for the next turn, reusing the model's context when it is still valid."""
+        window = self.context_window
+        new_turns = len(self.messages) - self.kv_context_position
+        if (self.kv_context and self.kv_context_model == model
+                and self.kv_context_evictions == window.evictions
+                and 0 < new_turns <= len(window.turns)):
+            _, prompt = window.build_prompt(username, last_turns=new_turns)
+            return prompt, {"context": self.kv_context}
+        self.invalidate_context()
+        system_prompt, prompt = window.build_prompt(username)
+        return prompt, {"system": system_prompt} if system_prompt else {}
+
+
+def normalize_message(message):
+    # קבצי ייצוא ישנים שומרים הודעות בלי חותמת זמן (4 שדות)
+    message = tuple(message)
+    if len(message) == 4:
+        message += ("",)
+    return message
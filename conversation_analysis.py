@@ -0,0 +1,381 @@
+"""Sentiment and topic analysis of all conversations, computed incrementally.
+
+Every conversation has a revision in the store that grows with each change to
+its messages. `AnalysisThread` re-reads only the conversations whose revision
+differs from the cached analysis: it counts lexicon words for sentiment
+(Hebrew and English, with simple negation) and term frequencies for topics.
+Topics are the highest TF-IDF terms of each conversation, computed with NumPy
+over the cached term counts of all conversations, so unchanged conversations
+are never read again. Results are saved per conversation in the store, where
+the analytics dashboard reads them without recomputing anything.
+
+An optional LLM pass sends an excerpt of every conversation whose LLM result
+is out of date through the request scheduler, one request at a time, and
+stores the model's sentiment label and topics next to the local ones.
+"""
+import re
+import json
+import logging
+from functools import lru_cache
+from collections import Counter, deque
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from lazy_modules import np
+from request_scheduler import ChatRequest, PRIORITY_LOW
+from search_index import tokenize, normalize_text, prefix_variants, HEBREW_RE
+
+logger = logging.getLogger('AIChat.conversation_analysis')
+
+ANALYSIS = "analysis"
+# כמה מונחים נשמרים לכל שיחה; מהם מחושבים ה-IDF והנושאים בלי לקרוא שוב את ההודעות
+MAX_TERMS = 200
+TOPICS_PER_CONVERSATION = 5
+SENTIMENT_THRESHOLD = 0.2
+PROGRESS_EVERY = 10
+LLM_EXCERPT_MESSAGES = 20
+LLM_EXCERPT_CHARS = 4000
+SENTIMENT_LABELS = ("positive", "neutral", "negative")
+FINAL_FORMS = dict(zip("כמנפצ", "ךםןףץ"))
+
+LLM_PROMPT = ("Read the conversation below and reply with JSON only, in the form "
+              '{{"sentiment": "positive" | "neutral" | "negative", "topics": ["...", "..."]}}, '
+              "with up to {topics} short topics.\n\n{excerpt}")
+
+
+def word_set(words):
+    return frozenset(normalize_text(word) for word in words.split())
+
+
+POSITIVE_WORDS = word_set("""
+    good great excellent amazing awesome wonderful fantastic perfect nice love loved like liked happy glad
+    thanks thank helpful useful clear easy best better beautiful brilliant enjoy enjoyed fun cool correct
+    works working solved success successful impressive appreciate recommend pleased excited interesting
+    טוב טובה טובים מעולה מצוין מצוינת נהדר נהדרת מדהים מדהימה יפה אוהב אוהבת אהבתי שמח שמחה תודה
+    מועיל מועילה ברור קל הכי מושלם מושלמת כיף נחמד נחמדה נכון עובד עובדת הצלחה הצליח מרשים ממליץ מעניין
+""")
+NEGATIVE_WORDS = word_set("""
+    bad terrible awful horrible poor wrong hate hated dislike sad angry annoying annoyed broken bug bugs
+    error errors fail failed failure fails problem problems issue issues difficult hard confusing confused
+    slow useless worse worst crash crashed stuck disappointed disappointing frustrating frustrated ugly
+    רע רעה גרוע גרועה נורא נוראי שונא שונאת עצוב עצובה כועס כועסת מעצבן שבור באג באגים שגיאה שגיאות
+    נכשל נכשלה כישלון בעיה בעיות קשה קשים מבלבל איטי איטית מיותר תקוע מאוכזב מאכזב מתסכל
+""")
+NEGATIONS = word_set("not no never nothing don't doesn't didn't isn't wasn't can't cannot won't לא אין אינו אינה בלי אף")
+STOP_WORDS = word_set("""
+    the and for are but not you your with this that have from they will would there their what about which
+    when make can like time just him know take people into year good some could them see other than then
+    now look only come its over think also back after use two how our work first well way even new want
+    because any these give day most was were has had been being did does doing should here very more much
+    can't don't i'm it's that's what's let please yes sure okay thanks thank hello hi
+    של את על עם זה זו זאת הוא היא הם הן אני אתה את אנחנו אתם לא כן גם או אבל כי אם מה מי איך למה כמו
+    יש אין היה היתה היו יהיה כל עוד רק כבר אז פה שם כאן עכשיו אחד אחת שלי שלך שלו שלה שלנו אותו אותה
+    להיות יכול יכולה צריך צריכה רוצה אפשר מאוד הרבה קצת אחרי לפני בין תודה שלום בבקשה
+""")
+
+
+@lru_cache(maxsize=65536)
+def classify_token(token):
+    """Returns (polarity, is_topic_term) of a normalized token; cached, since most words repeat."""
+    hebrew = HEBREW_RE.match(token) is not None
+    polarity = 0
+    for candidate in [token] + (prefix_variants(token) if hebrew else []):
+        if candidate in POSITIVE_WORDS:
+            polarity = 1
+            break
+        if candidate in NEGATIVE_WORDS:
+            polarity = -1
+            break
+    is_topic = token not in STOP_WORDS and not token.isdigit() and len(token) >= (2 if hebrew else 3)
+    return polarity, is_topic
+
+
+def display_term(term):
+    # המונחים מנורמלים לאותיות רגילות; בסוף מילה בעברית חוזרים לאות סופית
+    if term and HEBREW_RE.match(term) and term[-1] in FINAL_FORMS:
+        return term[:-1] + FINAL_FORMS[term[-1]]
+    return term
+
+
+def sentiment_label(score):
+    if score >= SENTIMENT_THRESHOLD:
+        return "positive"
+    if score <= -SENTIMENT_THRESHOLD:
+        return "negative"
+    return "neutral"
+
+
+class ConversationStats:
+    """Sentiment counts and term frequencies of one conversation, accumulated message by message."""
+
+    def __init__(self):
+        self.messages = 0
+        self.positive = 0
+        self.negative = 0
+        self.terms = Counter()
+
+    def add(self, text):
+        self.messages += 1
+        negated = False
+        terms = []
+        for token in tokenize(text):
+            polarity, is_topic = classify_token(token)
+            # מילת שלילה הופכת את המילה שאחריה ("not good", "לא טוב")
+            if negated:
+                polarity = -polarity
+            if polarity > 0:
+                self.positive += 1
+            elif polarity < 0:
+                self.negative += 1
+            if is_topic:
+                terms.append(token)
+            negated = token in NEGATIONS
+        self.terms.update(terms)
+
+    def result(self, revision):
+        hits = self.positive + self.negative
+        score = round((self.positive - self.negative) / hits, 3) if hits else 0.0
+        return {"revision": revision, "messages": self.messages, "positive": self.positive,
+                "negative": self.negative, "sentiment": score, "label": sentiment_label(score),
+                "terms": dict(self.terms.most_common(MAX_TERMS))}
+
+
+def extract_topics(term_counts, top_n=TOPICS_PER_CONVERSATION):
+    """Returns {conversation_id: [topic, ...]}: the top TF-IDF terms of each conversation.
+
+    `term_counts` maps conversation ids to {term: count}. All conversations
+    are scored together in flat NumPy arrays (one entry per conversation/term pair).
+    """
+    ids = list(term_counts)
+    vocabulary = {}
+    rows, columns, counts = [], [], []
+    for row, conversation_id in enumerate(ids):
+        for term, count in term_counts[conversation_id].items():
+            rows.append(row)
+            columns.append(vocabulary.setdefault(term, len(vocabulary)))
+            counts.append(count)
+    topics = {conversation_id: [] for conversation_id in ids}
+    if not counts:
+        return topics
+    rows = np.array(rows)
+    columns = np.array(columns)
+    counts = np.array(counts, dtype=float)
+    document_frequency = np.bincount(columns, minlength=len(vocabulary))
+    idf = np.log((1 + len(ids)) / (1 + document_frequency)) + 1
+    totals = np.bincount(rows, weights=counts, minlength=len(ids))
+    scores = counts / totals[rows] * idf[columns]
+    # ממיינים לפי שיחה ובתוך כל שיחה לפי ציון יורד; הראשונים בכל קבוצה הם הנושאים
+    order = np.lexsort((-scores, rows))
+    starts = np.searchsorted(rows[order], np.arange(len(ids)))
+    ends = np.append(starts[1:], len(order))
+    terms = np.array([display_term(term) for term in vocabulary], dtype=object)
+    for row, conversation_id in enumerate(ids):
+        topics[conversation_id] = terms[columns[order[starts[row]:min(ends[row], starts[row] + top_n)]]].tolist()
+    return topics
+
+
+def conversation_excerpt(messages):
+    lines = []
+    length = 0
+    for index, (text, is_user, *_rest) in enumerate(messages):
+        if index >= LLM_EXCERPT_MESSAGES or length >= LLM_EXCERPT_CHARS:
+            break
+        line = f"{'User' if is_user else 'AI'}: {text}"[:LLM_EXCERPT_CHARS - length]
+        lines.append(line)
+        length += len(line)
+    return "\n".join(lines)
+
+
+def parse_llm_analysis(response):
+    match = re.search(r"\{.*\}", response, re.S)
+    if match is None:
+        raise ValueError(f"No JSON object in the response: {response[:80]}")
+    data = json.loads(match.group(0))
+    label = str(data.get("sentiment", "")).lower()
+    if label not in SENTIMENT_LABELS:
+        raise ValueError(f"Unknown sentiment label: {label}")
+    topics = [str(topic).strip() for topic in data.get("topics") or [] if str(topic).strip()]
+    return {"label": label, "topics": topics[:TOPICS_PER_CONVERSATION]}
+
+
+class AnalysisThread(QThread):
+    """Updates the cached analysis of every conversation that changed since it was computed."""
+
+    progress = pyqtSignal(int, int)
+    analysis_ready = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, store, cached, excerpts=False, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.cached = cached
+        self.with_excerpts = excerpts
+        self.excerpts = {}
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        conn = None
+        try:
+            self.store.flush(timeout=30)
+            conn = self.store.connect_reader()
+            revisions = self.store.conversation_revisions(conn)
+            # שיחות שנמחקו יוצאות מהתוצאות; העותקים מוגנים משינוי ב-thread של הממשק
+            results = {cid: dict(record) for cid, record in self.cached.items() if cid in revisions}
+            changed = [cid for cid, revision in revisions.items()
+                       if results.get(cid, {}).get("revision") != revision]
+            for done, conversation_id in enumerate(changed, 1):
+                stats = ConversationStats()
+                for message in self.store.iter_messages(conversation_id, conn):
+                    if self.cancelled:
+                        return
+                    stats.add(message[0])
+                record = stats.result(revisions[conversation_id])
+                if "llm" in results.get(conversation_id, {}):
+                    record["llm"] = results[conversation_id]["llm"]
+                results[conversation_id] = record
+                if done % PROGRESS_EVERY == 0:
+                    self.progress.emit(done, len(changed))
+            dirty = set(changed)
+            topics = extract_topics({cid: record["terms"] for cid, record in results.items()})
+            for conversation_id, terms in topics.items():
+                # IDF תלוי בכל השיחות, לכן גם נושאים של שיחות שלא השתנו יכולים לזוז
+                if results[conversation_id].get("topics") != terms:
+                    results[conversation_id]["topics"] = terms
+                    dirty.add(conversation_id)
+            for conversation_id in dirty:
+                self.store.save_analysis(conversation_id, results[conversation_id])
+            if self.with_excerpts:
+                for conversation_id, record in results.items():
+                    if self.cancelled:
+                        return
+                    if record.get("llm", {}).get("revision") != record["revision"] and record["messages"]:
+                        self.excerpts[conversation_id] = conversation_excerpt(
+                            self.store.iter_messages(conversation_id, conn))
+            logger.info("Analyzed %s changed conversation(s) of %s", len(changed), len(revisions))
+            self.progress.emit(len(changed), len(changed))
+            self.analysis_ready.emit(results)
+        except Exception as e:
+            logger.error("Error analyzing conversations: %s", e)
+            self.failed.emit(str(e))
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+class ConversationAnalyzer(QObject):
+    """Runs the analysis in the background and keeps the latest results for the UI.
+
+    `results` maps conversation ids to their analysis records (see
+    ConversationStats.result); the optional LLM pass adds an "llm" entry with
+    the model's label and topics.
+    """
+
+    progress = pyqtSignal(int, int)
+    analysis_updated = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, store, scheduler=None, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.scheduler = scheduler
+        self._results = None
+        self.thread = None
+        self.conversations = {}
+        self.llm_model = None
+        self.llm_options = {}
+        self.llm_queue = deque()
+        self.llm_request = None
+        if scheduler is not None:
+            scheduler.response_received.connect(self.handle_llm_response)
+            scheduler.error_occurred.connect(self.handle_llm_error)
+            scheduler.request_finished.connect(self.handle_llm_finished)
+            scheduler.request_dropped.connect(self.handle_llm_finished)
+
+    @property
+    def results(self):
+        # נקרא מהמסד רק בפעם הראשונה; אחר כך מתעדכן מכל ריצה
+        if self._results is None:
+            self._results = self.store.load_analysis()
+        return self._results
+
+    def is_running(self):
+        return self.thread is not None or self.llm_request is not None or bool(self.llm_queue)
+
+    def analyze(self, conversations, llm_model=None, llm_options=None):
+        """Starts an incremental run; returns False if one is already running."""
+        if self.is_running():
+            return False
+        self.conversations = {c.id: c for c in conversations if c.id is not None}
+        self.llm_model = llm_model if self.scheduler is not None else None
+        self.llm_options = llm_options or {}
+        self.thread = AnalysisThread(self.store, self.results, excerpts=self.llm_model is not None)
+        self.thread.progress.connect(self.progress)
+        self.thread.analysis_ready.connect(self.handle_results)
+        self.thread.failed.connect(self.failed)
+        self.thread.finished.connect(self.thread_finished)
+        self.thread.start()
+        return True
+
+    def handle_results(self, results):
+        self._results = results
+        self.analysis_updated.emit(results)
+
+    def thread_finished(self):
+        thread, self.thread = self.thread, None
+        thread.deleteLater()
+        if self.llm_model is not None and not thread.cancelled:
+            self.llm_queue.extend(thread.excerpts.items())
+        self.submit_next()
+
+    def submit_next(self):
+        while self.llm_queue:
+            conversation_id, excerpt = self.llm_queue.popleft()
+            conversation = self.conversations.get(conversation_id)
+            if conversation is None:
+                continue
+            prompt = LLM_PROMPT.format(topics=TOPICS_PER_CONVERSATION, excerpt=excerpt)
+            self.llm_request = ChatRequest(conversation, self.llm_model, prompt, dict(self.llm_options),
+                                           kind=ANALYSIS, priority=PRIORITY_LOW)
+            self.scheduler.submit(self.llm_request)
+            return
+        self.finished.emit()
+
+    def handle_llm_response(self, request, response):
+        if request is not self.llm_request:
+            return
+        conversation_id = request.conversation.id
+        record = self.results.get(conversation_id)
+        if record is None:
+            return
+        try:
+            llm = parse_llm_analysis(response)
+        except ValueError as e:
+            logger.warning("Could not read the model's analysis of '%s': %s", request.conversation.name, e)
+            return
+        llm.update(revision=record["revision"], model=request.model)
+        record["llm"] = llm
+        self.store.save_analysis(conversation_id, record)
+        self.analysis_updated.emit(self.results)
+
+    def handle_llm_error(self, request, error):
+        if request is self.llm_request:
+            logger.warning("LLM analysis of '%s' failed: %s", request.conversation.name, error)
+
+    def handle_llm_finished(self, request):
+        if request is self.llm_request:
+            self.llm_request = None
+            self.submit_next()
+
+    def cancel(self):
+        self.llm_queue.clear()
+        if self.thread is not None:
+            self.thread.cancel()
+        if self.llm_request is not None:
+            self.scheduler.cancel_request(self.llm_request)
+
+    def shutdown(self, wait_ms=5000):
+        self.cancel()
+        if self.thread is not None:
+            self.thread.wait(wait_ms)
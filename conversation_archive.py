@@ -0,0 +1,264 @@
+"""Streaming export and import of conversation archives.
+
+The archive format is JSON Lines: a `conversation` header record followed by
+one `message` record per message. Export reads messages from the store with a
+cursor and import writes them through the store's queued writer, so memory use
+does not grow with the archive. The older single-document JSON format
+(`[{"name": ..., "messages": [[text, is_user, model, tokens], ...]}]`) is
+still written for `.json` files and read back one conversation at a time;
+messages without a timestamp get an empty one, as elsewhere in the app.
+"""
+import os
+import json
+import codecs
+import logging
+from PyQt5.QtCore import QThread, pyqtSignal
+from conversation import normalize_message, timestamp_now
+
+logger = logging.getLogger('AIChat.conversation_archive')
+
+ARCHIVE_VERSION = 1
+PROGRESS_STEPS = 1000
+PROGRESS_EVERY = 500
+# אחרי כמה הודעות מחכים לכותב של ה-store, כדי שהתור לא יגדל בלי הגבלה
+IMPORT_FLUSH_EVERY = 5000
+READ_CHUNK_SIZE = 64 * 1024
+DEFAULT_IMPORT_NAME = "Imported Chat"
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def message_record(message):
+    text, is_user, model, tokens, timestamp = normalize_message(message)
+    return {"type": "message", "text": text, "is_user": is_user, "model": model,
+            "tokens": tokens, "timestamp": timestamp}
+
+
+def record_message(record):
+    if "text" not in record:
+        raise ArchiveError(f"Message record without text: {record}")
+    return (record["text"], bool(record.get("is_user")), record.get("model"),
+            record.get("tokens") or 0, record.get("timestamp") or "")
+
+
+def iter_jsonl(f):
+    """Yields (record, bytes_read) for every line of a binary JSON Lines file."""
+    position = 0
+    for number, line in enumerate(f, 1):
+        position += len(line)
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line), position
+        except ValueError as e:
+            raise ArchiveError(f"Line {number} is not valid JSON: {e}")
+
+
+def iter_json_array(f):
+    """Yields (element, bytes_read) for each element of a top-level JSON array, decoding incrementally."""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    started = False
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,")
+        if not started and buffer.startswith("["):
+            buffer = buffer[1:].lstrip()
+            started = True
+        if started and buffer.startswith("]"):
+            return
+        if started and buffer:
+            try:
+                element, end = decoder.raw_decode(buffer)
+            except ValueError:
+                pass
+            else:
+                buffer = buffer[end:]
+                yield element, position
+                continue
+        # קריאה בגודל שגדל עם החוצץ, כך ששיחה ארוכה לא מפוענחת מחדש שוב ושוב
+        chunk = f.read(max(READ_CHUNK_SIZE, len(buffer)))
+        if not chunk:
+            raise ArchiveError("The archive ends in the middle of a conversation" if started
+                               else "The archive is not a JSON array of conversations")
+        position += len(chunk)
+        buffer += text_decoder.decode(chunk)
+
+
+def iter_archive(f):
+    """Yields ("conversation", name, bytes_read) and ("message", message, bytes_read) from either format.
+
+    `f` is a file opened with open(path, "rb"); the format is chosen by the first character.
+    """
+    if f.peek(3)[:3] == codecs.BOM_UTF8:
+        f.read(3)
+    while f.peek(1)[:1] in (b" ", b"\t", b"\r", b"\n"):
+        f.read(1)
+    if f.peek(1)[:1] == b"[":
+        for conversation, position in iter_json_array(f):
+            yield "conversation", conversation.get("name") or DEFAULT_IMPORT_NAME, position
+            for message in conversation.get("messages", []):
+                yield "message", normalize_message(message), position
+        return
+    for record, position in iter_jsonl(f):
+        kind = record.get("type")
+        if kind == "conversation":
+            yield "conversation", record.get("name") or DEFAULT_IMPORT_NAME, position
+        elif kind == "message":
+            yield "message", record_message(record), position
+        elif kind != "archive":
+            logger.warning("Skipping unknown archive record type: %s", kind)
+
+
+class ArchiveThread(QThread):
+    progress = pyqtSignal(int)
+    failed = pyqtSignal(str)
+    # (שיחות, הודעות, שגיאות בשיחות בודדות) - האות היחיד שנשלח כשהפעולה הסתיימה
+    completed = pyqtSignal(int, int, list)
+
+    def __init__(self, store, path, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.path = path
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def report(self, done, total):
+        self.progress.emit(min(PROGRESS_STEPS, done * PROGRESS_STEPS // max(total, 1)))
+
+
+class ExportThread(ArchiveThread):
+    """Writes conversations to a .jsonl (or legacy .json) archive; the file only appears once complete."""
+
+    def __init__(self, store, conversations, path, parent=None):
+        super().__init__(store, path, parent)
+        # שיחות בלי store נשמרות בזיכרון; לכל השאר ההודעות נקראות מהמסד בזמן הכתיבה
+        self.conversations = [(c.id, c.name, None if c.store is not None else list(c.messages))
+                              for c in conversations]
+        self.legacy = path.lower().endswith(".json")
+
+    def iter_messages(self, conn, conversation_id, messages):
+        return iter(messages) if messages is not None else self.store.iter_messages(conversation_id, conn)
+
+    def run(self):
+        temp_path = f"{self.path}.tmp"
+        conn = None
+        try:
+            self.store.flush(timeout=30)
+            conn = self.store.connect_reader()
+            total = sum(len(messages) if messages is not None else self.store.count_messages(conversation_id, conn)
+                        for conversation_id, _, messages in self.conversations)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                written = self.write_legacy(f, conn, total) if self.legacy else self.write_jsonl(f, conn, total)
+            if self.cancelled:
+                return
+            os.replace(temp_path, self.path)
+            logger.info("Exported %s conversations (%s messages) to %s", len(self.conversations), written, self.path)
+            self.completed.emit(len(self.conversations), written, [])
+        except Exception as e:
+            logger.error("Error exporting conversations: %s", e)
+            self.failed.emit(str(e))
+        finally:
+            if conn is not None:
+                conn.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def write_jsonl(self, f, conn, total):
+        written = 0
+        f.write(json.dumps({"type": "archive", "version": ARCHIVE_VERSION}) + "\n")
+        for conversation_id, name, messages in self.conversations:
+            f.write(json.dumps({"type": "conversation", "name": name}, ensure_ascii=False) + "\n")
+            for message in self.iter_messages(conn, conversation_id, messages):
+                if self.cancelled:
+                    return written
+                f.write(json.dumps(message_record(message), ensure_ascii=False) + "\n")
+                written += 1
+                if written % PROGRESS_EVERY == 0:
+                    self.report(written, total)
+        self.report(total, total)
+        return written
+
+    def write_legacy(self, f, conn, total):
+        written = 0
+        f.write("[")
+        for index, (conversation_id, name, messages) in enumerate(self.conversations):
+            f.write(("," if index else "") + '\n  {"name": ' + json.dumps(name, ensure_ascii=False) + ', "messages": [')
+            for position, message in enumerate(self.iter_messages(conn, conversation_id, messages)):
+                if self.cancelled:
+                    return written
+                f.write(("," if position else "") + "\n    " + json.dumps(list(message), ensure_ascii=False))
+                written += 1
+                if written % PROGRESS_EVERY == 0:
+                    self.report(written, total)
+            f.write("\n  ]}")
+        f.write("\n]\n")
+        self.report(total, total)
+        return written
+
+
+class ImportThread(ArchiveThread):
+    """Reads an archive into the store; each conversation is announced once all its messages are written.
+
+    A cancelled import keeps the conversations that were completed and drops
+    the one that was being read.
+    """
+
+    conversation_imported = pyqtSignal(int, str)
+
+    def run(self):
+        current = None
+        finished = []
+        conversations = messages = 0
+        try:
+            total = os.path.getsize(self.path)
+            with open(self.path, "rb") as f:
+                for kind, value, position in iter_archive(f):
+                    if self.cancelled:
+                        break
+                    if kind == "conversation" or current is None:
+                        if current is not None:
+                            finished.append(current)
+                        name = value if kind == "conversation" else DEFAULT_IMPORT_NAME
+                        current = [self.store.create_conversation(name, timestamp_now()), name, 0]
+                        conversations += 1
+                        if kind == "conversation":
+                            continue
+                    self.store.append_message(current[0], current[2], value)
+                    current[2] += 1
+                    messages += 1
+                    if messages % IMPORT_FLUSH_EVERY == 0:
+                        self.announce(finished)
+                    if messages % PROGRESS_EVERY == 0:
+                        self.report(position, total)
+            if current is not None:
+                if self.cancelled:
+                    self.store.delete_conversation(current[0])
+                    conversations -= 1
+                    messages -= current[2]
+                else:
+                    finished.append(current)
+            self.announce(finished)
+            if not self.cancelled:
+                self.report(total, total)
+                logger.info("Imported %s conversations (%s messages) from %s", conversations, messages, self.path)
+                self.completed.emit(conversations, messages, [])
+        except Exception as e:
+            if current is not None:
+                self.store.delete_conversation(current[0])
+            self.announce(finished)
+            logger.error("Error importing conversations: %s", e)
+            self.failed.emit(str(e))
+
+    def announce(self, finished):
+        # ההודעות צריכות להיות במסד לפני שהשיחה מופיעה ואפשר לפתוח אותה
+        self.store.flush(timeout=60)
+        for conversation_id, name, _ in finished:
+            self.conversation_imported.emit(conversation_id, name)
+        finished.clear()
@@ -0,0 +1,398 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from search_index import index_text, build_match_query, matches
+
+logger = logging.getLogger('AIChat.conversation_store')
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), 'conversations.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    is_user INTEGER NOT NULL,
+    model TEXT,
+    tokens INTEGER,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id, position);
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    conversation_id INTEGER PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversation_titles (
+    conversation_id INTEGER PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,
+    titles TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversation_analysis (
+    conversation_id INTEGER PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,
+    analysis TEXT NOT NULL
+);
+"""
+
+# אינדקס חיפוש מלא; rowid שווה ל-messages.id והגוף הוא הטקסט המנורמל (search_index.index_text)
+INDEX_SCHEMA = ("CREATE VIRTUAL TABLE message_index USING fts5(body, tokenize='unicode61 remove_diacritics 2', "
+                "prefix='2 3 4')")
+
+# סכומים מצטברים ללוח הבקרה, לפי שיחה, יום ומודל. כל כתיבת הודעה מעדכנת אותם באותה טרנזקציה,
+# כך שהם תמיד תואמים לטבלת ההודעות ואין צורך לעבור על ההיסטוריה.
+# (לא טריגר: טריגר פותח savepoint בכל INSERT, ו-FTS5 כותב את האינדקס לדיסק בכל savepoint)
+STATS_SCHEMA = """
+CREATE TABLE message_stats (
+    conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    is_user INTEGER NOT NULL,
+    messages INTEGER NOT NULL,
+    tokens INTEGER NOT NULL,
+    PRIMARY KEY (conversation_id, day, model, is_user)
+) WITHOUT ROWID;
+CREATE INDEX idx_message_stats_day ON message_stats(day);
+CREATE TABLE request_stats (
+    conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    completed INTEGER NOT NULL,
+    latency REAL NOT NULL,
+    eval_tokens INTEGER NOT NULL,
+    eval_seconds REAL NOT NULL,
+    PRIMARY KEY (conversation_id, day, model)
+) WITHOUT ROWID;
+"""
+
+# bm25 מחושב רק על החלון הזה של ההתאמות האחרונות, כדי שמילים נפוצות לא יחייבו דירוג של כל ההיסטוריה
+RANK_WINDOW = 500
+
+_STOP = object()
+
+
+class ConversationStore:
+    """SQLite (WAL) persistence for conversations and their messages.
+
+    Writes are queued and applied by a background thread in batched
+    transactions, so the UI thread never waits on disk. Reads use a
+    per-thread connection, which WAL allows to run alongside the writer.
+    Messages are also kept in an FTS5 index that is updated with every write.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, batch_size=200, batch_interval=0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        conn = self._reader()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+        self.full_text = self._create_index(conn)
+        self._create_stats(conn)
+        conn.commit()
+        self._next_conversation_id = (conn.execute("SELECT MAX(id) FROM conversations").fetchone()[0] or 0) + 1
+        self._id_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._run_writer, name="ConversationStoreWriter", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _migrate(self, conn):
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(conversations)")}
+        if "revision" not in columns:
+            conn.execute("ALTER TABLE conversations ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+
+    def _create_index(self, conn):
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'message_index'").fetchone():
+            return True
+        try:
+            conn.execute(INDEX_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning("SQLite FTS5 is not available, search will scan messages: %s", e)
+            return False
+        # מסד נתונים קיים - בונים את האינדקס פעם אחת מההודעות שכבר שמורות
+        rows = conn.execute("SELECT id, text FROM messages")
+        conn.executemany("INSERT INTO message_index (rowid, body) VALUES (?, ?)",
+                         ((message_id, index_text(text)) for message_id, text in rows))
+        return True
+
+    def _create_stats(self, conn):
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'message_stats'").fetchone():
+            return
+        conn.executescript(STATS_SCHEMA)
+        # מסד נתונים קיים - הסכומים נבנים פעם אחת מההודעות שכבר שמורות
+        conn.execute("INSERT INTO message_stats SELECT conversation_id, substr(created_at, 1, 10), "
+                     "COALESCE(model, ''), is_user, COUNT(*), COALESCE(SUM(tokens), 0) FROM messages "
+                     "GROUP BY 1, 2, 3, 4")
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _run_writer(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_interval
+            while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            events = []
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    events.append(item)
+                elif item is not _STOP:
+                    # פריט אחד יכול להכיל כמה פקודות שתלויות זו בזו (למשל הודעה והאינדקס שלה)
+                    for statement in item:
+                        try:
+                            conn.execute(*statement)
+                        except sqlite3.Error as e:
+                            logger.error("Conversation store write failed: %s (%s...)", e, statement[0][:40])
+                            break
+            try:
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error("Failed to commit %s queued change(s) to the conversation store: %s", len(batch), e)
+            for event in events:
+                event.set()
+            for _ in batch:
+                self._queue.task_done()
+            if batch[-1] is _STOP:
+                conn.close()
+                return
+
+    def _write(self, *statements):
+        self._queue.put([(sql, params) for sql, params in statements if sql])
+
+    def _unindex(self, where, params):
+        if not self.full_text:
+            return None, ()
+        return f"DELETE FROM message_index WHERE rowid IN (SELECT id FROM messages WHERE {where})", params
+
+    def _bump_revision(self, conversation_id):
+        # כל שינוי בהודעות מקדם את הגרסה של השיחה, כך שניתוחים יודעים מה השתנה מאז הריצה הקודמת
+        return "UPDATE conversations SET revision = revision + 1 WHERE id = ?", (conversation_id,)
+
+    def flush(self, timeout=5.0):
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def has_pending_writes(self):
+        """True while changes are still queued or not yet committed; readers would not see them."""
+        return self._queue.unfinished_tasks > 0
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(10)
+
+    def load_conversations(self):
+        return self._reader().execute("SELECT id, name FROM conversations ORDER BY id").fetchall()
+
+    def load_messages(self, conversation_id):
+        return list(self.iter_messages(conversation_id))
+
+    def iter_messages(self, conversation_id, conn=None):
+        """Yields the messages of a conversation one by one, without reading them all into memory."""
+        rows = (conn or self._reader()).execute(
+            "SELECT text, is_user, model, tokens, created_at FROM messages "
+            "WHERE conversation_id = ? ORDER BY position", (conversation_id,))
+        for text, is_user, model, tokens, created_at in rows:
+            yield text, bool(is_user), model, tokens, created_at
+
+    def count_messages(self, conversation_id=None, conn=None):
+        if conversation_id is None:
+            return (conn or self._reader()).execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return (conn or self._reader()).execute(
+            "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)).fetchone()[0]
+
+    def create_conversation(self, name, created_at):
+        with self._id_lock:
+            conversation_id = self._next_conversation_id
+            self._next_conversation_id += 1
+        self._write(("INSERT INTO conversations (id, name, created_at) VALUES (?, ?, ?)",
+                     (conversation_id, name, created_at)))
+        return conversation_id
+
+    def rename_conversation(self, conversation_id, name):
+        self._write(("UPDATE conversations SET name = ? WHERE id = ?", (name, conversation_id)))
+
+    def delete_conversation(self, conversation_id):
+        self._write(self._unindex("conversation_id = ?", (conversation_id,)),
+                    ("DELETE FROM conversations WHERE id = ?", (conversation_id,)))
+
+    def append_message(self, conversation_id, position, message):
+        text, is_user, model, tokens, created_at = message
+        self._write(("INSERT INTO messages (conversation_id, position, text, is_user, model, tokens, created_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (conversation_id, position, text, int(bool(is_user)), model, tokens, created_at)),
+                    ("INSERT INTO message_index (rowid, body) VALUES (last_insert_rowid(), ?)"
+                     if self.full_text else None, (index_text(text),)),
+                    ("INSERT INTO message_stats VALUES (?, substr(?, 1, 10), COALESCE(?, ''), ?, 1, COALESCE(?, 0)) "
+                     "ON CONFLICT (conversation_id, day, model, is_user) "
+                     "DO UPDATE SET messages = messages + 1, tokens = tokens + excluded.tokens",
+                     (conversation_id, created_at, model, int(bool(is_user)), tokens)),
+                    self._bump_revision(conversation_id))
+
+    def conversation_revisions(self, conn=None):
+        return dict((conn or self._reader()).execute("SELECT id, revision FROM conversations"))
+
+    def load_summary(self, conversation_id, conn=None):
+        """Returns (summary, position): the rolling summary of the first `position` messages."""
+        row = (conn or self._reader()).execute(
+            "SELECT summary, position FROM conversation_summaries WHERE conversation_id = ?",
+            (conversation_id,)).fetchone()
+        return row if row is not None else ("", 0)
+
+    def save_summary(self, conversation_id, summary, position):
+        self._write(("INSERT OR REPLACE INTO conversation_summaries (conversation_id, summary, position) "
+                     "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM conversations WHERE id = ?)",
+                     (conversation_id, summary, position, conversation_id)))
+
+    def load_titles(self, conn=None):
+        """Generated title suggestions of every conversation that has any."""
+        rows = (conn or self._reader()).execute("SELECT conversation_id, titles FROM conversation_titles")
+        return {conversation_id: json.loads(titles) for conversation_id, titles in rows}
+
+    def save_titles(self, conversation_id, titles):
+        self._write(("INSERT OR REPLACE INTO conversation_titles (conversation_id, titles) "
+                     "SELECT ?, ? WHERE EXISTS (SELECT 1 FROM conversations WHERE id = ?)",
+                     (conversation_id, json.dumps(titles, ensure_ascii=False), conversation_id)))
+
+    def load_analysis(self, conn=None):
+        """The cached analysis of every conversation, as saved by save_analysis."""
+        rows = (conn or self._reader()).execute("SELECT conversation_id, analysis FROM conversation_analysis")
+        return {conversation_id: json.loads(analysis) for conversation_id, analysis in rows}
+
+    def save_analysis(self, conversation_id, analysis):
+        # שיחה שנמחקה בינתיים לא מקבלת שורה (ולא נכשלת על ה-foreign key)
+        self._write(("INSERT OR REPLACE INTO conversation_analysis (conversation_id, analysis) "
+                     "SELECT ?, ? WHERE EXISTS (SELECT 1 FROM conversations WHERE id = ?)",
+                     (conversation_id, json.dumps(analysis, ensure_ascii=False), conversation_id)))
+
+    def record_request(self, conversation_id, metrics):
+        """Adds one finished request (a request_metrics record) to the per-day request totals."""
+        completed = metrics["status"] == "ok"
+        eval_tokens = metrics["eval_tokens"] or 0
+        tokens_per_second = metrics["tokens_per_second"]
+        self._write(("INSERT INTO request_stats SELECT ?, ?, ?, 1, ?, ?, ?, ?, ? "
+                     "WHERE EXISTS (SELECT 1 FROM conversations WHERE id = ?) "
+                     "ON CONFLICT (conversation_id, day, model) DO UPDATE SET "
+                     "requests = requests + 1, errors = errors + excluded.errors, "
+                     "completed = completed + excluded.completed, latency = latency + excluded.latency, "
+                     "eval_tokens = eval_tokens + excluded.eval_tokens, "
+                     "eval_seconds = eval_seconds + excluded.eval_seconds",
+                     (conversation_id, metrics["time"][:10], metrics["model"] or "",
+                      int(metrics["status"] == "error"), int(completed),
+                      metrics["latency"] if completed else 0.0,
+                      eval_tokens if completed and tokens_per_second else 0,
+                      eval_tokens / tokens_per_second if completed and tokens_per_second else 0.0,
+                      conversation_id)))
+
+    def load_stats(self, since=None, conn=None):
+        """Totals from the aggregate tables, from the "YYYY-MM-DD" day `since` (inclusive) or of all time.
+
+        Returns {"models": {model: {...}}, "conversations": {id: (messages, tokens)},
+        "days": [(day, messages, tokens), ...]}; reads only the aggregates, never the messages.
+        """
+        conn = conn or self._reader()
+        where, params = ("WHERE day >= ?", (since,)) if since else ("", ())
+        models = {}
+        for model, messages, tokens in conn.execute(
+                f"SELECT model, SUM(messages), SUM(tokens) FROM message_stats {where} GROUP BY model", params):
+            models[model] = {"messages": messages, "tokens": tokens, "requests": 0, "errors": 0, "completed": 0,
+                             "latency": 0.0, "eval_tokens": 0, "eval_seconds": 0.0}
+        for row in conn.execute(
+                f"SELECT model, SUM(requests), SUM(errors), SUM(completed), SUM(latency), SUM(eval_tokens), "
+                f"SUM(eval_seconds) FROM request_stats {where} GROUP BY model", params):
+            entry = models.setdefault(row[0], {"messages": 0, "tokens": 0})
+            entry.update(zip(("requests", "errors", "completed", "latency", "eval_tokens", "eval_seconds"), row[1:]))
+        conversations = {conversation_id: (messages, tokens) for conversation_id, messages, tokens in conn.execute(
+            f"SELECT conversation_id, SUM(messages), SUM(tokens) FROM message_stats {where} "
+            f"GROUP BY conversation_id", params)}
+        days = conn.execute(f"SELECT day, SUM(messages), SUM(tokens) FROM message_stats {where} "
+                            f"GROUP BY day ORDER BY day", params).fetchall()
+        return {"models": models, "conversations": conversations, "days": days}
+
+    def connect_reader(self):
+        """A separate read connection, for threads that need to interrupt their own queries."""
+        return self._connect()
+
+    def search(self, query, since=None, until=None, model=None, is_user=None, conversation_id=None,
+               limit=50, prefix_last=True, conn=None):
+        """Full-text search over all messages, best matches first.
+
+        `since`/`until` are "YYYY-MM-DD" dates (inclusive). Matches are ranked
+        by bm25 within the newest RANK_WINDOW hits. Returns
+        (conversation_id, position, text, is_user, model, created_at) rows.
+        """
+        return list(self.iter_search(query, since, until, model, is_user, conversation_id, limit, prefix_last, conn))
+
+    def iter_search(self, query, since=None, until=None, model=None, is_user=None, conversation_id=None,
+                    limit=50, prefix_last=True, conn=None):
+        match = build_match_query(query, prefix_last)
+        if not match:
+            return
+        filters, params = [], []
+        if since:
+            filters.append("m.created_at >= ?")
+            params.append(since)
+        if until:
+            filters.append("substr(m.created_at, 1, 10) <= ?")
+            params.append(until)
+        if model:
+            filters.append("m.model = ?")
+            params.append(model)
+        if is_user is not None:
+            filters.append("m.is_user = ?")
+            params.append(int(bool(is_user)))
+        if conversation_id is not None:
+            filters.append("m.conversation_id = ?")
+            params.append(conversation_id)
+        where = "".join(f" AND {f}" for f in filters)
+        columns = "m.conversation_id, m.position, m.text, m.is_user, m.model, m.created_at"
+        conn = conn or self._reader()
+        if self.full_text:
+            join = " JOIN messages m ON m.id = message_index.rowid" if filters else ""
+            rows = conn.execute(f"SELECT {columns} FROM (SELECT message_index.rowid AS id, bm25(message_index) AS score "
+                                f"FROM message_index{join} WHERE message_index MATCH ?{where} "
+                                f"ORDER BY message_index.rowid DESC LIMIT ?) hits "
+                                f"JOIN messages m ON m.id = hits.id ORDER BY hits.score LIMIT ?",
+                                [match] + params + [RANK_WINDOW, limit])
+            for c, p, text, u, m, t in rows:
+                yield c, p, text, bool(u), m, t
+            return
+        rows = conn.execute(f"SELECT {columns} FROM messages m WHERE 1{where} ORDER BY m.id DESC", params)
+        found = 0
+        for c, p, text, u, m, t in rows:
+            if matches(text, query, prefix_last):
+                yield c, p, text, bool(u), m, t
+                found += 1
+                if found >= limit:
+                    return
@@ -0,0 +1,186 @@
+"""Rolling, incremental summaries of conversations, built by the local model in the background.
+
+A conversation's summary covers its first `summary_position` messages. An
+update only reads the messages after that position: they are cut into chunks
+of about CHUNK_TOKENS, each chunk is summarized on its own (map), and the
+previous summary and the chunk summaries are then merged, REDUCE_FANIN at a
+time, into the new summary (reduce). The requests go through the request
+scheduler as background requests, one step at a time per conversation, so
+they never hold up the chat and never run twice for the same text.
+
+Once a conversation outgrows the prompt token budget, the summary is sent in
+the system prompt in place of the evicted turns (see ContextWindow), and
+`ConversationSummarizer.needs_update` tells when enough evicted messages are
+not yet covered by it.
+"""
+import logging
+from collections import deque
+from PyQt5.QtCore import QObject, pyqtSignal
+from context_builder import estimate_tokens
+from request_scheduler import ChatRequest, PRIORITY_LOW
+
+logger = logging.getLogger('AIChat.conversation_summary')
+
+SUMMARY = "summary"
+CHUNK_TOKENS = 1500
+# כמה מקטעים מסוכמים בעדכון אחד; שיחה ארוכה מאוד מסוכמת בכמה עדכונים רצופים
+MAX_CHUNKS_PER_UPDATE = 8
+REDUCE_FANIN = 4
+# עדכון אוטומטי מתחיל רק כשמספיק הודעות יצאו מהחלון בלי להיכלל בסיכום
+MIN_UPDATE_TOKENS = 400
+SUMMARY_WORDS = 200
+
+MAP_PROMPT = ("Summarize this part of a conversation in a few sentences. Keep names, facts, decisions, "
+              "code identifiers and open questions.\n\n{text}\n\nSummary:")
+REDUCE_PROMPT = ("These are summaries of consecutive parts of one conversation, oldest first. Merge them into "
+                 "a single summary of at most {words} words. Keep names, facts, decisions, code identifiers "
+                 "and open questions; drop small talk.\n\n{summaries}\n\nSummary:")
+
+
+def message_tokens(message):
+    return message[3] or estimate_tokens(message[0])
+
+
+def chunk_messages(messages, start, end, chunk_tokens=CHUNK_TOKENS, max_chunks=MAX_CHUNKS_PER_UPDATE):
+    """Splits messages[start:end] into at most `max_chunks` (text, end_position) chunks of about `chunk_tokens`."""
+    chunks = []
+    lines = []
+    tokens = 0
+    for position in range(start, end):
+        text, is_user = messages[position][0], messages[position][1]
+        lines.append(f"{'User' if is_user else 'Assistant'}: {text}")
+        tokens += message_tokens(messages[position])
+        if tokens >= chunk_tokens:
+            chunks.append(("\n".join(lines), position + 1))
+            lines = []
+            tokens = 0
+            if len(chunks) >= max_chunks:
+                return chunks
+    if lines:
+        chunks.append(("\n".join(lines), end))
+    return chunks
+
+
+class SummaryJob:
+    """One update of a conversation's summary: the chunks still to map and the parts still to reduce."""
+
+    def __init__(self, conversation, model, options, chunks, target):
+        self.conversation = conversation
+        self.model = model
+        self.options = options
+        self.chunks = deque(text for text, _ in chunks)
+        self.end = chunks[-1][1]
+        self.target = target
+        self.start = conversation.summary_position
+        self.parts = [conversation.summary] if conversation.summary else []
+        self.reducing = 0
+        self.request = None
+        self.response = None
+
+
+class ConversationSummarizer(QObject):
+    summary_updated = pyqtSignal(object)
+    failed = pyqtSignal(object, str)
+
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        self.jobs = {}
+        scheduler.response_received.connect(self.handle_response)
+        scheduler.error_occurred.connect(self.handle_error)
+        scheduler.request_finished.connect(self.handle_finished)
+        scheduler.request_dropped.connect(self.handle_finished)
+
+    def is_updating(self, conversation):
+        return id(conversation) in self.jobs
+
+    def needs_update(self, conversation):
+        """True when the messages evicted from the context window but not yet summarized are worth a model call."""
+        if self.is_updating(conversation):
+            return False
+        messages = conversation.messages
+        evicted = conversation.evicted_count()
+        pending = sum(message_tokens(messages[i]) for i in range(conversation.summary_position, evicted))
+        return pending >= MIN_UPDATE_TOKENS
+
+    def update(self, conversation, model, options=None, end=None):
+        """Starts updating the summary up to message `end` (default: up to the context window).
+
+        Returns False if there is nothing new to summarize or an update is already running.
+        """
+        if self.is_updating(conversation):
+            return False
+        target = conversation.evicted_count() if end is None else end
+        chunks = chunk_messages(conversation.messages, conversation.summary_position, target)
+        if not chunks:
+            return False
+        job = SummaryJob(conversation, model, dict(options or {}), chunks, target)
+        self.jobs[id(conversation)] = job
+        logger.info("Summarizing messages %s-%s of '%s' in %s chunk(s)", job.start, job.end, conversation.name,
+                    len(job.chunks))
+        self.advance(job)
+        return True
+
+    def advance(self, job):
+        if job.chunks:
+            prompt = MAP_PROMPT.format(text=job.chunks.popleft())
+        elif len(job.parts) > 1:
+            # ממזגים עד REDUCE_FANIN חלקים בכל קריאה, עד שנשאר סיכום אחד
+            job.reducing = min(REDUCE_FANIN, len(job.parts))
+            summaries = "\n\n".join(f"Part {i + 1}:\n{part}" for i, part in enumerate(job.parts[:job.reducing]))
+            prompt = REDUCE_PROMPT.format(words=SUMMARY_WORDS, summaries=summaries)
+        else:
+            self.finish(job)
+            return
+        job.response = None
+        job.request = ChatRequest(job.conversation, job.model, prompt, dict(job.options), kind=SUMMARY,
+                                  priority=PRIORITY_LOW)
+        self.scheduler.submit(job.request)
+
+    def finish(self, job):
+        del self.jobs[id(job.conversation)]
+        conversation = job.conversation
+        # הודעה שסוכמה נערכה או נמחקה בזמן העדכון - התוצאה כבר לא תואמת
+        if conversation.summary_position != job.start or len(conversation.messages) < job.end:
+            logger.info("Dropping outdated summary of '%s'", conversation.name)
+            return
+        conversation.set_summary(job.parts[0], job.end)
+        logger.info("Summary of '%s' now covers %s messages", conversation.name, job.end)
+        if job.end < job.target:
+            self.update(conversation, job.model, job.options, job.target)
+        self.summary_updated.emit(conversation)
+
+    def job_for(self, request):
+        job = self.jobs.get(id(request.conversation))
+        return job if job is not None and job.request is request else None
+
+    def handle_response(self, request, response):
+        job = self.job_for(request)
+        if job is not None:
+            job.response = response.strip()
+
+    def handle_error(self, request, error):
+        job = self.job_for(request)
+        if job is not None:
+            logger.warning("Summary request for '%s' failed: %s", request.conversation.name, error)
+
+    def handle_finished(self, request):
+        job = self.job_for(request)
+        if job is None:
+            return
+        if not job.response:
+            # שגיאה, ביטול או בקשה שהוסרה מהתור - העדכון יתחיל מחדש בפעם הבאה
+            del self.jobs[id(job.conversation)]
+            self.failed.emit(job.conversation, "The model did not return a summary")
+            return
+        if job.reducing:
+            job.parts[:job.reducing] = [job.response]
+            job.reducing = 0
+        else:
+            job.parts.append(job.response)
+        self.advance(job)
+
+    def cancel(self, conversation):
+        job = self.jobs.pop(id(conversation), None)
+        if job is not None and job.request is not None:
+            self.scheduler.cancel_request(job.request)
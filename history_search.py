@@ -0,0 +1,157 @@
+import sqlite3
+import logging
+import threading
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtWidgets import QListWidget, QListWidgetItem
+
+logger = logging.getLogger('AIChat.history_search')
+
+SEARCH_DEBOUNCE_MS = 200
+SEARCH_BATCH_SIZE = 25
+SEARCH_RESULT_LIMIT = 200
+
+_STOP = object()
+
+
+class HistorySearchThread(QThread):
+    """Runs history searches off the UI thread, newest query wins.
+
+    `submit` replaces any query that has not started yet and interrupts the one
+    that is running, so only the latest keystroke's results are delivered.
+    Results arrive in batches through `results_ready(generation, rows)`.
+    """
+
+    results_ready = pyqtSignal(int, list)
+    search_finished = pyqtSignal(int, int)
+
+    def __init__(self, store, batch_size=SEARCH_BATCH_SIZE, limit=SEARCH_RESULT_LIMIT, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.batch_size = batch_size
+        self.limit = limit
+        self.generation = 0
+        self.pending = None
+        self.conn = None
+        self.condition = threading.Condition()
+
+    def submit(self, query, **filters):
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, query, filters)
+            if self.conn is not None:
+                self.conn.interrupt()
+            self.condition.notify()
+            return self.generation
+
+    def cancel(self):
+        with self.condition:
+            self.generation += 1
+            self.pending = None
+            if self.conn is not None:
+                self.conn.interrupt()
+
+    def stop(self, wait_ms=2000):
+        with self.condition:
+            self.pending = _STOP
+            if self.conn is not None:
+                self.conn.interrupt()
+            self.condition.notify()
+        self.wait(wait_ms)
+
+    def run(self):
+        conn = self.store.connect_reader()
+        with self.condition:
+            self.conn = conn
+        try:
+            while True:
+                with self.condition:
+                    while self.pending is None:
+                        self.condition.wait()
+                    job, self.pending = self.pending, None
+                if job is _STOP:
+                    return
+                self.run_search(conn, *job)
+        finally:
+            with self.condition:
+                self.conn = None
+            conn.close()
+
+    def run_search(self, conn, generation, query, filters):
+        batch = []
+        total = 0
+        try:
+            for row in self.store.iter_search(query, limit=self.limit, conn=conn, **filters):
+                if generation != self.generation:
+                    return
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self.results_ready.emit(generation, batch)
+                    total += len(batch)
+                    batch = []
+        except sqlite3.OperationalError as e:
+            if generation != self.generation:
+                # הופסק בגלל הקלדה חדשה - התוצאות כבר לא רלוונטיות
+                return
+            logger.error("History search failed for '%s': %s", query, e)
+        if batch and generation == self.generation:
+            self.results_ready.emit(generation, batch)
+            total += len(batch)
+        if generation == self.generation:
+            self.search_finished.emit(generation, total)
+
+
+class SearchResultsPanel(QListWidget):
+    """Non-modal list of search hits; activating one emits `message_selected(conversation_id, position)`."""
+
+    message_selected = pyqtSignal(int, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("searchResults")
+        self.generation = None
+        self.conversation_names = {}
+        self.started = False
+        self.setVisible(False)
+        self.itemClicked.connect(self.select_item)
+        self.itemActivated.connect(self.select_item)
+
+    def begin(self, generation, conversation_names):
+        self.generation = generation
+        self.conversation_names = conversation_names
+        self.started = False
+
+    def add_results(self, generation, rows):
+        if generation != self.generation:
+            return
+        if not self.started:
+            self.clear()
+            self.started = True
+        for conversation_id, position, text, is_user, model, timestamp in rows:
+            snippet = " ".join(text.split())
+            name = self.conversation_names.get(conversation_id, "")
+            item = QListWidgetItem(f"{name}: {snippet[:80]}")
+            item.setToolTip(f"{timestamp} · {'👤' if is_user else model or 'AI'}\n{text[:500]}")
+            item.setData(Qt.UserRole, (conversation_id, position))
+            self.addItem(item)
+        self.setVisible(True)
+
+    def finish(self, generation, total):
+        if generation != self.generation:
+            return
+        if total == 0:
+            self.clear()
+            item = QListWidgetItem("No results")
+            item.setFlags(Qt.NoItemFlags)
+            self.addItem(item)
+            self.setVisible(True)
+
+    def clear_results(self):
+        self.generation = None
+        self.clear()
+        self.setVisible(False)
+
+    def select_item(self, item):
+        target = item.data(Qt.UserRole)
+        if target is not None:
+            self.message_selected.emit(*target)
+
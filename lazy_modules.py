@@ -0,0 +1,120 @@
+"""Deferred imports for the optional, slow-loading subsystems.
+
+Voice input, text-to-speech, charts, resource monitoring and the numeric
+analysis are only needed once the user opens the matching feature, so they are
+imported on first attribute access instead of at startup. `IdlePrewarmer`
+can load the heavy ones in the background of an idle event loop after the
+window is shown, so the first click does not pay the import cost either.
+"""
+import time
+import logging
+import importlib
+import threading
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+logger = logging.getLogger('AIChat.lazy_modules')
+
+PREWARM_DELAY_MS = 1500
+PREWARM_INTERVAL_MS = 200
+
+_modules = {}
+
+
+class LazyModule:
+    """Module proxy that imports `name` the first time one of its attributes is used."""
+
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+        self.import_seconds = None
+        self.lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.module is not None
+
+    def load(self):
+        if self.module is None:
+            with self.lock:
+                if self.module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self.name)
+                    self.import_seconds = time.perf_counter() - started
+                    self.module = module
+                    logger.debug("Imported %s in %.0f ms", self.name, self.import_seconds * 1000)
+        return self.module
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+    def __repr__(self):
+        return f"<LazyModule {self.name} ({'loaded' if self.loaded else 'not loaded'})>"
+
+
+def lazy_import(name):
+    module = _modules.get(name)
+    if module is None:
+        module = _modules[name] = LazyModule(name)
+    return module
+
+
+def import_times():
+    """Import time in seconds of every lazy module that has been loaded so far."""
+    return {name: module.import_seconds for name, module in _modules.items() if module.loaded}
+
+
+sr = lazy_import("speech_recognition")
+vosk = lazy_import("vosk")
+gtts = lazy_import("gtts")
+pyttsx3 = lazy_import("pyttsx3")
+pygame = lazy_import("pygame")
+pyaudio = lazy_import("pyaudio")
+psutil = lazy_import("psutil")
+qdarkstyle = lazy_import("qdarkstyle")
+QtChart = lazy_import("PyQt5.QtChart")
+np = lazy_import("numpy")
+
+# מודולים שכדאי לטעון מראש כשהאפליקציה פנויה (הכבדים ביותר)
+PREWARM_MODULES = (pygame, gtts, sr, QtChart)
+
+
+class IdlePrewarmer(QObject):
+    """Imports lazy modules one per timer tick once the event loop is idle.
+
+    Each import still runs on the UI thread, but only one module is loaded per
+    tick, so input and painting are processed between imports.
+    """
+
+    module_loaded = pyqtSignal(str, float)
+    finished = pyqtSignal()
+
+    def __init__(self, modules=PREWARM_MODULES, interval_ms=PREWARM_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self.queue = [module for module in modules if not module.loaded]
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.load_next)
+
+    def start(self, delay_ms=PREWARM_DELAY_MS):
+        if self.queue:
+            QTimer.singleShot(delay_ms, self.timer.start)
+
+    def stop(self):
+        self.timer.stop()
+        self.queue = []
+
+    def load_next(self):
+        while self.queue:
+            module = self.queue.pop(0)
+            if module.loaded:
+                continue
+            try:
+                module.load()
+                self.module_loaded.emit(module.name, module.import_seconds)
+            except Exception as e:
+                # המודול עדיין ייטען (וידווח על השגיאה) כשהמשתמש יפתח את התכונה
+                logger.warning("Pre-warming %s failed: %s", module.name, e)
+            break
+        if not self.queue:
+            self.timer.stop()
+            self.finished.emit()
@@ -0,0 +1,140 @@
+"""Logging for the application: a queue in front of the file and console handlers.
+
+Every module logs to a child of the 'AIChat' logger ('AIChat.request_scheduler',
+'AIChat.ollama_handler', ...). The only handler on 'AIChat' is a QueueHandler.
+It puts records on a queue and returns immediately. A QueueListener thread
+formats the records and writes them to the rotating log file and the console,
+so disk I/O and rotation never run on the GUI thread.
+
+Messages use lazy %-style arguments. A record that is filtered out by level
+is never formatted. One that passes is formatted on the listener thread.
+
+Levels can be set per module at runtime (`set_module_levels`). The file can
+also be written as one JSON object per line (`set_json_format`). Both
+settings can start from the environment:
+
+    AICHAT_LOG_LEVELS="request_scheduler=DEBUG, ollama_handler=WARNING"
+    AICHAT_LOG_FORMAT=json
+"""
+import os
+import json
+import queue
+import atexit
+import logging
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+ROOT_LOGGER = 'AIChat'
+LOG_DIR = 'logs'
+LOG_FILE = os.path.join(LOG_DIR, 'aichat.log')
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 5
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+
+_listener = None
+_file_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and the exception, if any."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DeferredQueueHandler(QueueHandler):
+    # QueueHandler.prepare מעצב את ההודעה ב-thread שכתב אותה; כאן העיצוב נדחה ל-listener
+    def prepare(self, record):
+        return record
+
+
+def get_logger(module):
+    """The logger of one module, e.g. get_logger('request_scheduler') -> 'AIChat.request_scheduler'."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{module}" if module else ROOT_LOGGER)
+
+
+def parse_module_levels(spec):
+    """Parses "module=LEVEL, module=LEVEL" into {module: level}; an empty module name means 'AIChat' itself."""
+    levels = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        module, _, level = item.rpartition("=")
+        level = level.strip().upper()
+        if level not in LOG_LEVELS:
+            raise ValueError(f"Unknown log level: {level}")
+        levels[module.strip()] = level
+    return levels
+
+
+def module_levels():
+    """{module: level name} of every module logger with its own level."""
+    prefix = ROOT_LOGGER + "."
+    return {name[len(prefix):]: logging.getLevelName(logger.level)
+            for name, logger in logging.Logger.manager.loggerDict.items()
+            if name.startswith(prefix) and isinstance(logger, logging.Logger) and logger.level != logging.NOTSET}
+
+
+def set_module_levels(levels):
+    """Sets the given module levels; other modules go back to the level of 'AIChat'."""
+    for module in module_levels():
+        if module not in levels:
+            get_logger(module).setLevel(logging.NOTSET)
+    for module, level in levels.items():
+        get_logger(module).setLevel(level)
+
+
+def set_json_format(enabled):
+    if _file_handler is not None:
+        _file_handler.setFormatter(JsonFormatter() if enabled else logging.Formatter(TEXT_FORMAT))
+
+
+def is_json_format():
+    return isinstance(getattr(_file_handler, "formatter", None), JsonFormatter)
+
+
+def setup_logging(level=logging.DEBUG, console_level=logging.INFO):
+    """Installs the queue handler and starts the listener thread; safe to call more than once."""
+    global _listener, _file_handler
+    logger = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        return logger
+    logger.setLevel(level)
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    _file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                        encoding='utf-8')
+    _file_handler.setLevel(logging.DEBUG)
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(console_level)
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    set_json_format(os.environ.get('AICHAT_LOG_FORMAT', '').lower() == 'json')
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    _listener = QueueListener(log_queue, _file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    try:
+        set_module_levels(parse_module_levels(os.environ.get('AICHAT_LOG_LEVELS', '')))
+    except ValueError as e:
+        logger.warning("Ignoring AICHAT_LOG_LEVELS: %s", e)
+    return logger
+
+
+def shutdown_logging():
+    """Writes out the records still in the queue and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import logging
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from ollama_handler import get_default_backend
+
+logger = logging.getLogger('AIChat.model_registry')
+
+MODEL_CACHE_TTL = 300
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), 'models_cache.json')
+FALLBACK_MODELS = ["Default Model"]
+
+
+class ModelListThread(QThread):
+    models_received = pyqtSignal(list)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend
+
+    def run(self):
+        try:
+            self.models_received.emit(self.backend.list_models())
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+
+
+class ModelRegistry(QObject):
+    """Cached list of installed Ollama models.
+
+    The last known list is read from an on-disk snapshot at startup, so the
+    model selector is filled without waiting for the daemon. `refresh` fetches
+    the list on a background thread once the cache is older than `ttl`, and
+    `models_changed` is emitted only when the list is actually different.
+    """
+
+    models_changed = pyqtSignal(list)
+    refresh_failed = pyqtSignal(str)
+    refresh_finished = pyqtSignal(bool)
+
+    def __init__(self, backend=None, ttl=MODEL_CACHE_TTL, snapshot_path=DEFAULT_SNAPSHOT_PATH, parent=None):
+        super().__init__(parent)
+        self.backend = backend
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.models = []
+        self.fetched_at = 0
+        self.thread = None
+        self.load_snapshot()
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            self.models = list(snapshot.get("models", []))
+            self.fetched_at = snapshot.get("fetched_at", 0)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning("Ignoring unreadable model cache %s: %s", self.snapshot_path, e)
+
+    def save_snapshot(self):
+        temp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"models": self.models, "fetched_at": self.fetched_at}, f, ensure_ascii=False)
+            os.replace(temp_path, self.snapshot_path)
+        except OSError as e:
+            logger.warning("Could not save model cache %s: %s", self.snapshot_path, e)
+
+    def is_stale(self):
+        return time.time() - self.fetched_at >= self.ttl
+
+    def is_refreshing(self):
+        return self.thread is not None
+
+    def refresh(self, force=False):
+        """Starts a background fetch if the cache is stale (or `force`); returns True if one was started."""
+        if self.thread is not None or not (force or self.is_stale()):
+            return False
+        self.thread = ModelListThread(self.backend or get_default_backend())
+        self.thread.models_received.connect(self.handle_models)
+        self.thread.error_occurred.connect(self.handle_error)
+        self.thread.finished.connect(self.thread_finished)
+        self.thread.start()
+        return True
+
+    def handle_models(self, models):
+        self.fetched_at = time.time()
+        changed = models != self.models
+        if changed:
+            logger.info("Ollama models changed: %s", ', '.join(models) or 'none')
+            self.models = models
+            self.models_changed.emit(models)
+        self.save_snapshot()
+        self.refresh_finished.emit(changed)
+
+    def handle_error(self, error):
+        logger.error("Error fetching Ollama models: %s", error)
+        self.refresh_failed.emit(error)
+
+    def thread_finished(self):
+        self.thread.deleteLater()
+        self.thread = None
+
+    def wait(self, wait_ms=2000):
+        if self.thread is not None:
+            self.thread.wait(wait_ms)
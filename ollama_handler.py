@@ -1,34 +1,513 @@
 from PyQt5.QtCore import QThread, pyqtSignal
 import subprocess
 import json
+import os
+import time
+import threading
+import logging
+import http.client
+import codecs
+import socket
+import re
+from urllib.parse import urlsplit
+
+logger = logging.getLogger('AIChat.ollama_handler')
+
+DEFAULT_OLLAMA_HOST = "http://127.0.0.1:11434"
+REQUEST_TIMEOUT = 30
+LIST_MODELS_TIMEOUT = 10
+# משך בפורמט של Go ("5m", "1h30m", "-1m"); מספר לבד הוא שניות
+KEEP_ALIVE_RE = re.compile(r"-?(\d+(\.\d+)?(ns|us|µs|ms|s|m|h))+")
+
+
+class OllamaError(Exception):
+    pass
+
+
+class CancelToken:
+    """Cancellation flag shared between the UI thread and a running request.
+
+    Backends register callbacks that abort blocking I/O (closing the socket,
+    killing the child process) so cancel() takes effect immediately.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def add_callback(self, callback):
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+def abort_connection(conn):
+    # shutdown משחרר גם recv שחוסם כרגע ב-thread אחר, בניגוד ל-close
+    sock = conn.sock
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def parse_keep_alive(text):
+    """The keep_alive option for a duration typed by the user: "30m", "-1m" or a number of seconds."""
+    text = text.strip()
+    if re.fullmatch(r"-?\d+", text):
+        return int(text)
+    if not KEEP_ALIVE_RE.fullmatch(text):
+        raise ValueError(f"Invalid keep-alive duration: {text}")
+    return text
+
+
+def resolve_ollama_host(host=None):
+    # OLLAMA_HOST יכול להגיע בצורה "host:port" או "http://host:port"
+    host = host or os.environ.get('OLLAMA_HOST') or DEFAULT_OLLAMA_HOST
+    if "://" not in host:
+        host = f"http://{host}"
+    parts = urlsplit(host)
+    hostname = parts.hostname or "127.0.0.1"
+    if hostname == "0.0.0.0":
+        hostname = "127.0.0.1"
+    return hostname, parts.port or 11434
+
+
+class OllamaHTTPBackend:
+    """Talks to the Ollama HTTP API over a small pool of keep-alive connections."""
+
+    name = "http"
+
+    def __init__(self, host=None, timeout=REQUEST_TIMEOUT, pool_size=4):
+        self.host, self.port = resolve_ollama_host(host)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _acquire(self, timeout=None):
+        timeout = timeout or self.timeout
+        with self._lock:
+            if self._idle:
+                conn = self._idle.pop()
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout), False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _request(self, method, path, payload=None, timeout=None, cancel_token=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        while True:
+            conn, reused = self._acquire(timeout)
+            abort = lambda: abort_connection(conn)
+            if cancel_token is not None:
+                cancel_token.add_callback(abort)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                # חיבור ישן שהשרת סגר - ננסה שוב עם חיבור חדש
+                if reused and not (cancel_token and cancel_token.cancelled):
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            finally:
+                if cancel_token is not None:
+                    cancel_token.remove_callback(abort)
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            if response.status != 200:
+                raise OllamaError(f"Ollama returned HTTP status {response.status}: {data[:200].decode('utf-8', 'replace')}")
+            return json.loads(data) if data else {}
+
+    def _stream(self, path, payload, cancel_token=None):
+        body = json.dumps(payload).encode('utf-8')
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        conn, reused = self._acquire()
+        abort = lambda: abort_connection(conn)
+        if cancel_token is not None:
+            cancel_token.add_callback(abort)
+        final = None
+        try:
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused or (cancel_token and cancel_token.cancelled):
+                    raise
+                conn, reused = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+            if response.status != 200:
+                data = response.read()
+                raise OllamaError(f"Ollama returned HTTP status {response.status}: {data[:200].decode('utf-8', 'replace')}")
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise OllamaError(chunk["error"])
+                if chunk.get("done"):
+                    final = chunk
+                    break
+                yield chunk
+            # קריאת שארית התגובה כדי שהחיבור יוכל לחזור למאגר
+            response.read()
+        except BaseException:
+            conn.close()
+            raise
+        finally:
+            if cancel_token is not None:
+                cancel_token.remove_callback(abort)
+        if response.will_close or (cancel_token and cancel_token.cancelled):
+            conn.close()
+        else:
+            self._release(conn)
+        # השורה האחרונה נמסרת רק אחרי שהחיבור חזר למאגר
+        if final is not None:
+            yield final
+
+    def is_available(self, timeout=1.0):
+        try:
+            self._request("GET", "/api/version", timeout=timeout)
+            return True
+        except (OSError, OllamaError, ValueError):
+            return False
+
+    def list_models(self, timeout=LIST_MODELS_TIMEOUT):
+        data = self._request("GET", "/api/tags", timeout=timeout)
+        return [model["name"] for model in data.get("models", [])]
+
+    def generate(self, model, prompt, cancel_token=None, **options):
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        payload.update(options)
+        return self._request("POST", "/api/generate", payload, cancel_token=cancel_token)
+
+    def chat(self, model, messages, cancel_token=None, **options):
+        payload = {"model": model, "messages": messages, "stream": False}
+        payload.update(options)
+        return self._request("POST", "/api/chat", payload, cancel_token=cancel_token)
+
+    def generate_stream(self, model, prompt, cancel_token=None, **options):
+        payload = {"model": model, "prompt": prompt, "stream": True}
+        payload.update(options)
+        return self._stream("/api/generate", payload, cancel_token)
+
+    def chat_stream(self, model, messages, cancel_token=None, **options):
+        payload = {"model": model, "messages": messages, "stream": True}
+        payload.update(options)
+        return self._stream("/api/chat", payload, cancel_token)
+
+
+class OllamaCLIBackend:
+    """Fallback backend that spawns `ollama run` for each request."""
+
+    name = "cli"
+
+    def __init__(self, timeout=REQUEST_TIMEOUT):
+        self.timeout = timeout
+
+    def is_available(self, timeout=None):
+        return True
+
+    def list_models(self, timeout=LIST_MODELS_TIMEOUT):
+        try:
+            result = subprocess.run(['ollama', 'list'], capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise TimeoutError("ollama list timed out")
+        if result.returncode != 0:
+            raise OllamaError(f"ollama list returned non-zero exit status {result.returncode}")
+        lines = result.stdout.strip().split('\n')[1:]  # Skip the header
+        return [line.split()[0] for line in lines if line.strip()]
+
+    def generate(self, model, prompt, cancel_token=None, **options):
+        # ל-CLI אין תמיכה ב-system/context, לכן ההנחיה מצורפת לפרומפט
+        if options.get("system"):
+            prompt = f"{options['system']}\n\n{prompt}"
+        process = subprocess.Popen(['ollama', 'run', model, prompt], stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, text=True, encoding='utf-8')
+        if cancel_token is not None:
+            cancel_token.add_callback(process.kill)
+        try:
+            stdout, _ = process.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise TimeoutError("ollama run timed out")
+        finally:
+            if cancel_token is not None:
+                cancel_token.remove_callback(process.kill)
+        if process.returncode != 0:
+            raise OllamaError(f"Ollama returned non-zero exit status {process.returncode}")
+        return {"model": model, "response": stdout.strip(), "done": True}
+
+    def generate_stream(self, model, prompt, cancel_token=None, **options):
+        if options.get("system"):
+            prompt = f"{options['system']}\n\n{prompt}"
+        process = subprocess.Popen(['ollama', 'run', model, prompt],
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if cancel_token is not None:
+            cancel_token.add_callback(process.kill)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        deadline = time.monotonic() + self.timeout
+        # os.read חוסם גם כשהתהליך תקוע בלי פלט; ה-watchdog הורג אותו כדי לשחרר אותו
+        watchdog = threading.Timer(self.timeout, process.kill)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            while True:
+                data = os.read(process.stdout.fileno(), 4096)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield {"model": model, "response": text, "done": False}
+            returncode = process.wait(timeout=max(0, deadline - time.monotonic()))
+            if watchdog.finished.is_set():
+                raise TimeoutError("ollama run timed out")
+        except subprocess.TimeoutExpired:
+            raise TimeoutError("ollama run timed out")
+        finally:
+            watchdog.cancel()
+            if cancel_token is not None:
+                cancel_token.remove_callback(process.kill)
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+        if returncode != 0:
+            raise OllamaError(f"Ollama returned non-zero exit status {returncode}")
+        yield {"model": model, "response": decoder.decode(b"", final=True), "done": True}
+
+    def chat(self, model, messages, **options):
+        prompt = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        result = self.generate(model, prompt, **options)
+        return {"model": model, "message": {"role": "assistant", "content": result["response"]}, "done": True}
+
+    def chat_stream(self, model, messages, **options):
+        prompt = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        for chunk in self.generate_stream(model, prompt, **options):
+            yield {"model": model, "message": {"role": "assistant", "content": chunk["response"]}, "done": chunk["done"]}
+
+
+def _is_cancelled(options):
+    cancel_token = options.get("cancel_token")
+    return cancel_token is not None and cancel_token.cancelled
+
+
+class AutoBackend:
+    """Uses the HTTP backend while the daemon is reachable and falls back to the CLI otherwise."""
+
+    name = "auto"
+    RETRY_INTERVAL = 30
+
+    def __init__(self, primary=None, fallback=None):
+        self.primary = primary or OllamaHTTPBackend()
+        self.fallback = fallback or OllamaCLIBackend()
+        self._primary_down_until = 0
+
+    def _call(self, method, *args, **kwargs):
+        if time.monotonic() >= self._primary_down_until:
+            try:
+                return getattr(self.primary, method)(*args, **kwargs)
+            except TimeoutError:
+                raise
+            except OSError as e:
+                # ביטול סוגר את ה-socket; זה לא אומר שה-daemon נפל
+                if _is_cancelled(kwargs):
+                    raise
+                logger.warning("Ollama HTTP API unreachable (%s), falling back to CLI", e)
+                self._primary_down_until = time.monotonic() + self.RETRY_INTERVAL
+        return getattr(self.fallback, method)(*args, **kwargs)
+
+    def is_available(self, timeout=1.0):
+        return self.primary.is_available(timeout) or self.fallback.is_available(timeout)
+
+    def list_models(self, timeout=LIST_MODELS_TIMEOUT):
+        return self._call("list_models", timeout=timeout)
+
+    def generate(self, model, prompt, **options):
+        return self._call("generate", model, prompt, **options)
+
+    def chat(self, model, messages, **options):
+        return self._call("chat", model, messages, **options)
+
+    def _call_stream(self, method, *args, **kwargs):
+        if time.monotonic() >= self._primary_down_until:
+            stream = getattr(self.primary, method)(*args, **kwargs)
+            try:
+                # אפשר לעבור ל-CLI רק לפני שהתקבל הטוקן הראשון
+                first = next(stream)
+            except StopIteration:
+                return
+            except TimeoutError:
+                raise
+            except OSError as e:
+                if _is_cancelled(kwargs):
+                    return
+                logger.warning("Ollama HTTP API unreachable (%s), falling back to CLI", e)
+                self._primary_down_until = time.monotonic() + self.RETRY_INTERVAL
+            else:
+                yield first
+                yield from stream
+                return
+        yield from getattr(self.fallback, method)(*args, **kwargs)
+
+    def generate_stream(self, model, prompt, **options):
+        return self._call_stream("generate_stream", model, prompt, **options)
+
+    def chat_stream(self, model, messages, **options):
+        return self._call_stream("chat_stream", model, messages, **options)
+
+
+_default_backend = None
+
+
+def create_backend(kind=None, host=None):
+    kind = (kind or os.environ.get('OLLAMA_BACKEND') or "auto").lower()
+    if kind == "http":
+        return OllamaHTTPBackend(host)
+    if kind == "cli":
+        return OllamaCLIBackend()
+    return AutoBackend(OllamaHTTPBackend(host), OllamaCLIBackend())
+
+
+def get_default_backend():
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = create_backend()
+    return _default_backend
+
+
+def set_default_backend(backend):
+    global _default_backend
+    _default_backend = backend
+
 
 class OllamaThread(QThread):
     response_received = pyqtSignal(str)
     error_occurred = pyqtSignal(str)
+    token_received = pyqtSignal(str)
+    first_token_received = pyqtSignal(float)
+    response_metadata = pyqtSignal(dict)
+    cancelled = pyqtSignal(str)
 
-    def __init__(self, model, prompt):
+    def __init__(self, model, prompt, backend=None, stream=False, options=None):
         super().__init__()
         self.model = model
         self.prompt = prompt
+        self.backend = backend or get_default_backend()
+        self.stream = stream
+        self.options = options or {}
+        self.time_to_first_token = None
+        self.duration = None
+        self.error_class = None
+        self.cancel_token = CancelToken()
+        self.parts = []
+
+    def cancel(self):
+        self.cancel_token.cancel()
 
     def run(self):
+        started = time.perf_counter()
         try:
-            result = subprocess.run(['ollama', 'run', self.model, self.prompt], 
-                                    capture_output=True, text=True, timeout=30)
-            if result.returncode != 0:
-                self.error_occurred.emit(f"Ollama returned non-zero exit status {result.returncode}")
+            if self.stream:
+                response = self.run_streaming()
             else:
-                self.response_received.emit(result.stdout.strip())
-        except subprocess.TimeoutExpired:
-            self.error_occurred.emit("Error: Ollama response time exceeded the limit.")
+                result = self.backend.generate(self.model, self.prompt, cancel_token=self.cancel_token, **self.options)
+                response = result.pop("response", "")
+                self.response_metadata.emit(result)
+            if self.cancel_token.cancelled:
+                self.cancelled.emit("".join(self.parts))
+            else:
+                self.response_received.emit(response.strip())
         except Exception as e:
-            self.error_occurred.emit(f"Error getting response from Ollama: {str(e)}")
+            if self.cancel_token.cancelled:
+                # סגירת החיבור / הריגת התהליך מפילה את הקריאה - זה צפוי
+                self.cancelled.emit("".join(self.parts))
+                return
+            self.error_class = type(e).__name__
+            if isinstance(e, TimeoutError):
+                self.error_occurred.emit("Error: Ollama response time exceeded the limit.")
+            elif isinstance(e, OllamaError):
+                self.error_occurred.emit(str(e))
+            else:
+                self.error_occurred.emit(f"Error getting response from Ollama: {str(e)}")
+        finally:
+            self.duration = time.perf_counter() - started
+
+    def run_streaming(self):
+        started = time.perf_counter()
+        chunk = {}
+        for chunk in self.backend.generate_stream(self.model, self.prompt, cancel_token=self.cancel_token,
+                                                  **self.options):
+            text = chunk.get("response", "")
+            if not text:
+                if chunk.get("done"):
+                    break
+                continue
+            if self.time_to_first_token is None:
+                self.time_to_first_token = time.perf_counter() - started
+                logger.debug("Time to first token (%s): %.3fs", self.model, self.time_to_first_token)
+                self.first_token_received.emit(self.time_to_first_token)
+            self.parts.append(text)
+            self.token_received.emit(text)
+            if chunk.get("done"):
+                break
+        if chunk.get("done"):
+            # השורה האחרונה מכילה את ה-context ואת מוני הטוקנים
+            chunk = dict(chunk)
+            chunk.pop("response", None)
+            self.response_metadata.emit(chunk)
+        return "".join(self.parts)
 
-def get_available_models():
+def get_available_models(backend=None):
+    """Blocking model lookup; the UI uses model_registry.ModelRegistry instead."""
     try:
-        result = subprocess.run(['ollama', 'list'], capture_output=True, text=True)
-        models = result.stdout.strip().split('\n')[1:]  # Skip the header
-        return [model.split()[0] for model in models]
+        return (backend or get_default_backend()).list_models()
     except Exception as e:
-        print(f"Error fetching Ollama models: {e}")
+        logger.error("Error fetching Ollama models: %s", e)
         return ["Default Model"]
@@ -0,0 +1,147 @@
+"""A tiny stand-in for the Ollama HTTP API, used to exercise the backends offline.
+
+Run it directly (`python ollama_stub_server.py --port 11435`) and point the app at it
+with OLLAMA_HOST=127.0.0.1:11435, or start it in-process with `start_stub_server()`.
+"""
+import json
+import socket
+import threading
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_MODELS = ["stub-model:latest", "stub-coder:7b"]
+
+
+def default_reply(prompt):
+    return f"Stub reply to: {prompt[-200:]}"
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # כותרות וגוף נכתבים בנפרד - בלי NODELAY כל בקשה נתקעת על delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.stats_lock:
+            self.server.stats["connections"] += 1
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self._send_json({"version": "0.0.0-stub"})
+        elif self.path == "/api/tags":
+            self._send_json({"models": [{"name": name, "model": name} for name in self.server.models]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        payload = self._read_json()
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+        if self.path == "/api/generate":
+            text = self.server.reply(payload.get("prompt", ""))
+            self._respond(payload, text, lambda chunk: {"response": chunk})
+        elif self.path == "/api/chat":
+            messages = payload.get("messages", [])
+            text = self.server.reply(messages[-1]["content"] if messages else "")
+            self._respond(payload, text, lambda chunk: {"message": {"role": "assistant", "content": chunk}})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def _respond(self, payload, text, wrap):
+        words = text.split(" ")
+        chunks = [w if i == 0 else " " + w for i, w in enumerate(words)]
+        if "messages" in payload:
+            prompt = " ".join(m.get("content", "") for m in payload["messages"])
+        else:
+            prompt = f"{payload.get('system', '')} {payload.get('prompt', '')}"
+        # כמו במודל אמיתי: רק טוקנים שאינם כבר ב-context עוברים הערכה
+        prompt_tokens = len(prompt.split())
+        context = list(payload.get("context") or [])
+        context.extend(range(len(context), len(context) + prompt_tokens + len(chunks)))
+        final = {"model": payload.get("model"), "done": True, "context": context,
+                 "prompt_eval_count": prompt_tokens, "eval_count": len(chunks)}
+        time.sleep(self.server.prompt_eval_delay * prompt_tokens)
+        if not payload.get("stream", True):
+            time.sleep(self.server.token_delay * len(chunks))
+            final.update(wrap(text))
+            self._send_json(final)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                time.sleep(self.server.token_delay)
+                line = dict(wrap(chunk), model=payload.get("model"), done=False)
+                self._write_chunk(json.dumps(line) + "\n")
+            final.update(wrap(""))
+            self._write_chunk(json.dumps(final) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # הלקוח סגר את החיבור - כמו Ollama, מפסיקים לייצר
+            with self.server.stats_lock:
+                self.server.stats["aborted"] += 1
+            self.close_connection = True
+
+    def _write_chunk(self, data):
+        data = data.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class StubOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), reply=None, token_delay=0.0, prompt_eval_delay=0.0, models=None):
+        super().__init__(address, StubOllamaHandler)
+        self.reply = reply or default_reply
+        self.token_delay = token_delay
+        self.prompt_eval_delay = prompt_eval_delay
+        self.models = list(models or STUB_MODELS)
+        self.stats = {"connections": 0, "requests": 0, "aborted": 0}
+        self.stats_lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_server(port=0, **kwargs):
+    server = StubOllamaServer(("127.0.0.1", port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Ollama HTTP API")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds to wait per generated token")
+    parser.add_argument("--prompt-eval-delay", type=float, default=0.0, help="seconds to wait per evaluated prompt token")
+    args = parser.parse_args()
+    server = StubOllamaServer(("127.0.0.1", args.port), token_delay=args.token_delay,
+                              prompt_eval_delay=args.prompt_eval_delay)
+    print(f"Stub Ollama server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,135 @@
+"""Per-request latency and throughput metrics.
+
+The request scheduler records one entry for every request it ran, when it
+finishes:
+
+- queue wait and time to first token
+- generation time and total latency (from submit to finish)
+- prompt and generated token counts, and tokens per second
+- the model, the request kind and the outcome ("ok", "error" or
+  "cancelled"), with the exception class for errors
+
+Entries are kept in a bounded in-memory ring buffer. They can also be
+appended to a JSON Lines file, one object per line. `summary` aggregates the
+buffer per model into p50/p95/p99 values for the analytics dashboard.
+"""
+import json
+import time
+import datetime
+import logging
+from collections import deque
+
+logger = logging.getLogger('AIChat.request_metrics')
+
+METRICS_BUFFER_SIZE = 1000
+METRICS_FILE = "logs/metrics.jsonl"
+PERCENTILES = (50, 95, 99)
+SUMMARY_FIELDS = ("latency", "ttft", "queue_wait", "tokens_per_second")
+
+
+def percentile(sorted_values, p):
+    # nearest-rank: תמיד ערך שנמדד בפועל
+    index = max(0, -(-len(sorted_values) * p // 100) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def tokens_per_second(metadata, generation_seconds):
+    eval_count = metadata.get("eval_count")
+    if not eval_count:
+        return None
+    # Ollama מודד את זמן היצירה בננו-שניות; בלעדיו - לפי הזמן שמדדנו
+    eval_duration = metadata.get("eval_duration")
+    seconds = eval_duration / 1e9 if eval_duration else generation_seconds
+    return round(eval_count / seconds, 2) if seconds and seconds > 0 else None
+
+
+def request_record(request, finished_at):
+    thread = request.thread
+    if thread.cancel_token.cancelled:
+        status = "cancelled"
+    elif thread.error_class is not None:
+        status = "error"
+    else:
+        status = "ok"
+    ttft = thread.time_to_first_token
+    generation = thread.duration - (ttft or 0) if thread.duration is not None else None
+    return {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "model": request.model,
+        "kind": request.kind,
+        "stream": request.stream,
+        "status": status,
+        "error": thread.error_class,
+        "queue_wait": round(request.started_at - request.submitted_at, 4),
+        "ttft": round(ttft, 4) if ttft is not None else None,
+        "duration": round(thread.duration, 4) if thread.duration is not None else None,
+        "latency": round(finished_at - request.submitted_at, 4),
+        "prompt_tokens": request.metadata.get("prompt_eval_count"),
+        "eval_tokens": request.metadata.get("eval_count"),
+        "tokens_per_second": tokens_per_second(request.metadata, generation),
+    }
+
+
+class RequestMetrics:
+    """Ring buffer of request metrics, optionally mirrored to a JSON Lines file."""
+
+    def __init__(self, size=METRICS_BUFFER_SIZE, path=None):
+        self.records = deque(maxlen=size)
+        self.path = None
+        self.file = None
+        self.set_path(path)
+
+    def set_path(self, path):
+        """Starts appending every new record to `path`; None stops writing to a file."""
+        self.close()
+        self.path = path
+        if path is None:
+            return
+        try:
+            self.file = open(path, "a", encoding="utf-8")
+        except OSError as e:
+            logger.error("Cannot open metrics file %s: %s", path, e)
+            self.path = None
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def record_request(self, request):
+        record = request_record(request, time.perf_counter())
+        self.records.append(record)
+        logger.debug("Request metrics: %s", record)
+        if self.file is not None:
+            try:
+                self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self.file.flush()
+            except OSError as e:
+                logger.error("Cannot write metrics file %s: %s", self.path, e)
+                self.set_path(None)
+        return record
+
+    def summary(self):
+        """{model: {"requests", "errors", "cancelled", field: {p: value}}} over the buffered records.
+
+        Latency, queue wait and tokens/sec percentiles come from successful
+        requests only.
+        """
+        models = {}
+        for record in self.records:
+            entry = models.setdefault(record["model"], {"requests": 0, "errors": 0, "cancelled": 0,
+                                                        "values": {field: [] for field in SUMMARY_FIELDS}})
+            entry["requests"] += 1
+            if record["status"] == "error":
+                entry["errors"] += 1
+            elif record["status"] == "cancelled":
+                entry["cancelled"] += 1
+            else:
+                for field in SUMMARY_FIELDS:
+                    if record[field] is not None:
+                        entry["values"][field].append(record[field])
+        for entry in models.values():
+            for field, values in entry.pop("values").items():
+                values.sort()
+                entry[field] = {p: percentile(values, p) for p in PERCENTILES} if values else None
+        return models
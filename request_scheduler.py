@@ -0,0 +1,191 @@
+import time
+import logging
+from collections import OrderedDict, deque
+from PyQt5.QtCore import QObject, pyqtSignal
+from ollama_handler import OllamaThread
+from request_metrics import RequestMetrics
+
+logger = logging.getLogger('AIChat.request_scheduler')
+
+DEFAULT_MAX_CONCURRENT = 2
+CHAT = "chat"
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 0
+
+
+class ChatRequest:
+    """A single generation request, tied to the conversation that issued it.
+
+    `prepare` is called right before the request starts, so prompts that depend on
+    earlier responses in the same conversation are built from up-to-date history.
+    `kind` tells the window whether the response belongs in the chat; other
+    kinds (such as background analysis) are handled by whoever submitted them.
+    Low-priority requests only get a slot when no normal request is waiting.
+    """
+
+    def __init__(self, conversation, model, prompt=None, options=None, stream=False, prepare=None, kind=CHAT,
+                 priority=PRIORITY_NORMAL):
+        self.conversation = conversation
+        self.model = model
+        self.prompt = prompt
+        self.options = options or {}
+        self.stream = stream
+        self.prepare = prepare
+        self.kind = kind
+        self.priority = priority
+        # בקשות צ'אט ובקשות רקע של אותה שיחה עומדות בתורים נפרדים
+        self.key = (id(conversation), kind)
+        self.metadata = {}
+        self.submitted_at = None
+        self.started_at = None
+        self.metrics_record = None
+        self.thread = None
+        self.streaming_message = None
+
+
+class RequestScheduler(QObject):
+    """Runs ChatRequests on a bounded number of OllamaThreads.
+
+    Requests of one conversation and kind run one at a time in FIFO order;
+    these queues take turns (round-robin) for the free slots, so background
+    work on a conversation never holds up its chat. Queues whose next request
+    has a higher priority go first, and low-priority requests never take the
+    last free slot (unless there is only one), so a chat can always start.
+    Every request that ran is recorded in `metrics` when it finishes.
+    """
+
+    request_started = pyqtSignal(object)
+    token_received = pyqtSignal(object, str)
+    first_token_received = pyqtSignal(object, float)
+    response_received = pyqtSignal(object, str)
+    error_occurred = pyqtSignal(object, str)
+    request_finished = pyqtSignal(object)
+    request_cancelled = pyqtSignal(object, str)
+    request_dropped = pyqtSignal(object)
+
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT, backend=None, metrics=None, parent=None):
+        super().__init__(parent)
+        self.max_concurrent = max_concurrent
+        self.backend = backend
+        self.metrics = metrics or RequestMetrics()
+        self.queues = OrderedDict()
+        self.running = {}
+        self.last_served = {}
+        self.dispatch_counter = 0
+
+    def submit(self, request):
+        request.submitted_at = time.perf_counter()
+        self.queues.setdefault(request.key, deque()).append(request)
+        self.dispatch()
+
+    def set_max_concurrent(self, max_concurrent):
+        self.max_concurrent = max_concurrent
+        self.dispatch()
+
+    def pending_count(self, kind=None):
+        return sum(len(queue) for key, queue in self.queues.items() if kind in (None, key[1]))
+
+    def is_busy(self, kind=None):
+        return any(kind in (None, key[1]) for key in self.running) or self.pending_count(kind) > 0
+
+    def is_conversation_busy(self, conversation, kind=CHAT):
+        if kind is None:
+            return any(key[0] == id(conversation) for key in [*self.queues, *self.running])
+        key = (id(conversation), kind)
+        return key in self.running or bool(self.queues.get(key))
+
+    def drop_queued(self, conversation, kind=CHAT):
+        dropped = list(self.queues.pop((id(conversation), kind), ()))
+        for request in dropped:
+            self.request_dropped.emit(request)
+        return dropped
+
+    def cancel_conversation(self, conversation, kind=CHAT):
+        """Drops the conversation's queued requests of `kind` and cancels its running one.
+
+        With kind=None every kind is cancelled and the conversation's place in
+        the round-robin is forgotten; used when the conversation is deleted.
+        """
+        if kind is None:
+            keys = [key for key in [*self.queues, *self.running, *self.last_served] if key[0] == id(conversation)]
+            # השיחה נמחקת: גם התור שלה בסבב יוצא, כדי שה-id לא יעבור בירושה לשיחה חדשה
+            for key in keys:
+                self.last_served.pop(key, None)
+            return any([self.cancel_conversation(conversation, kind) for kind in {key[1] for key in keys}])
+        dropped = self.drop_queued(conversation, kind)
+        request = self.running.get((id(conversation), kind))
+        if request is not None and request.thread is not None:
+            request.thread.cancel()
+        return request is not None or bool(dropped)
+
+    def cancel_request(self, request):
+        queue = self.queues.get(request.key)
+        if queue is not None and request in queue:
+            queue.remove(request)
+            if not queue:
+                del self.queues[request.key]
+            self.request_dropped.emit(request)
+        elif request.thread is not None:
+            request.thread.cancel()
+
+    def cancel_all(self, wait_ms=0):
+        for key in list(self.queues):
+            for request in self.queues.pop(key):
+                self.request_dropped.emit(request)
+        for request in list(self.running.values()):
+            if request.thread is not None:
+                request.thread.cancel()
+                if wait_ms:
+                    request.thread.wait(wait_ms)
+
+    def dispatch(self):
+        while len(self.running) < self.max_concurrent:
+            request = self.next_request()
+            if request is None:
+                return
+            self.start(request)
+
+    def next_request(self):
+        low_running = sum(1 for request in self.running.values() if request.priority == PRIORITY_LOW)
+        low_allowed = low_running < max(1, self.max_concurrent - 1)
+        candidates = [key for key in self.queues if key not in self.running
+                      and (low_allowed or self.queues[key][0].priority != PRIORITY_LOW)]
+        if not candidates:
+            return None
+        # עדיפות גבוהה קודם; בתוך אותה עדיפות - התור שחיכה הכי הרבה זמן מאז שקיבל שירות
+        key = min(candidates, key=lambda k: (-self.queues[k][0].priority, self.last_served.get(k, -1)))
+        queue = self.queues[key]
+        request = queue.popleft()
+        if not queue:
+            del self.queues[key]
+        self.dispatch_counter += 1
+        self.last_served[key] = self.dispatch_counter
+        return request
+
+    def start(self, request):
+        if request.prepare is not None:
+            request.prompt, request.options = request.prepare()
+        request.started_at = time.perf_counter()
+        self.running[request.key] = request
+        thread = OllamaThread(request.model, request.prompt, backend=self.backend,
+                              stream=request.stream, options=request.options)
+        request.thread = thread
+        thread.token_received.connect(lambda chunk: self.token_received.emit(request, chunk))
+        thread.first_token_received.connect(lambda seconds: self.first_token_received.emit(request, seconds))
+        thread.response_metadata.connect(lambda metadata: request.metadata.update(metadata))
+        thread.response_received.connect(lambda response: self.response_received.emit(request, response))
+        thread.error_occurred.connect(lambda error: self.error_occurred.emit(request, error))
+        thread.cancelled.connect(lambda partial: self.request_cancelled.emit(request, partial))
+        thread.finished.connect(lambda: self.finish(request))
+        logger.debug("Starting request for '%s' with model %s (%s/%s running)", request.conversation.name,
+                     request.model, len(self.running), self.max_concurrent)
+        self.request_started.emit(request)
+        thread.start()
+
+    def finish(self, request):
+        self.running.pop(request.key, None)
+        request.metrics_record = self.metrics.record_request(request)
+        request.thread.deleteLater()
+        request.thread = None
+        self.request_finished.emit(request)
+        self.dispatch()
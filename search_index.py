@@ -0,0 +1,76 @@
+"""Text normalization for the conversation full-text index (Hebrew and English).
+
+The same normalization is applied to indexed text and to queries: niqqud and
+other diacritics are removed, case is folded and Hebrew final letters are
+mapped to their regular form. Hebrew words are also indexed without their
+one-letter prefixes (ו, ה, ב, ל, מ, ש, כ), so a search for "בית" finds "והבית".
+"""
+import re
+import unicodedata
+
+HEBREW_PREFIXES = "ובהלמשכ"
+MAX_PREFIX_LETTERS = 2
+FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+TOKEN_RE = re.compile(r"\w+")
+HEBREW_RE = re.compile(r"[א-ת]")
+# סימנים מצטרפים (ניקוד, טעמים, diacritics) ב-BMP מוסרים ב-translate אחד במקום מעבר תו-תו
+COMBINING_MARKS = dict.fromkeys(cp for cp in range(0x10000) if unicodedata.combining(chr(cp)))
+
+
+def normalize_text(text):
+    decomposed = unicodedata.normalize("NFKD", text)
+    if not decomposed.isascii():
+        decomposed = decomposed.translate(COMBINING_MARKS)
+        if max(decomposed) > "\uffff":
+            decomposed = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return decomposed.casefold().translate(FINAL_LETTERS)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize_text(text))
+
+
+def prefix_variants(token):
+    variants = []
+    for i in range(1, MAX_PREFIX_LETTERS + 1):
+        if len(token) - i < 2 or token[i - 1] not in HEBREW_PREFIXES:
+            break
+        variants.append(token[i:])
+    return variants
+
+
+def index_text(text):
+    """Returns the text as it is stored in the index: normalized tokens plus Hebrew prefix-free variants."""
+    tokens = tokenize(text)
+    extra = [variant for token in tokens if HEBREW_RE.match(token) for variant in prefix_variants(token)]
+    return " ".join(tokens + extra)
+
+
+def build_match_query(query, prefix_last=True):
+    """Turns user input into an FTS5 MATCH expression; all terms must match.
+
+    A term ending with `*` is a prefix query, and so is the last term when
+    `prefix_last` is set (search-as-you-type).
+    """
+    terms = query.split()
+    parts = []
+    for i, term in enumerate(terms):
+        prefix = term.endswith("*") or (prefix_last and i == len(terms) - 1)
+        tokens = tokenize(term)
+        if not tokens:
+            continue
+        phrase = " ".join(tokens)
+        parts.append(f'"{phrase}"*' if prefix else f'"{phrase}"')
+    return " ".join(parts)
+
+
+def matches(text, query, prefix_last=True):
+    """Plain-Python equivalent of the MATCH query, used when SQLite lacks FTS5."""
+    words = set(index_text(text).split())
+    terms = query.split()
+    for i, term in enumerate(terms):
+        prefix = term.endswith("*") or (prefix_last and i == len(terms) - 1)
+        for token in tokenize(term):
+            if not (any(word.startswith(token) for word in words) if prefix else token in words):
+                return False
+    return True
@@ -1,4 +1,10 @@
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton, QCheckBox, QSpinBox,
+                             QLineEdit)
+from text_to_speech import TTS_ENGINES
+from voice_input import VOICE_ENGINES, VOICE_LANGUAGES
+from request_metrics import METRICS_FILE
+from ollama_handler import parse_keep_alive
+from log_config import module_levels, parse_module_levels, set_module_levels, is_json_format, set_json_format
 
 class SettingsDialog(QDialog):
     def __init__(self, parent):
@@ -30,6 +36,99 @@ class SettingsDialog(QDialog):
         theme_layout.addWidget(self.theme_combo)
         layout.addLayout(theme_layout)
 
+        # Streaming
+        streaming_layout = QHBoxLayout()
+        self.streaming_checkbox = QCheckBox("Stream responses")
+        self.streaming_checkbox.setChecked(self.parent.streaming_enabled)
+        self.streaming_checkbox.toggled.connect(self.change_streaming)
+        streaming_layout.addWidget(self.streaming_checkbox)
+        streaming_layout.addWidget(QLabel("Max FPS:"))
+        self.fps_spin = QSpinBox()
+        self.fps_spin.setRange(1, 120)
+        self.fps_spin.setValue(self.parent.stream_max_fps)
+        self.fps_spin.valueChanged.connect(self.change_stream_fps)
+        streaming_layout.addWidget(self.fps_spin)
+        layout.addLayout(streaming_layout)
+
+        # Context budget
+        context_layout = QHBoxLayout()
+        context_layout.addWidget(QLabel("Context budget (tokens):"))
+        self.context_spin = QSpinBox()
+        self.context_spin.setRange(256, 131072)
+        self.context_spin.setSingleStep(256)
+        self.context_spin.setValue(self.parent.context_token_budget)
+        self.context_spin.valueChanged.connect(self.parent.change_context_budget)
+        context_layout.addWidget(self.context_spin)
+        layout.addLayout(context_layout)
+
+        # Keep model loaded between turns
+        keep_alive_layout = QHBoxLayout()
+        keep_alive_layout.addWidget(QLabel("Keep model loaded:"))
+        self.keep_alive_combo = QComboBox()
+        self.keep_alive_combo.setEditable(True)
+        self.keep_alive_combo.addItems(["5m", "30m", "1h", "-1m"])
+        self.keep_alive_combo.setCurrentText(str(self.parent.keep_alive))
+        # רק בבחירה או בסיום העריכה, לא בכל הקשה
+        self.keep_alive_combo.activated.connect(self.change_keep_alive)
+        self.keep_alive_combo.lineEdit().editingFinished.connect(self.change_keep_alive)
+        keep_alive_layout.addWidget(self.keep_alive_combo)
+        layout.addLayout(keep_alive_layout)
+
+        # Parallel generations
+        concurrency_layout = QHBoxLayout()
+        concurrency_layout.addWidget(QLabel("Parallel requests:"))
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 8)
+        self.concurrency_spin.setValue(self.parent.max_concurrent_requests)
+        self.concurrency_spin.valueChanged.connect(self.parent.change_max_concurrent_requests)
+        concurrency_layout.addWidget(self.concurrency_spin)
+        layout.addLayout(concurrency_layout)
+
+        # Request metrics file
+        self.metrics_checkbox = QCheckBox(f"Write request metrics to {METRICS_FILE}")
+        self.metrics_checkbox.setChecked(self.parent.request_scheduler.metrics.path is not None)
+        self.metrics_checkbox.toggled.connect(self.change_metrics_file)
+        layout.addWidget(self.metrics_checkbox)
+
+        # Logging
+        log_layout = QHBoxLayout()
+        log_layout.addWidget(QLabel("Log levels:"))
+        self.log_levels_edit = QLineEdit(", ".join(f"{module}={level}" for module, level in module_levels().items()))
+        self.log_levels_edit.setPlaceholderText("request_scheduler=DEBUG, ollama_handler=WARNING")
+        self.log_levels_edit.editingFinished.connect(self.change_log_levels)
+        log_layout.addWidget(self.log_levels_edit)
+        self.json_log_checkbox = QCheckBox("JSON log file")
+        self.json_log_checkbox.setChecked(is_json_format())
+        self.json_log_checkbox.toggled.connect(set_json_format)
+        log_layout.addWidget(self.json_log_checkbox)
+        layout.addLayout(log_layout)
+
+        # Text-to-speech engine
+        tts_layout = QHBoxLayout()
+        tts_layout.addWidget(QLabel("Speech engine:"))
+        self.tts_combo = QComboBox()
+        self.tts_combo.addItems(TTS_ENGINES.keys())
+        self.tts_combo.setCurrentText(self.parent.text_to_speech.engine_name)
+        self.tts_combo.currentTextChanged.connect(self.parent.text_to_speech.set_engine)
+        tts_layout.addWidget(self.tts_combo)
+        layout.addLayout(tts_layout)
+
+        # Voice input
+        voice_layout = QHBoxLayout()
+        voice_layout.addWidget(QLabel("Voice input:"))
+        self.voice_engine_combo = QComboBox()
+        self.voice_engine_combo.addItems(VOICE_ENGINES.keys())
+        self.voice_engine_combo.setCurrentText(self.parent.voice_input.engine_name)
+        self.voice_engine_combo.currentTextChanged.connect(self.parent.voice_input.set_engine)
+        voice_layout.addWidget(self.voice_engine_combo)
+        self.voice_language_combo = QComboBox()
+        self.voice_language_combo.setEditable(True)
+        self.voice_language_combo.addItems(VOICE_LANGUAGES)
+        self.voice_language_combo.setCurrentText(self.parent.voice_input.language)
+        self.voice_language_combo.currentTextChanged.connect(self.parent.voice_input.set_language)
+        voice_layout.addWidget(self.voice_language_combo)
+        layout.addLayout(voice_layout)
+
         # Plugin settings
         for plugin in self.parent.plugins:
             plugin_widget = plugin.get_settings_widget()
@@ -46,3 +145,27 @@ class SettingsDialog(QDialog):
 
     def change_theme(self, theme):
         self.parent.change_theme(theme)
+
+    def change_streaming(self, enabled):
+        self.parent.streaming_enabled = enabled
+
+    def change_stream_fps(self, fps):
+        self.parent.stream_max_fps = fps
+        for chat_model in self.parent.chat_models.values():
+            chat_model.set_max_fps(fps)
+
+    def change_keep_alive(self):
+        try:
+            self.parent.keep_alive = parse_keep_alive(self.keep_alive_combo.currentText())
+        except ValueError as e:
+            self.parent.statusBar().showMessage(str(e))
+            self.keep_alive_combo.setCurrentText(str(self.parent.keep_alive))
+
+    def change_metrics_file(self, enabled):
+        self.parent.request_scheduler.metrics.set_path(METRICS_FILE if enabled else None)
+
+    def change_log_levels(self):
+        try:
+            set_module_levels(parse_module_levels(self.log_levels_edit.text()))
+        except ValueError as e:
+            self.parent.statusBar().showMessage(str(e))
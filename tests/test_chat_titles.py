@@ -0,0 +1,29 @@
+import unittest
+
+from chat_titles import parse_batch_titles, parse_titles, is_untitled
+
+
+class ParseTitlesTest(unittest.TestCase):
+    def test_batch_titles_are_matched_by_number(self):
+        response = "1: Python packaging\n[3] - Trip to Eilat\n2. \"Budget review\"\n"
+        self.assertEqual(parse_batch_titles(response, 3),
+                         {0: "Python packaging", 1: "Budget review", 2: "Trip to Eilat"})
+
+    def test_batch_titles_ignore_chatter_and_numbers_out_of_range(self):
+        response = "Here are the titles:\n1: First\n4: Too far\n0: Zero\n1: Duplicate"
+        self.assertEqual(parse_batch_titles(response, 3), {0: "First"})
+
+    def test_missing_titles_are_left_out(self):
+        self.assertEqual(parse_batch_titles("2: Only the second", 3), {1: "Only the second"})
+
+    def test_suggestions_drop_list_markers_and_quotes(self):
+        self.assertEqual(parse_titles("1. \"Alpha\"\n- Beta\n\n* Gamma\nDelta", 3), ["Alpha", "Beta", "Gamma"])
+
+    def test_default_names_are_untitled(self):
+        self.assertTrue(is_untitled("שיחה חדשה 12 💬"))
+        self.assertTrue(is_untitled("Imported Chat"))
+        self.assertFalse(is_untitled("Trip planning"))
+
+
+if __name__ == "__main__":
+    unittest.main()
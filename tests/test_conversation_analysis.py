@@ -0,0 +1,27 @@
+import unittest
+
+from conversation_analysis import extract_topics
+
+
+class ExtractTopicsTest(unittest.TestCase):
+    def test_terms_shared_by_every_conversation_rank_last(self):
+        topics = extract_topics({
+            1: {"question": 3, "python": 3, "pandas": 3},
+            2: {"question": 2, "recipe": 2},
+        }, top_n=2)
+        self.assertEqual(topics, {1: ["python", "pandas"], 2: ["recipe", "question"]})
+
+    def test_top_n_limits_each_conversation(self):
+        topics = extract_topics({1: {"a": 3, "b": 2, "c": 1}}, top_n=2)
+        self.assertEqual(topics, {1: ["a", "b"]})
+
+    def test_conversations_without_terms(self):
+        self.assertEqual(extract_topics({1: {}, 2: {"solo": 1}}), {1: [], 2: ["solo"]})
+        self.assertEqual(extract_topics({}), {})
+
+    def test_hebrew_terms_get_their_final_letter_back(self):
+        self.assertEqual(extract_topics({1: {"שלומ": 2}}), {1: ["שלום"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
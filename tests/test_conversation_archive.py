@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from conversation import Conversation
+from conversation_store import ConversationStore
+from conversation_archive import ExportThread, ImportThread
+
+MESSAGES = [
+    ("שלום, מה שלומך?", True, None, 4, "2026-01-01 10:00:00"),
+    ("Fine, thanks!\nA second line with \"quotes\".", False, "llama3:8b", 9, "2026-01-01 10:00:05"),
+]
+
+
+class ArchiveRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.source = ConversationStore(os.path.join(self.tempdir.name, "source.db"))
+        self.target = ConversationStore(os.path.join(self.tempdir.name, "target.db"))
+        self.conversations = []
+        for name, messages in (("First chat", MESSAGES), ("Empty chat", []), ("Second chat", MESSAGES[::-1])):
+            conversation = Conversation.create(name, store=self.source)
+            for text, is_user, model, tokens, timestamp in messages:
+                conversation.add_message(text, is_user, model, tokens, timestamp)
+            self.conversations.append(conversation)
+
+    def tearDown(self):
+        self.source.close()
+        self.target.close()
+        self.tempdir.cleanup()
+
+    def round_trip(self, file_name):
+        path = os.path.join(self.tempdir.name, file_name)
+        results = []
+        export = ExportThread(self.source, self.conversations, path)
+        export.completed.connect(lambda *args: results.append(args))
+        export.failed.connect(self.fail)
+        export.run()
+        imported = []
+        archive_import = ImportThread(self.target, path)
+        archive_import.conversation_imported.connect(lambda conversation_id, name: imported.append(name))
+        archive_import.completed.connect(lambda *args: results.append(args))
+        archive_import.failed.connect(self.fail)
+        archive_import.run()
+        self.target.flush()
+        return results, imported
+
+    def assert_same_conversations(self):
+        rows = self.target.load_conversations()
+        self.assertEqual([name for _, name in rows], [c.name for c in self.conversations])
+        for (conversation_id, _), conversation in zip(rows, self.conversations):
+            self.assertEqual(self.target.load_messages(conversation_id), conversation.messages)
+
+    def test_jsonl_round_trip(self):
+        results, imported = self.round_trip("archive.jsonl")
+        self.assertEqual(results, [(3, 4, []), (3, 4, [])])
+        self.assertEqual(imported, ["First chat", "Empty chat", "Second chat"])
+        self.assert_same_conversations()
+
+    def test_legacy_json_round_trip(self):
+        results, _ = self.round_trip("archive.json")
+        self.assertEqual(results, [(3, 4, []), (3, 4, [])])
+        self.assert_same_conversations()
+
+
+if __name__ == "__main__":
+    unittest.main()
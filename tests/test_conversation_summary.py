@@ -0,0 +1,37 @@
+import unittest
+
+from conversation_summary import chunk_messages
+
+
+def message(text, is_user=True, tokens=10):
+    return (text, is_user, None, tokens, "")
+
+
+class ChunkMessagesTest(unittest.TestCase):
+    def test_chunks_close_once_the_token_budget_is_reached(self):
+        messages = [message(f"m{i}", i % 2 == 0) for i in range(5)]
+        chunks = chunk_messages(messages, 0, 5, chunk_tokens=20)
+        self.assertEqual(chunks, [("User: m0\nAssistant: m1", 2), ("User: m2\nAssistant: m3", 4),
+                                  ("User: m4", 5)])
+
+    def test_only_the_requested_range_is_read(self):
+        messages = [message(f"m{i}") for i in range(6)]
+        chunks = chunk_messages(messages, 2, 4, chunk_tokens=100)
+        self.assertEqual(chunks, [("User: m2\nUser: m3", 4)])
+
+    def test_the_number_of_chunks_is_capped(self):
+        messages = [message(f"m{i}", tokens=50) for i in range(10)]
+        chunks = chunk_messages(messages, 0, 10, chunk_tokens=50, max_chunks=3)
+        self.assertEqual([end for _, end in chunks], [1, 2, 3])
+
+    def test_messages_without_a_count_are_estimated(self):
+        messages = [message("word " * 40, tokens=0), message("short", tokens=0)]
+        chunks = chunk_messages(messages, 0, 2, chunk_tokens=20)
+        self.assertEqual([end for _, end in chunks], [1, 2])
+
+    def test_empty_range(self):
+        self.assertEqual(chunk_messages([message("m")], 1, 1), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
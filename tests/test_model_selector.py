@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import functools
+import importlib.util
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+from conversation_store import ConversationStore
+from model_registry import ModelRegistry
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "X-AI-Chat.py")
+
+
+def load_app_module():
+    spec = importlib.util.spec_from_file_location("x_ai_chat", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class WarmStartModelTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication(sys.argv)
+        # המודול פותח את logs/ בתיקייה הנוכחית כבר בטעינה
+        cls.workdir = tempfile.TemporaryDirectory()
+        cls.cwd = os.getcwd()
+        os.chdir(cls.workdir.name)
+        cls.module = load_app_module()
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        cls.workdir.cleanup()
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.snapshot_path = os.path.join(self.tempdir.name, "models_cache.json")
+        with open(self.snapshot_path, "w", encoding="utf-8") as f:
+            json.dump({"models": ["stub-model:latest", "other:7b"], "fetched_at": time.time()}, f)
+        self.store = ConversationStore(os.path.join(self.tempdir.name, "chats.db"))
+
+    def tearDown(self):
+        self.window.close()
+        self.tempdir.cleanup()
+
+    def test_fresh_snapshot_selects_model(self):
+        registry = functools.partial(ModelRegistry, snapshot_path=self.snapshot_path)
+        original = self.module.ModelRegistry
+        self.module.ModelRegistry = registry
+        try:
+            self.window = self.module.AIChat(self.store)
+        finally:
+            self.module.ModelRegistry = original
+        self.assertIsNone(self.window.model_registry.thread)
+        self.assertEqual(self.window.model_selector.currentText(), "stub-model:latest")
+        self.assertEqual(self.window.current_model, "stub-model:latest")
+
+
+if __name__ == "__main__":
+    unittest.main()
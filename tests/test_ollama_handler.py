@@ -0,0 +1,70 @@
+import http.client
+import unittest
+
+from ollama_handler import AutoBackend, CancelToken, parse_keep_alive
+
+
+class AbortedPrimary:
+    """Behaves like the HTTP backend when the request is cancelled before the first token."""
+
+    def generate(self, model, prompt, cancel_token=None, **options):
+        cancel_token.cancel()
+        raise http.client.RemoteDisconnected("Remote end closed connection without response")
+
+    def generate_stream(self, model, prompt, cancel_token=None, **options):
+        cancel_token.cancel()
+        raise http.client.RemoteDisconnected("Remote end closed connection without response")
+        yield
+
+
+class UnusedFallback:
+    def __init__(self):
+        self.calls = []
+
+    def generate(self, model, prompt, **options):
+        self.calls.append("generate")
+        return {"model": model, "response": "", "done": True}
+
+    def generate_stream(self, model, prompt, **options):
+        self.calls.append("generate_stream")
+        yield {"model": model, "response": "", "done": True}
+
+
+class CancelledBeforeFirstTokenTest(unittest.TestCase):
+    def setUp(self):
+        self.fallback = UnusedFallback()
+        self.backend = AutoBackend(primary=AbortedPrimary(), fallback=self.fallback)
+
+    def test_stream_does_not_fall_back(self):
+        chunks = list(self.backend.generate_stream("model", "prompt", cancel_token=CancelToken()))
+        self.assertEqual(chunks, [])
+        self.assertEqual(self.fallback.calls, [])
+        self.assertEqual(self.backend._primary_down_until, 0)
+
+    def test_generate_does_not_fall_back(self):
+        with self.assertRaises(OSError):
+            self.backend.generate("model", "prompt", cancel_token=CancelToken())
+        self.assertEqual(self.fallback.calls, [])
+        self.assertEqual(self.backend._primary_down_until, 0)
+
+
+
+class ParseKeepAliveTest(unittest.TestCase):
+    def test_durations_are_sent_as_strings(self):
+        self.assertEqual(parse_keep_alive("30m"), "30m")
+        self.assertEqual(parse_keep_alive(" 1h30m "), "1h30m")
+        self.assertEqual(parse_keep_alive("-1m"), "-1m")
+        self.assertEqual(parse_keep_alive("2.5h"), "2.5h")
+
+    def test_plain_numbers_are_seconds(self):
+        self.assertEqual(parse_keep_alive("300"), 300)
+        self.assertEqual(parse_keep_alive("-1"), -1)
+
+    def test_invalid_values_are_rejected(self):
+        for text in ("", "abc", "5 minutes", "-1x", "m5"):
+            with self.assertRaises(ValueError):
+                parse_keep_alive(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
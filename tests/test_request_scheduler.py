@@ -0,0 +1,82 @@
+import unittest
+
+from request_scheduler import RequestScheduler, ChatRequest, CHAT, PRIORITY_LOW, PRIORITY_NORMAL
+
+
+class FakeConversation:
+    def __init__(self, name):
+        self.name = name
+
+
+def request(conversation, kind=CHAT, priority=PRIORITY_NORMAL, prompt=None):
+    return ChatRequest(conversation, "model", prompt, kind=kind, priority=priority)
+
+
+class NextRequestTest(unittest.TestCase):
+    def setUp(self):
+        # בלי מקומות פנויים submit רק מכניס לתור, והסדר נבדק דרך next_request
+        self.scheduler = RequestScheduler(max_concurrent=0)
+        self.a = FakeConversation("a")
+        self.b = FakeConversation("b")
+
+    def submit(self, *requests):
+        for item in requests:
+            self.scheduler.submit(item)
+        return requests
+
+    def drain(self):
+        order = []
+        while True:
+            item = self.scheduler.next_request()
+            if item is None:
+                return order
+            order.append(item)
+
+    def test_requests_of_one_conversation_run_in_order(self):
+        first, second, third = self.submit(request(self.a, prompt="1"), request(self.a, prompt="2"),
+                                           request(self.a, prompt="3"))
+        self.assertEqual(self.drain(), [first, second, third])
+
+    def test_conversations_take_turns(self):
+        a1, a2, b1, b2 = self.submit(request(self.a), request(self.a), request(self.b), request(self.b))
+        self.assertEqual(self.drain(), [a1, b1, a2, b2])
+
+    def test_normal_priority_goes_before_low(self):
+        low, normal = self.submit(request(self.a, kind="title", priority=PRIORITY_LOW), request(self.b))
+        self.assertEqual(self.drain(), [normal, low])
+
+    def test_low_priority_never_takes_the_last_slot(self):
+        running = request(self.b, kind="summary", priority=PRIORITY_LOW)
+        self.scheduler.running[running.key] = running
+        low, = self.submit(request(self.a, kind="title", priority=PRIORITY_LOW))
+        # next_request בלבד, בלי dispatch שמפעיל thread
+        self.scheduler.max_concurrent = 2
+        self.assertIsNone(self.scheduler.next_request())
+        self.scheduler.max_concurrent = 0
+        normal, = self.submit(request(self.a))
+        self.scheduler.max_concurrent = 2
+        self.assertIs(self.scheduler.next_request(), normal)
+        del self.scheduler.running[running.key]
+        self.assertIs(self.scheduler.next_request(), low)
+
+    def test_running_queue_waits_for_its_request(self):
+        a1, a2 = self.submit(request(self.a), request(self.a))
+        self.assertIs(self.scheduler.next_request(), a1)
+        self.scheduler.running[a1.key] = a1
+        self.assertIsNone(self.scheduler.next_request())
+
+    def test_cancel_conversation_drops_every_kind(self):
+        dropped = []
+        self.scheduler.request_dropped.connect(dropped.append)
+        chat, title, other = self.submit(request(self.a), request(self.a, kind="title", priority=PRIORITY_LOW),
+                                         request(self.b))
+        self.assertIs(self.scheduler.next_request(), chat)
+        self.assertTrue(self.scheduler.cancel_conversation(self.a, None))
+        self.assertEqual(dropped, [title])
+        self.assertFalse(self.scheduler.is_conversation_busy(self.a, None))
+        self.assertNotIn(id(self.a), [key[0] for key in self.scheduler.last_served])
+        self.assertEqual(self.drain(), [other])
+
+
+if __name__ == "__main__":
+    unittest.main()
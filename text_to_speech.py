@@ -0,0 +1,360 @@
+"""Text-to-speech that never blocks the UI thread.
+
+Messages are split into sentence-sized chunks and synthesized one by one on a
+background thread, so playback starts as soon as the first chunk is ready.
+Synthesized audio is kept in a content-addressed cache on disk, keyed by
+(engine, language, text) and trimmed to a size limit, least recently used
+first. Playback goes through a queue that is polled by a QTimer instead of a
+busy-wait loop.
+"""
+import os
+import re
+import queue
+import hashlib
+import logging
+import threading
+from collections import deque
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
+from lazy_modules import gtts, pygame, pyttsx3
+
+logger = logging.getLogger('AIChat.text_to_speech')
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'tts_cache')
+DEFAULT_CACHE_MAX_BYTES = 50 * 1024 * 1024
+MAX_CHUNK_CHARS = 250
+PLAYBACK_POLL_MS = 100
+
+SENTENCE_END_RE = re.compile(r'(?<=[.!?:;])\s+|\n+')
+HEBREW_RE = re.compile(r'[א-ת]')
+
+_STOP = object()
+
+
+class TTSError(Exception):
+    pass
+
+
+class GTTSEngine:
+    """Google Translate TTS (online, MP3)."""
+
+    name = "gtts"
+    suffix = ".mp3"
+    # gTTS עדיין משתמש בקוד הישן של עברית
+    languages = {"he": "iw"}
+
+    def synthesize(self, text, language, path):
+        with open(path, 'wb') as f:
+            gtts.gTTS(text=text, lang=self.languages.get(language, language)).write_to_fp(f)
+
+
+class Pyttsx3Engine:
+    """Offline speech through the system voices (SAPI5, NSSpeechSynthesizer or eSpeak)."""
+
+    name = "pyttsx3"
+    suffix = ".wav"
+
+    def __init__(self):
+        self.engine = None
+
+    def synthesize(self, text, language, path):
+        # pyttsx3 צריך לרוץ תמיד מאותו thread - המנוע נוצר בתוך ה-worker
+        if self.engine is None:
+            self.engine = pyttsx3.init()
+        for voice in self.engine.getProperty('voices'):
+            languages = [str(lang).lower() for lang in (voice.languages or [])]
+            if any(language in lang for lang in languages) or language in voice.id.lower():
+                self.engine.setProperty('voice', voice.id)
+                break
+        self.engine.save_to_file(text, path)
+        self.engine.runAndWait()
+        if not os.path.exists(path):
+            raise TTSError("pyttsx3 did not produce any audio")
+
+
+TTS_ENGINES = {
+    GTTSEngine.name: GTTSEngine,
+    Pyttsx3Engine.name: Pyttsx3Engine,
+}
+DEFAULT_TTS_ENGINE = GTTSEngine.name
+
+
+def detect_language(text):
+    return "he" if HEBREW_RE.search(text) else "en"
+
+
+def split_into_chunks(text, max_chars=MAX_CHUNK_CHARS):
+    """Splits text at sentence ends, merging short sentences up to `max_chars`."""
+    chunks = []
+    current = ""
+    for sentence in SENTENCE_END_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        # המשפט הראשון נשאר לבד כדי שההשמעה תתחיל כמה שיותר מהר
+        if current and len(chunks) > 0 and len(current) + len(sentence) + 1 <= max_chars:
+            current = f"{current} {sentence}"
+        else:
+            if current:
+                chunks.append(current)
+            current = sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class AudioCache:
+    """Directory of synthesized clips named by content hash, trimmed LRU-first to `max_bytes`.
+
+    Recency is the file's modification time, which is refreshed on every hit,
+    so the order survives restarts. Only the synthesis thread uses the cache.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.entries = {}
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith('.tmp'):
+                os.remove(path)
+            elif os.path.isfile(path):
+                self.entries[path] = os.path.getsize(path)
+
+    @staticmethod
+    def key(engine, language, text):
+        return hashlib.sha256(f"{engine}\0{language}\0{text}".encode('utf-8')).hexdigest()
+
+    def path_for(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key, suffix):
+        path = self.path_for(key, suffix)
+        if path not in self.entries:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            del self.entries[path]
+            return None
+        return path
+
+    def put(self, key, suffix, write):
+        """Calls `write(temp_path)` and moves the result into the cache; returns the final path."""
+        path = self.path_for(key, suffix)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.entries[path] = os.path.getsize(path)
+        self.evict(keep=path)
+        return path
+
+    def size(self):
+        return sum(self.entries.values())
+
+    def evict(self, keep=None):
+        total = self.size()
+        if total <= self.max_bytes:
+            return
+        by_age = sorted(self.entries, key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for path in by_age:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                # קובץ שמושמע כרגע נעול ב-Windows; ינוקה בפעם הבאה
+                logger.debug("Could not evict %s: %s", path, e)
+                continue
+            total -= self.entries.pop(path)
+
+
+class SpeechSynthesisThread(QThread):
+    """Synthesizes queued chunks in order; jobs older than the last `cancel` are skipped."""
+
+    chunk_ready = pyqtSignal(int, str)
+    job_failed = pyqtSignal(int, str)
+    job_finished = pyqtSignal(int)
+
+    def __init__(self, engine, cache, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.cache = cache
+        self.jobs = queue.Queue()
+        self.cancelled_through = 0
+
+    def submit(self, job_id, chunks):
+        """Queues `chunks`, a list of (text, language) pairs, for synthesis."""
+        self.jobs.put((job_id, chunks))
+
+    def cancel(self, job_id):
+        self.cancelled_through = max(self.cancelled_through, job_id)
+
+    def set_engine(self, engine):
+        self.jobs.put(engine)
+
+    def stop(self, wait_ms=2000):
+        self.jobs.put(_STOP)
+        self.wait(wait_ms)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is _STOP:
+                return
+            if not isinstance(job, tuple):
+                self.engine = job
+                continue
+            job_id, chunks = job
+            for chunk, language in chunks:
+                if job_id <= self.cancelled_through:
+                    break
+                try:
+                    path = self.synthesize(chunk, language)
+                except Exception as e:
+                    self.job_failed.emit(job_id, str(e))
+                    break
+                if job_id > self.cancelled_through:
+                    self.chunk_ready.emit(job_id, path)
+            self.job_finished.emit(job_id)
+
+    def synthesize(self, text, language):
+        key = AudioCache.key(self.engine.name, language, text)
+        path = self.cache.get(key, self.engine.suffix)
+        if path is None:
+            path = self.cache.put(key, self.engine.suffix,
+                                  lambda temp_path: self.engine.synthesize(text, language, temp_path))
+        return path
+
+
+class TextToSpeech(QObject):
+    """Speaks messages through a background synthesis thread and a playback queue."""
+
+    speaking_changed = pyqtSignal(bool)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, engine=DEFAULT_TTS_ENGINE, cache_dir=DEFAULT_CACHE_DIR,
+                 max_cache_bytes=DEFAULT_CACHE_MAX_BYTES, parent=None):
+        super().__init__(parent)
+        self.engine_name = engine if engine in TTS_ENGINES else DEFAULT_TTS_ENGINE
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.thread = None
+        self.last_job = 0
+        self.pending_jobs = set()
+        self.playlist = deque()
+        self.playing = False
+        self.speaking = False
+        self.mixer_ready = False
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(PLAYBACK_POLL_MS)
+        self.poll_timer.timeout.connect(self.play_next)
+
+    def ensure_thread(self):
+        # ה-thread והמטמון נוצרים רק בשימוש הראשון
+        if self.thread is None:
+            cache = AudioCache(self.cache_dir, self.max_cache_bytes)
+            self.thread = SpeechSynthesisThread(TTS_ENGINES[self.engine_name](), cache, self)
+            self.thread.chunk_ready.connect(self.enqueue_audio)
+            self.thread.job_failed.connect(self.handle_job_failed)
+            self.thread.job_finished.connect(self.handle_job_finished)
+            self.thread.start()
+        return self.thread
+
+    def set_engine(self, name):
+        if name not in TTS_ENGINES or name == self.engine_name:
+            return
+        self.engine_name = name
+        if self.thread is not None:
+            self.thread.set_engine(TTS_ENGINES[name]())
+        logger.info("Text-to-speech engine set to %s", name)
+
+    def speak(self, text, language=None):
+        # השפה מזוהה לכל קטע בנפרד, כך שהודעה בעברית ובאנגלית נקראת נכון
+        chunks = [(chunk, language or detect_language(chunk)) for chunk in split_into_chunks(text)]
+        if not chunks:
+            return None
+        self.last_job += 1
+        self.pending_jobs.add(self.last_job)
+        self.ensure_thread().submit(self.last_job, chunks)
+        self.set_speaking(True)
+        return self.last_job
+
+    def stop(self):
+        if self.thread is not None:
+            self.thread.cancel(self.last_job)
+        self.pending_jobs.clear()
+        self.playlist.clear()
+        if self.mixer_ready:
+            pygame.mixer.music.stop()
+        self.playing = False
+        self.poll_timer.stop()
+        self.set_speaking(False)
+
+    def is_speaking(self):
+        return bool(self.pending_jobs or self.playlist or self.playing)
+
+    def set_speaking(self, speaking):
+        if speaking != self.speaking:
+            self.speaking = speaking
+            self.speaking_changed.emit(speaking)
+
+    def enqueue_audio(self, job_id, path):
+        if job_id not in self.pending_jobs:
+            return
+        self.playlist.append(path)
+        if not self.playing:
+            self.play_next()
+        self.poll_timer.start()
+
+    def handle_job_failed(self, job_id, error):
+        logger.error("Error in text-to-speech: %s", error)
+        self.error_occurred.emit(error)
+
+    def handle_job_finished(self, job_id):
+        self.pending_jobs.discard(job_id)
+        self.update_state()
+
+    def play_next(self):
+        if self.playing and pygame.mixer.music.get_busy():
+            return
+        self.playing = False
+        while self.playlist:
+            path = self.playlist.popleft()
+            try:
+                if not self.mixer_ready:
+                    pygame.mixer.init()
+                    self.mixer_ready = True
+                pygame.mixer.music.load(path)
+                pygame.mixer.music.play()
+                self.playing = True
+                break
+            except Exception as e:
+                logger.error("Could not play %s: %s", path, e)
+                self.error_occurred.emit(str(e))
+        self.update_state()
+
+    def update_state(self):
+        if not self.playing and not self.playlist:
+            self.poll_timer.stop()
+        self.set_speaking(self.is_speaking())
+
+    def shutdown(self, wait_ms=2000):
+        self.stop()
+        if self.thread is not None:
+            self.thread.stop(wait_ms)
+            self.thread = None
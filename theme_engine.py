@@ -0,0 +1,356 @@
+from functools import lru_cache
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+from lazy_modules import qdarkstyle
+
+# פלטות הצבעים של ערכות הנושא
+THEMES = {
+    'Default': {
+        'background': '#1E1E1E',
+        'surface': '#2D2D2D',
+        'primary': '#3700B3',
+        'secondary': '#03DAC6',
+        'on_background': '#E1E1E1',
+        'on_surface': '#FFFFFF',
+        'on_primary': '#FFFFFF',
+        'on_secondary': '#000000',
+        'error': '#CF6679',
+        'success': '#03DAC6',
+        'warning': '#FFAB00',
+    },
+    'Dark': {
+        'background': '#19232D',
+        'surface': '#32414B',
+        'primary': '#1464A0',
+        'secondary': '#148CD2',
+        'on_background': '#F0F0F0',
+        'on_surface': '#FFFFFF',
+        'on_primary': '#FFFFFF',
+        'on_secondary': '#FFFFFF',
+        'error': '#CF6679',
+        'success': '#03DAC6',
+        'warning': '#FFAB00',
+    },
+    'Light': {
+        'background': '#F5F5F5',
+        'surface': '#FFFFFF',
+        'primary': '#6200EE',
+        'secondary': '#03DAC6',
+        'on_background': '#1E1E1E',
+        'on_surface': '#000000',
+        'on_primary': '#FFFFFF',
+        'on_secondary': '#000000',
+        'error': '#B00020',
+        'success': '#018786',
+        'warning': '#FF8F00',
+    },
+}
+
+DEFAULT_THEME = 'Default'
+
+# שמות הערכות כפי שהן מופיעות בדיאלוג ההגדרות בעברית
+THEME_ALIASES = {
+    'ברירת מחדל': 'Default',
+    'כהה': 'Dark',
+    'בהיר': 'Light',
+}
+
+
+def resolve_theme(theme):
+    theme = THEME_ALIASES.get(theme, theme)
+    return theme if theme in THEMES else DEFAULT_THEME
+
+
+def theme_colors(theme):
+    return THEMES[resolve_theme(theme)]
+
+
+@lru_cache(maxsize=16)
+def compile_stylesheet(theme=DEFAULT_THEME, scale=100):
+    """Builds the application stylesheet for a theme and UI scale (in percent).
+
+    Widgets are styled by object name and by the `variant` dynamic property, so
+    the whole UI shares one stylesheet that Qt parses once per theme/scale.
+    """
+    theme = resolve_theme(theme)
+    c = THEMES[theme]
+
+    def px(size):
+        return f"{max(1, round(size * scale / 100))}px"
+
+    sheet = f"""
+        QMainWindow {{
+            background-color: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+                                              stop:0 {c['background']}, stop:1 {c['surface']});
+        }}
+        QWidget {{
+            color: {c['on_background']};
+            font-family: Arial, sans-serif;
+            font-size: {9 * scale / 100:.1f}pt;
+        }}
+        QPushButton {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+            border: none;
+            padding: 8px 16px;
+            border-radius: 4px;
+            font-weight: bold;
+        }}
+        QPushButton:hover {{
+            background-color: {c['secondary']};
+            color: {c['on_secondary']};
+        }}
+        QLineEdit, QTextEdit {{
+            background-color: {c['surface']};
+            border: 1px solid {c['primary']};
+            border-radius: 4px;
+            padding: 4px;
+            color: {c['on_surface']};
+        }}
+        QLabel {{
+            color: {c['on_surface']};
+        }}
+        QMenuBar {{
+            background-color: {c['background']};
+            color: {c['on_background']};
+        }}
+        QMenuBar::item:selected {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+        }}
+        QMenu {{
+            background-color: {c['surface']};
+            color: {c['on_surface']};
+            border: 1px solid {c['primary']};
+        }}
+        QMenu::item:selected {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+        }}
+        QToolBar {{
+            background-color: {c['surface']};
+            border: none;
+            spacing: 10px;
+        }}
+        QToolButton {{
+            background-color: {c['background']};
+            color: {c['on_background']};
+            border-radius: 5px;
+            padding: 5px;
+        }}
+        QToolButton:hover {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+        }}
+
+        #sidebar, #sidebar QWidget {{
+            background-color: {c['background']};
+            border-radius: 10px;
+        }}
+        #sidebar QPushButton {{
+            background-color: {c['surface']};
+            color: {c['on_surface']};
+            border: none;
+            padding: 10px;
+            margin: 5px;
+            border-radius: 5px;
+            font-weight: normal;
+        }}
+        #sidebar QPushButton:hover {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+        }}
+        QPushButton#logoButton {{
+            font-size: {px(48)};
+            background-color: transparent;
+            border: none;
+            margin: 0;
+            color: {c['on_background']};
+        }}
+        QPushButton#logoButton:hover {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+        }}
+        QLabel#appNameLabel {{
+            font-size: {px(24)};
+            font-weight: bold;
+            color: {c['on_background']};
+        }}
+        QLabel#versionLabel {{
+            font-size: {px(12)};
+            color: {c['on_background']};
+        }}
+        QListWidget#conversationList {{
+            background-color: {c['surface']};
+            border: none;
+            border-radius: 5px;
+            padding: 5px;
+        }}
+        QListWidget#conversationList::item {{
+            background-color: {c['background']};
+            color: {c['on_background']};
+            border-radius: 3px;
+            padding: 5px;
+            margin: 2px 0;
+        }}
+        QListWidget#conversationList::item:selected {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+        }}
+        QListWidget#searchResults {{
+            background-color: {c['surface']};
+            color: {c['on_surface']};
+            border: 1px solid {c['primary']};
+            border-radius: 5px;
+            padding: 3px;
+        }}
+        QListWidget#searchResults::item:hover {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+        }}
+        #exportImportBar {{
+            background-color: {c['surface']};
+            border-radius: 5px;
+        }}
+        #exportImportBar QPushButton {{
+            background-color: transparent;
+            border: none;
+            font-size: {px(16)};
+            padding: 5px;
+            margin: 0;
+            color: {c['on_surface']};
+        }}
+        #exportImportBar QPushButton:hover {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+        }}
+
+        #chatArea, #chatArea QWidget {{
+            background-color: {c['background']};
+            border-radius: 10px;
+        }}
+        #chatArea QPushButton[variant="tool"] {{
+            background-color: {c['surface']};
+            color: {c['on_surface']};
+            border: none;
+            padding: 5px;
+            border-radius: 5px;
+            font-size: {px(16)};
+            font-weight: normal;
+        }}
+        #chatArea QPushButton[variant="tool"]:hover {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+        }}
+        QTextEdit#inputField {{
+            background-color: {c['surface']};
+            border: 1px solid {c['primary']};
+            border-radius: 5px;
+            padding: 5px;
+            font-size: {px(14)};
+            color: {c['on_surface']};
+        }}
+        QPushButton[variant="primary"], #chatArea QPushButton[variant="primary"] {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+            border: none;
+            padding: 10px 20px;
+            margin: 0;
+            border-radius: 5px;
+            font-weight: bold;
+        }}
+        #sidebar QPushButton[variant="primary"] {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+            padding: 10px;
+            font-weight: bold;
+        }}
+        QPushButton[variant="primary"]:hover, #chatArea QPushButton[variant="primary"]:hover,
+        #sidebar QPushButton[variant="primary"]:hover {{
+            background-color: {c['secondary']};
+            color: {c['on_secondary']};
+        }}
+        #chatArea QComboBox[variant="instruction"] {{
+            background-color: {c['surface']};
+            color: {c['on_surface']};
+            border: 1px solid {c['primary']};
+            border-radius: 3px;
+            padding: 2px 5px;
+        }}
+        #chatArea QComboBox[variant="instruction"]::drop-down {{
+            subcontrol-origin: padding;
+            subcontrol-position: top right;
+            width: 15px;
+            border-left-width: 1px;
+            border-left-color: {c['primary']};
+            border-left-style: solid;
+        }}
+
+        #footer, #footer QWidget {{
+            background-color: {c['surface']};
+            color: {c['on_surface']};
+            border-top: 1px solid {c['primary']};
+        }}
+        QLabel#clockLabel {{
+            font-size: {px(14)};
+            color: {c['on_background']};
+        }}
+        QLabel#footerLogo {{
+            font-size: {px(24)};
+        }}
+        QPushButton#workstationButton {{
+            font-size: {px(24)};
+            background-color: transparent;
+            border: none;
+            padding: 5px;
+            color: {c['on_background']};
+        }}
+        QPushButton#workstationButton:hover {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+            border-radius: 15px;
+        }}
+        #footer QPushButton#refreshModelsButton {{
+            background-color: {c['primary']};
+            color: {c['on_primary']};
+            border: none;
+            padding: 5px;
+            border-radius: 3px;
+            font-size: {px(16)};
+        }}
+        #footer QPushButton#refreshModelsButton:hover {{
+            background-color: {c['secondary']};
+            color: {c['on_secondary']};
+        }}
+    """
+    if theme == 'Dark':
+        sheet = qdarkstyle.load_stylesheet_pyqt5() + sheet
+    return sheet
+
+
+class ThemeEngine(QObject):
+    """Applies the compiled stylesheet once, at the application level."""
+
+    theme_changed = pyqtSignal(str)
+
+    def __init__(self, theme=DEFAULT_THEME, scale=100, parent=None):
+        super().__init__(parent)
+        self.theme = resolve_theme(theme)
+        self.scale = scale
+        self.applied = None
+
+    @property
+    def colors(self):
+        return THEMES[self.theme]
+
+    def apply(self, theme=None, scale=None):
+        if theme is not None:
+            self.theme = resolve_theme(theme)
+        if scale is not None:
+            self.scale = scale
+        stylesheet = compile_stylesheet(self.theme, self.scale)
+        if stylesheet is self.applied:
+            return
+        QApplication.instance().setStyleSheet(stylesheet)
+        self.applied = stylesheet
+        self.theme_changed.emit(self.theme)
@@ -0,0 +1,101 @@
+"""Token counts for messages, prompts and the context budget.
+
+Ollama reports how many tokens it generated (`eval_count`) with every
+response, and that real count is stored with the assistant's message. All
+other text (the user's messages, pinned instructions, summaries, imported
+history) is counted with a fast approximate tokenizer. It splits text
+roughly the way BPE tokenizers do: Latin words take about one token per five
+letters, numbers one per three digits, and Hebrew, other scripts and
+symbols about one per two characters. A plain word count is off by a factor
+of two or more for Hebrew and code.
+
+Every real count also calibrates the approximation for its model, so
+estimates of the user's messages follow that model's tokenizer. Approximate
+counts are memoized by the text's hash: counting a message again (rebuilding
+a context window, reloading a chat) is a dictionary lookup.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+LATIN_CHARS_PER_TOKEN = 5
+DIGITS_PER_TOKEN = 3
+OTHER_CHARS_PER_TOKEN = 2
+TOKEN_CACHE_SIZE = 65536
+# משקל מדידה חדשה בממוצע הנע של יחס הספירה האמיתית להערכה, לכל מודל
+CALIBRATION_WEIGHT = 0.2
+# בתשובות קצרות מאוד היחס רועש מדי
+MIN_CALIBRATION_TOKENS = 16
+MIN_RATIO, MAX_RATIO = 0.25, 4.0
+
+PIECE_RE = re.compile(r"[A-Za-z]+|\d+|[^\W\d_A-Za-z]+|[^\w\s]+|_+")
+
+
+def approximate_tokens(text):
+    tokens = 0
+    for piece in PIECE_RE.findall(text):
+        first = piece[0]
+        if first.isascii() and first.isalpha():
+            per_token = LATIN_CHARS_PER_TOKEN
+        elif first.isdigit():
+            per_token = DIGITS_PER_TOKEN
+        else:
+            per_token = OTHER_CHARS_PER_TOKEN
+        tokens += -(-len(piece) // per_token)
+    return tokens
+
+
+class TokenCounter:
+    """Approximate token counts, memoized per text hash and calibrated per model.
+
+    Safe to use from worker threads.
+    """
+
+    def __init__(self, cache_size=TOKEN_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.ratios = {}
+        self.lock = threading.Lock()
+
+    def approximate(self, text):
+        # המפתח הוא ה-hash והאורך בלבד, כך שהמטמון לא מחזיק את טקסט ההודעות
+        key = (hash(text), len(text))
+        with self.lock:
+            tokens = self.cache.get(key)
+            if tokens is not None:
+                self.cache.move_to_end(key)
+                return tokens
+        tokens = approximate_tokens(text)
+        with self.lock:
+            self.cache[key] = tokens
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return tokens
+
+    def count(self, text, model=None):
+        """Estimated tokens of `text`, scaled to `model`'s tokenizer once real counts were seen for it."""
+        tokens = self.approximate(text)
+        ratio = self.ratios.get(model)
+        if ratio is None or not tokens:
+            return tokens
+        return max(1, round(tokens * ratio))
+
+    def observe(self, model, text, actual):
+        """Returns the real count of a model's response, or an estimate when the backend did not report one."""
+        if not actual:
+            return self.count(text, model)
+        estimate = self.approximate(text)
+        if estimate >= MIN_CALIBRATION_TOKENS:
+            ratio = min(MAX_RATIO, max(MIN_RATIO, actual / estimate))
+            with self.lock:
+                previous = self.ratios.get(model)
+                self.ratios[model] = ratio if previous is None else \
+                    previous + CALIBRATION_WEIGHT * (ratio - previous)
+        return actual
+
+
+default_counter = TokenCounter()
+
+
+def count_tokens(text, model=None):
+    return default_counter.count(text, model)
@@ -0,0 +1,309 @@
+"""Voice input that records and recognizes speech off the UI thread.
+
+`VoiceInput` runs one `VoiceInputThread` per session. The thread opens an
+audio source (the microphone, or a WAV file for offline checks), calibrates
+for ambient noise only when the cached calibration has expired, and passes
+the audio to a recognizer engine. Engines report partial transcripts while
+the user is speaking (Vosk) or after every phrase (Google, Sphinx), and
+`transcript_changed` always carries the whole transcript so far.
+
+Recognize a recording without a microphone or network:
+
+    python voice_input.py --wav sample.wav --engine vosk
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from lazy_modules import sr, vosk
+
+logger = logging.getLogger('AIChat.voice_input')
+
+LISTEN_TIMEOUT = 10
+PAUSE_TIMEOUT = 3
+PHRASE_TIME_LIMIT = 10
+MAX_SESSION_SECONDS = 120
+CALIBRATION_SECONDS = 1
+CALIBRATION_TTL = 600
+DEFAULT_LANGUAGE = "en-US"
+VOICE_LANGUAGES = ["en-US", "he-IL"]
+
+
+class NoSpeechError(Exception):
+    pass
+
+
+class MicrophoneSource:
+    live = True
+
+    def __init__(self, device_index=None):
+        self.device_index = device_index
+        self.key = f"microphone:{device_index}"
+
+    def open(self):
+        return sr.Microphone(device_index=self.device_index)
+
+
+class WavFileSource:
+    """Reads a recording instead of the microphone; used to check engines offline."""
+
+    live = False
+
+    def __init__(self, path):
+        self.path = path
+        self.key = None
+
+    def open(self):
+        return sr.AudioFile(self.path)
+
+
+class PhraseEngine:
+    """Recognizes one phrase at a time; the transcript grows after each phrase."""
+
+    def transcribe(self, worker, recognizer, source):
+        recognized = False
+        while not worker.stop_requested:
+            try:
+                audio = worker.next_phrase(recognizer, source, PAUSE_TIMEOUT if recognized else LISTEN_TIMEOUT)
+            except sr.WaitTimeoutError:
+                if recognized:
+                    return
+                raise NoSpeechError("No speech detected")
+            if audio is None:
+                break
+            worker.status_changed.emit("Processing speech...")
+            try:
+                text = self.recognize(recognizer, audio, worker.language)
+            except sr.UnknownValueError:
+                continue
+            finally:
+                worker.status_changed.emit("Listening... Speak now.")
+            if text:
+                worker.add_phrase(text)
+                recognized = True
+        if not recognized:
+            raise sr.UnknownValueError()
+
+
+class GoogleEngine(PhraseEngine):
+    name = "google"
+
+    def recognize(self, recognizer, audio, language):
+        return recognizer.recognize_google(audio, language=language)
+
+
+class SphinxEngine(PhraseEngine):
+    """Offline recognition with CMU Sphinx (needs the pocketsphinx package)."""
+
+    name = "sphinx"
+
+    def recognize(self, recognizer, audio, language):
+        return recognizer.recognize_sphinx(audio, language=language)
+
+
+class VoskEngine:
+    """Offline streaming recognition with Vosk; partial words appear while speaking.
+
+    The model is read from VOSK_MODEL_PATH, or Vosk's model for the language is
+    used (and downloaded once) when the variable is not set. Loaded models are
+    kept for the next session.
+    """
+
+    name = "vosk"
+    models = {}
+
+    def load_model(self, language):
+        path = os.environ.get("VOSK_MODEL_PATH")
+        key = path or language.lower()
+        if key not in self.models:
+            vosk.SetLogLevel(-1)
+            self.models[key] = vosk.Model(path) if path else vosk.Model(lang=language.lower())
+        return self.models[key]
+
+    def transcribe(self, worker, recognizer, source):
+        kaldi = vosk.KaldiRecognizer(self.load_model(worker.language), source.SAMPLE_RATE)
+        seconds = 0.0
+        last_speech = None
+        last_partial = ""
+        while not worker.stop_requested and seconds < MAX_SESSION_SECONDS:
+            data = source.stream.read(source.CHUNK)
+            if not data:
+                break
+            seconds += source.CHUNK / source.SAMPLE_RATE
+            if kaldi.AcceptWaveform(data):
+                text = json.loads(kaldi.Result()).get("text", "")
+                if text:
+                    worker.add_phrase(text)
+                    last_speech = seconds
+                last_partial = ""
+            else:
+                partial = json.loads(kaldi.PartialResult()).get("partial", "")
+                if partial and partial != last_partial:
+                    worker.set_partial(partial)
+                    last_speech = seconds
+                last_partial = partial
+            timeout = LISTEN_TIMEOUT if last_speech is None else last_speech + PAUSE_TIMEOUT
+            if seconds >= timeout:
+                break
+        text = json.loads(kaldi.FinalResult()).get("text", "")
+        if text:
+            worker.add_phrase(text)
+        if not worker.phrases:
+            raise NoSpeechError("No speech detected")
+
+
+VOICE_ENGINES = {
+    GoogleEngine.name: GoogleEngine,
+    VoskEngine.name: VoskEngine,
+    SphinxEngine.name: SphinxEngine,
+}
+DEFAULT_VOICE_ENGINE = GoogleEngine.name
+
+
+class VoiceInputThread(QThread):
+    status_changed = pyqtSignal(str)
+    transcript_changed = pyqtSignal(str)
+    calibrated = pyqtSignal(str, float)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, engine, source, language, energy_threshold=None, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.source = source
+        self.language = language
+        self.energy_threshold = energy_threshold
+        self.phrases = []
+        self.stop_requested = False
+
+    def stop(self):
+        self.stop_requested = True
+
+    @property
+    def transcript(self):
+        return " ".join(self.phrases)
+
+    def add_phrase(self, text):
+        self.phrases.append(text)
+        self.transcript_changed.emit(self.transcript)
+
+    def set_partial(self, text):
+        self.transcript_changed.emit(" ".join(self.phrases + [text]))
+
+    def next_phrase(self, recognizer, source, timeout):
+        if self.source.live:
+            return recognizer.listen(source, timeout=timeout, phrase_time_limit=PHRASE_TIME_LIMIT)
+        # בקובץ אין שקט אמיתי להמתין לו - קוראים אותו בחלקים עד הסוף
+        audio = recognizer.record(source, duration=PHRASE_TIME_LIMIT)
+        return audio if audio.frame_data else None
+
+    def run(self):
+        try:
+            recognizer = sr.Recognizer()
+            with self.source.open() as source:
+                if self.source.live:
+                    if self.energy_threshold is None:
+                        self.status_changed.emit("Adjusting for ambient noise...")
+                        recognizer.adjust_for_ambient_noise(source, duration=CALIBRATION_SECONDS)
+                        self.calibrated.emit(self.source.key, recognizer.energy_threshold)
+                    else:
+                        recognizer.energy_threshold = self.energy_threshold
+                self.status_changed.emit("Listening... Speak now.")
+                self.engine.transcribe(self, recognizer, source)
+            logger.info("Speech recognized: %s", self.transcript)
+        except NoSpeechError as e:
+            self.error_occurred.emit(str(e))
+        except sr.UnknownValueError:
+            self.error_occurred.emit("Could not understand audio")
+        except sr.RequestError as e:
+            self.error_occurred.emit(f"Could not request results; {e}")
+        except Exception as e:
+            logger.error("Unexpected error during speech recognition: %s", e)
+            self.error_occurred.emit(f"An unexpected error occurred: {e}")
+
+
+class VoiceInput(QObject):
+    """Starts and stops voice input sessions and caches the microphone calibration."""
+
+    status_changed = pyqtSignal(str)
+    transcript_changed = pyqtSignal(str)
+    listening_changed = pyqtSignal(bool)
+    finished = pyqtSignal(str)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, engine=DEFAULT_VOICE_ENGINE, language=DEFAULT_LANGUAGE, parent=None):
+        super().__init__(parent)
+        self.engine_name = engine if engine in VOICE_ENGINES else DEFAULT_VOICE_ENGINE
+        self.language = language
+        self.calibrations = {}
+        self.thread = None
+
+    def set_engine(self, name):
+        if name in VOICE_ENGINES:
+            self.engine_name = name
+
+    def set_language(self, language):
+        self.language = language
+
+    def is_listening(self):
+        return self.thread is not None
+
+    def start(self, source=None):
+        if self.thread is not None:
+            return False
+        source = source or MicrophoneSource()
+        threshold, calibrated_at = self.calibrations.get(source.key, (None, 0))
+        if time.time() - calibrated_at > CALIBRATION_TTL:
+            threshold = None
+        self.thread = VoiceInputThread(VOICE_ENGINES[self.engine_name](), source, self.language, threshold)
+        self.thread.status_changed.connect(self.status_changed)
+        self.thread.transcript_changed.connect(self.transcript_changed)
+        self.thread.calibrated.connect(self.store_calibration)
+        self.thread.error_occurred.connect(self.error_occurred)
+        self.thread.finished.connect(self.thread_finished)
+        self.thread.start()
+        self.listening_changed.emit(True)
+        return True
+
+    def stop(self):
+        if self.thread is not None:
+            self.thread.stop()
+
+    def store_calibration(self, key, threshold):
+        if key is not None:
+            self.calibrations[key] = (threshold, time.time())
+
+    def thread_finished(self):
+        thread, self.thread = self.thread, None
+        thread.deleteLater()
+        self.listening_changed.emit(False)
+        self.finished.emit(thread.transcript)
+
+    def shutdown(self, wait_ms=2000):
+        if self.thread is not None:
+            self.thread.stop()
+            self.thread.wait(wait_ms)
+
+
+def main():
+    from PyQt5.QtCore import QCoreApplication
+
+    parser = argparse.ArgumentParser(description="Recognize speech in a WAV file with a voice input engine.")
+    parser.add_argument("--wav", required=True)
+    parser.add_argument("--engine", choices=VOICE_ENGINES, default=VoskEngine.name)
+    parser.add_argument("--language", default=DEFAULT_LANGUAGE)
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv[:1])
+    voice_input = VoiceInput(args.engine, args.language)
+    voice_input.transcript_changed.connect(lambda text: print(f"... {text}"))
+    voice_input.error_occurred.connect(lambda error: print(f"error: {error}", file=sys.stderr))
+    voice_input.finished.connect(lambda text: (print(text), app.quit()))
+    voice_input.start(WavFileSource(args.wav))
+    app.exec_()
+
+
+if __name__ == "__main__":
+    main()